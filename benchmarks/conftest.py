@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pytest
+
+SIZES = {"10MB": 10 * 1024**2, "100MB": 100 * 1024**2, "1GB": 1024**3}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("feeds")
+    group.addoption(
+        "--feed-sizes",
+        default="10MB",
+        help=f"Comma separated input sizes to benchmark, out of {', '.join(SIZES)}. Defaults to 10MB.",
+    )
+    group.addoption(
+        "--feed-data-dir",
+        default=None,
+        help="Directory to keep generated inputs in between runs. Defaults to a temporary directory.",
+    )
+    parser.getgroup("publishing").addoption(
+        "--publish-latency",
+        default="2",
+        help="Milliseconds the broker takes to confirm each published task. Defaults to 2.",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "input_size" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("--feed-sizes").split(",")
+        unknown = set(sizes) - set(SIZES)
+        if unknown:
+            raise pytest.UsageError(f"Unknown feed sizes: {', '.join(unknown)}")
+        metafunc.parametrize("input_size", [SIZES[s] for s in sizes], ids=sizes)
+
+
+@pytest.fixture(scope="session")
+def feed_data_dir(request, tmp_path_factory):
+    data_dir = request.config.getoption("--feed-data-dir")
+    if data_dir is None:
+        return tmp_path_factory.mktemp("feeds")
+    path = Path(data_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
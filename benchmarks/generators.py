@@ -0,0 +1,196 @@
+"""Synthetic inputs for every registered feed, generated up to a target size so that the benchmarks can measure how
+each feed scales. Every generator writes realistic rows for its feed, including the blank fields, unusual number
+formats and label rows that the sample files in tests/sample_files exercise.
+"""
+import datetime
+import random
+import zipfile
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TextIO
+
+from src.file_handlers import FileHandler, SeparatedFileHandler, ZipFileHandler
+
+
+class FeedGenerator(ABC):
+    """Writes a synthetic input file for a feed."""
+
+    encoding = "utf8"
+    header = ""
+
+    @abstractmethod
+    def rows(self, rng: random.Random) -> Iterator[str]:
+        """Endless rows of the feed, each ending with a newline."""
+
+    def write(self, f: TextIO, target_bytes: int, seed: int = 0) -> int:
+        """Write rows until the file reaches the target size.
+
+        Args:
+            f (TextIO): Text file to write to, opened with the generator's encoding
+            target_bytes (int): Approximate size of the file
+            seed (int, optional): Seed for the rows. Defaults to 0.
+
+        Returns:
+            int: Number of rows written
+        """
+        f.write(self.header)
+        written = 0
+        for written, row in enumerate(self.rows(random.Random(seed)), 1):
+            f.write(row)
+            # Checking the position every row would dominate the generation time
+            if written % 1000 == 0 and f.tell() >= target_bytes:
+                break
+        return written
+
+
+class RetailLinkDailySales(FeedGenerator):
+    def rows(self, rng: random.Random) -> Iterator[str]:
+        start = datetime.date(2023, 1, 1)
+        while True:
+            yield (
+                f"{rng.randint(1, 999):06d}\t{rng.choice(['', str(rng.randint(1, 99999))])}\t"
+                f"{rng.randint(1, 5000)}.0\t{start + datetime.timedelta(days=rng.randint(0, 364))}\t"
+                f"{rng.choice(['', 'NA', '1e3', f'{rng.uniform(0, 500):.2f}'])}\t{rng.randint(0, 50)}\t"
+                f"{rng.choice(['', str(rng.randint(0, 99))])}\n"
+            )
+
+
+class RetailLinkCurrentStoreStock(FeedGenerator):
+    def rows(self, rng: random.Random) -> Iterator[str]:
+        while True:
+            yield (
+                f"{rng.choice(['', f'{rng.randint(1, 999):06d}'])}\t"
+                f"{rng.choice(['', 'N/A', str(rng.randint(1, 99999))])}\t"
+                f"{rng.randint(1, 5000):05d}.{rng.randint(0, 9)}\t{rng.randint(0, 500)}\t"
+                f"{rng.choice(['', '1', '1.0'])}\n"
+            )
+
+
+class WaitroseConnectDailyLineSales(FeedGenerator):
+    header = (
+        "Day,Date,Line,Line_Description,Registered_Sales,Sales_SUs,Reduced,Explained_Wastage,"
+        "Explained_Wastage_Quality,Reductions_pct_Registered_Sales\n"
+    )
+
+    def rows(self, rng: random.Random) -> Iterator[str]:
+        start = datetime.date(2023, 1, 1)
+        descriptions = ["", '"Bread, white"', "Milk 2L", "Free range eggs"]
+        while True:
+            day = start + datetime.timedelta(days=rng.randint(0, 364))
+            yield (
+                f"{day:%a},{day:%d/%m/%Y},{rng.randint(100000, 999999)},{rng.choice(descriptions)},"
+                f"{rng.choice(['', f'£{rng.uniform(0, 500):.2f}'])},{rng.choice(['', str(rng.randint(0, 99))])},"
+                f"£{rng.uniform(0, 5):.2f},£{rng.uniform(0, 5):.2f},{rng.choice(['', f'£{rng.uniform(0, 5):.2f}'])},"
+                f"{rng.choice(['', f'{rng.random():.4f}'])}\n"
+            )
+
+
+class HorizonDailyPerformanceSales(FeedGenerator):
+    """Writes a Horizon export of several reports separated by the SeparatedFileHandler separator, each made of date
+    headers, category headers, SKU rows and subtotal rows."""
+
+    encoding = "latin1"
+    columns = 25
+    days_per_report = 7
+
+    def __init__(self, separator: str = SeparatedFileHandler().separator):
+        self.separator = separator
+
+    def rows(self, rng: random.Random) -> Iterator[str]:
+        padding = "," * (self.columns - 1)
+        day = datetime.date(2023, 1, 1)
+        categories = ["Bakery", "Dairy", "Fresh Produce", "Frozen & Chilled"]
+        header = "SKU,DEPTCOMM,DESCRIPTION," + ",".join(
+            f"VALUE{i}" for i in range(self.columns - 3)
+        )
+        while True:
+            yield f"Daily Performance Report{padding}\n"
+            yield f"{header}\n"
+            for _ in range(self.days_per_report):
+                yield f"{day:%d/%m/%Y}{padding}\n"
+                for category in categories:
+                    yield f"{category}{padding}\n"
+                    for _ in range(rng.randint(20, 80)):
+                        values = ",".join(
+                            f"{rng.uniform(0, 500):.2f}" for _ in range(19)
+                        )
+                        yield (
+                            f"{rng.randint(1000, 9999999)},D{rng.randint(1, 9)},Crème brûlée,{values},"
+                            f"{rng.choice(['0', '1'])},N,\n"
+                        )
+                    yield f"Sub-Cat Subtotal,,,9,9,9,9,9{padding[7:]}\n"
+                yield f"Overall Sub-Cat Total{padding}\n"
+                day += datetime.timedelta(days=1)
+            yield self.separator
+
+
+GENERATORS: dict[str, FeedGenerator] = {
+    "retaillink_daily_sales": RetailLinkDailySales(),
+    "retaillink_current_store_stock": RetailLinkCurrentStoreStock(),
+    "waitroseconnect_daily_line_sales": WaitroseConnectDailyLineSales(),
+    "horizon_daily_performance_sales": HorizonDailyPerformanceSales(),
+}
+
+
+def generate(
+    feed_identifier: str,
+    file_handler: FileHandler,
+    directory: Path,
+    target_bytes: int,
+    container: str = "plain",
+) -> tuple[Path, FileHandler, int]:
+    """Generate an input for a feed, reusing it if it has already been generated in the directory.
+
+    Zipped inputs hold one member per section of the plain input, so separated files become one member per report,
+    and are opened with a ZipFileHandler instead of the feed's own file handler.
+
+    Args:
+        feed_identifier (str): Feed to generate an input for
+        file_handler (FileHandler): File handler the feed is registered with
+        directory (Path): Directory to write the input to
+        target_bytes (int): Approximate size of the uncompressed input
+        container (str, optional): "plain" or "zip". Defaults to "plain".
+
+    Returns:
+        tuple[Path, FileHandler, int]: Path to the input, the file handler to open it with, and its number of rows
+    """
+    generator = GENERATORS[feed_identifier]
+    plain_path = directory / f"{feed_identifier}.{target_bytes}.txt"
+    rows_path = plain_path.with_suffix(".rows")
+    if not rows_path.exists():
+        with open(plain_path, "w", encoding=generator.encoding, newline="") as f:
+            rows = generator.write(f, target_bytes)
+        rows_path.write_text(str(rows))
+    rows = int(rows_path.read_text())
+    if container == "plain":
+        return plain_path, file_handler, rows
+
+    zip_path = plain_path.with_suffix(".zip")
+    if not zip_path.exists():
+        separator = getattr(file_handler, "separator", None)
+        _zip_sections(plain_path, zip_path, generator.encoding, separator)
+    return zip_path, ZipFileHandler(encoding=generator.encoding), rows
+
+
+def _zip_sections(
+    plain_path: Path, zip_path: Path, encoding: str, separator: str | None
+):
+    """Zip each section of a file as its own member, streaming the file line by line."""
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf, open(
+        plain_path, encoding=encoding, newline=""
+    ) as f:
+        sections = 0
+        member = None
+        for line in f:
+            if line == separator:
+                if member is not None:
+                    member.close()
+                member = None
+                continue
+            if member is None:
+                member = zf.open(f"section_{sections:05d}.csv", "w")
+                sections += 1
+            member.write(line.encode(encoding))
+        if member is not None:
+            member.close()
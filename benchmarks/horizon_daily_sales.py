@@ -0,0 +1,142 @@
+"""Compares the Horizon daily performance sales row classification against the previous one (str.contains for dates
+and SKUs, isin for labels, then replace(to_replace=0, method="ffill") for DAILY and CATEGORY) on a synthetic
+multi-million-row export, both on its own and for the whole script.
+
+Usage:
+    python -m benchmarks.horizon_daily_sales --rows 2000000
+"""
+import argparse
+import datetime
+import random
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import pandas as pd
+
+from src.file_handlers import BasicFileHandler
+from src.scripts.horizon.daily_performance_sales import DailySales
+
+COLUMNS = [
+    "SKU",
+    "DEPTCOMM",
+    "DESCRIPTION",
+    "SALESCASH",
+    "SALESVOL",
+    "WASTAGETOTALVAL",
+    "WASTAGETOTALVOL",
+    "WASTAGETOTALPCT",
+    "AVAILINSTPCT",
+    "AVAILVOLPCT",
+    "STORESTOCK",
+    "MAINSTOCKAVAILABLE",
+    "MAINSTOCKHELD",
+    "PCCSTOCK",
+    "LYINGOUT",
+    "BONDSTOCK",
+    "DEPOTISSUES",
+    "DEPOTSERVICEPCT",
+    "SUPPSERVNUMBER",
+    "SUPPSERVPCT",
+    "LOSTSALESVOL",
+    "LOSTSALESVAL",
+    "NOREPLEN",
+    "VICTIMIND",
+    "PROMOIND",
+]
+
+
+def generate_daily_sales(path: Path, rows: int, skus_per_category: int = 50, seed=0):
+    """Write a synthetic Horizon daily performance sales report with roughly the given number of rows, made of date
+    headers, category headers, SKU rows and subtotal rows."""
+    rng = random.Random(seed)
+    padding = "," * (len(COLUMNS) - 1)
+    start = datetime.date(2023, 1, 1)
+    categories = ["Bakery", "Dairy", "Fresh Produce", "Frozen & Chilled"]
+    written = 0
+    with open(path, "w", encoding="latin1") as f:
+        f.write("Daily Performance Report\n" + ",".join(COLUMNS) + "\n")
+        while written < rows:
+            day = start + datetime.timedelta(days=written // 10_000)
+            f.write(f"{day:%d/%m/%Y}{padding}\n")
+            for category in categories:
+                f.write(f"{category}{padding}\n{padding}\n")
+                for _ in range(skus_per_category):
+                    values = ",".join(f"{rng.uniform(0, 500):.2f}" for _ in range(19))
+                    f.write(
+                        f"{rng.randint(1000, 9999999)},D{rng.randint(1, 9)},Milk 2L,{values},"
+                        f"{rng.choice(['0', '1'])},N,\n"
+                    )
+                f.write(f"Sub-Cat Subtotal,,,9,9,9,9,9{padding[7:]}\n")
+                written += skus_per_category + 3
+            f.write(f"Overall Sub-Cat Total{padding}\n")
+            written += 2
+
+
+def classify_legacy(data_frame: pd.DataFrame) -> pd.DataFrame:
+    data_frame = data_frame.loc[~data_frame["SKU"].isnull(), :].iloc[1:, :]
+
+    date_rows = data_frame.SKU.str.contains(r"^\d{2}\/\d{2}\/\d{4}$").fillna(False)
+    sku_rows = data_frame.SKU.str.contains(r"^\d+$").fillna(False)
+    label_rows = data_frame.SKU.isin(
+        ["Sub-Cat Subtotal", "Overall Sub-Cat Total"]
+    ).fillna(False)
+    category_rows = ~label_rows & ~sku_rows & ~date_rows
+
+    data_frame["DAILY"] = 0
+    data_frame.loc[date_rows, "DAILY"] = data_frame.loc[date_rows, "SKU"]
+    data_frame["DAILY"] = data_frame["DAILY"].replace(to_replace=0, method="ffill")
+    data_frame["DAILY"] = data_frame.DAILY.str.replace(
+        r"(\d{2})\/(\d{2})\/(\d{4})", r"\3\2\1"
+    )
+
+    data_frame["CATEGORY"] = 0
+    data_frame.loc[category_rows, "CATEGORY"] = data_frame.loc[category_rows, "SKU"]
+    data_frame["CATEGORY"] = data_frame["CATEGORY"].replace(
+        to_replace=0, method="ffill"
+    )
+    return data_frame.loc[sku_rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    script = DailySales(datetime.date(2023, 1, 1), datetime.date(2023, 1, 1))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "daily_sales.csv"
+        generate_daily_sales(path, args.rows)
+        size_mb = path.stat().st_size / 1024**2
+        print(f"{args.rows} rows, {size_mb:.1f} MB")
+
+        data_frame = read(path)
+        timings = {
+            "legacy classification": lambda: classify_legacy(data_frame.copy()),
+            "classification": lambda: script.sku_rows(data_frame.copy()),
+            "legacy script": lambda: script.build_output(classify_legacy(read(path))),
+            "script": lambda: script.run(
+                next(BasicFileHandler("latin1").open(str(path)))
+            ),
+        }
+        for name, run in timings.items():
+            best = min(timeit(run) for _ in range(args.repeat))
+            print(f"{name:>22}: {best:.3f}s")
+
+
+def read(path: Path) -> pd.DataFrame:
+    file_obj = next(BasicFileHandler("latin1").open(str(path)))
+    return pd.read_csv(file_obj, dtype=str, names=COLUMNS)
+
+
+def timeit(run) -> float:
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compares reading a RetailLink daily sales TSV with the pyarrow reading layer in BaseScript against the previous
+pandas C engine path (dtype=str, then astype and replace("nan") per column).
+
+Usage:
+    python -m benchmarks.retaillink_read --rows 2000000
+"""
+import argparse
+import datetime
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.file_handlers import BasicFileHandler
+from src.scripts.retaillink.daily_sales import DailySales
+
+
+def generate_daily_sales(path: Path, rows: int, seed: int = 0):
+    """Write a synthetic RetailLink daily sales TSV with the given number of rows."""
+    rng = random.Random(seed)
+    start = datetime.date(2023, 1, 1)
+    with open(path, "w") as f:
+        for _ in range(rows):
+            f.write(
+                f"{rng.randint(1, 999):06d}\t{rng.randint(1, 999999)}\t{rng.randint(1, 5000)}.0\t"
+                f"{start + datetime.timedelta(days=rng.randint(0, 364))}\t{rng.uniform(0, 500):.2f}\t"
+                f"{rng.randint(0, 50)}\t{rng.choice(['', str(rng.randint(0, 99))])}\n"
+            )
+
+
+def read_legacy(file_obj) -> pd.DataFrame:
+    data_frame = pd.read_csv(file_obj, delimiter="\t", dtype=str, header=None)
+    data_frame.columns = list(DailySales.source_schema)
+    for col in ["EPOSSALES", "EPOSQTY", "MAXSHELFQTY"]:
+        data_frame[col] = data_frame[col].astype(float)
+    for c in data_frame.select_dtypes(include=["object"]).columns:
+        data_frame[c] = data_frame[c].replace("nan", np.nan)
+    return data_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    script = DailySales(datetime.date(2023, 1, 1), datetime.date(2023, 1, 1))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "daily_sales.txt"
+        generate_daily_sales(path, args.rows)
+        size_mb = path.stat().st_size / 1024**2
+        print(f"{args.rows} rows, {size_mb:.1f} MB")
+
+        for name, read in [("pandas", read_legacy), ("pyarrow", script.read_source)]:
+            timings = []
+            for _ in range(args.repeat):
+                file_obj = next(BasicFileHandler().open(str(path)))
+                start = time.perf_counter()
+                read(file_obj)
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            print(f"{name:>8}: {best:.3f}s ({size_mb / best:.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmarks preparing synthetic inputs for every feed in the registry, from the plain file and from a zip, at each
+of the sizes given with --feed-sizes. Throughput, based on the uncompressed size of zipped inputs, and the
+measurements of each stage are saved in the extra_info of each benchmark, so runs saved with --benchmark-autosave can
+be compared between commits.
+
+Usage:
+    pytest benchmarks --feed-sizes 10MB,100MB,1GB --benchmark-autosave
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+
+The increase in peak RSS of each stage is measured for the whole benchmark process, so it only shows stages that
+use more memory than every benchmark before them. Run a single size or feed with -k to measure it on its own.
+"""
+import datetime
+import shutil
+import zipfile
+
+import pytest
+
+from src.factories import preparer_factory
+from src.settings import settings
+
+from .generators import GENERATORS, generate
+
+FEEDS = preparer_factory.feeds()
+
+
+@pytest.mark.parametrize("container", ["plain", "zip"])
+@pytest.mark.parametrize(
+    "feed", FEEDS, ids=[f"{identifier}-v{version}" for identifier, version in FEEDS]
+)
+def test_prepare_feed(
+    benchmark, feed, container, input_size, feed_data_dir, tmp_path, monkeypatch
+):
+    feed_identifier, feed_version = feed
+    if feed_identifier not in GENERATORS:
+        pytest.fail(
+            f"Add a generator for {feed_identifier} to benchmarks/generators.py"
+        )
+    _, file_handler, _ = preparer_factory.resolve(*feed)
+    file_path, file_handler, rows = generate(
+        feed_identifier, file_handler, feed_data_dir, input_size, container
+    )
+    output_dir = tmp_path / "output"
+    monkeypatch.setattr(settings, "output_dir", f"file://{output_dir}")
+
+    def prepare():
+        file_preparer = preparer_factory.create(
+            feed_identifier,
+            feed_version,
+            "benchmark",
+            datetime.date(2023, 1, 1),
+            datetime.date(2023, 12, 31),
+            datetime.datetime(2024, 1, 1),
+        )
+        file_preparer.file_handler = file_handler
+        file_preparer.stream_outputs_to_file(file_preparer.iter_script(str(file_path)))
+        return file_preparer
+
+    file_preparer = benchmark.pedantic(
+        prepare,
+        setup=lambda: shutil.rmtree(output_dir, ignore_errors=True),
+        rounds=3 if input_size < 1024**3 else 1,
+        iterations=1,
+    )
+
+    if benchmark.stats is None:
+        # Run once as a test under --benchmark-disable
+        return
+    seconds = benchmark.stats.stats.mean
+    if container == "zip":
+        with zipfile.ZipFile(file_path) as zf:
+            size_mb = sum(member.file_size for member in zf.infolist()) / 1024**2
+    else:
+        size_mb = file_path.stat().st_size / 1024**2
+    benchmark.extra_info.update(
+        {
+            "input_mb": size_mb,
+            "input_rows": rows,
+            "mb_per_s": size_mb / seconds,
+            "rows_per_s": rows / seconds,
+            "stages": file_preparer.instrumentation.summary()["stages"],
+        }
+    )
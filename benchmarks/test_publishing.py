@@ -0,0 +1,117 @@
+"""Load test of publishing prepare_file tasks from adc.data_collected messages, comparing the subscriber's
+TaskPublisher against publishing with Celery's send_task from the handler, as the subscriber used to. Messages are
+delivered through faststream's in-memory test broker, handled concurrently as prefetched messages would be. Tasks
+sent with send_task go through Celery's memory transport, while the TaskPublisher publishes through the test broker.
+Both wait --publish-latency milliseconds for the broker to confirm each publish, so that throughput shows how
+publishing scales with the latency of the broker.
+
+Usage:
+    pytest benchmarks/test_publishing.py --publish-latency 2 --benchmark-autosave
+"""
+import asyncio
+import datetime
+import time
+
+import pytest
+from celery import Celery
+from faststream.rabbit import RabbitBroker, TestRabbitBroker
+from kombu.transport import memory
+
+from src import schema, subscriptions
+from src.celery import PREPARE_FILE
+from src.routing import TaskRouter
+
+MESSAGES = 500
+ROUNDS = 3
+
+
+@pytest.fixture
+def publish_latency(request) -> float:
+    return float(request.config.getoption("--publish-latency")) / 1000
+
+
+@pytest.fixture
+def message() -> dict:
+    return schema.PrepareFile(
+        feed_identifier="retaillink_daily_sales",
+        data_supplier="benchmark",
+        file_location="s3://bucket/retaillink_daily_sales.txt",
+        start_date=datetime.date(2023, 1, 1),
+        end_date=datetime.date(2023, 1, 1),
+        source_creation_timestamp=datetime.datetime(2023, 1, 2),
+    ).model_dump(mode="json")
+
+
+@pytest.fixture(autouse=True)
+def small_queue(monkeypatch):
+    # Routing reads the size of each file, which isn't what is being measured here
+    monkeypatch.setattr(TaskRouter, "queue", lambda self, *args: "prepare.small")
+
+
+def deliver(broker: RabbitBroker, message: dict):
+    """Deliver MESSAGES adc.data_collected messages at once to the subscribers of a test broker."""
+
+    async def run():
+        async with TestRabbitBroker(broker):
+            await asyncio.gather(
+                *(
+                    broker.publish(
+                        message,
+                        exchange=subscriptions.exch,
+                        routing_key=subscriptions.queue_1.routing_key,
+                    )
+                    for _ in range(MESSAGES)
+                )
+            )
+
+    asyncio.run(run())
+
+
+def test_publish_send_task(benchmark, monkeypatch, publish_latency, message):
+    celery_app = Celery("benchmark", broker="memory://")
+    put = memory.Channel._put
+
+    def confirmed_put(self, queue, message, **kwargs):
+        time.sleep(publish_latency)
+        put(self, queue, message, **kwargs)
+
+    monkeypatch.setattr(memory.Channel, "_put", confirmed_put)
+    broker = RabbitBroker()
+    sent = []
+
+    @broker.subscriber(subscriptions.queue_1, subscriptions.exch)
+    async def prepare_file(data: schema.PrepareFile):
+        sent.append(
+            celery_app.send_task(
+                PREPARE_FILE, kwargs=data.model_dump(), queue="prepare.small"
+            )
+        )
+
+    benchmark.pedantic(deliver, args=(broker, message), rounds=ROUNDS, iterations=1)
+    # Under --benchmark-disable the benchmark is run once as a test, without stats
+    if benchmark.stats is None:
+        assert len(sent) == MESSAGES
+        return
+    assert len(sent) == MESSAGES * ROUNDS
+    benchmark.extra_info["messages_per_s"] = MESSAGES / benchmark.stats.stats.mean
+
+
+def test_publish_task_publisher(benchmark, monkeypatch, publish_latency, message):
+    broker = subscriptions.router.broker
+    publish = broker.publish
+    published = []
+
+    async def confirmed_publish(*args, routing_key: str = "", **kwargs):
+        if routing_key == "prepare.small":
+            await asyncio.sleep(publish_latency)
+            published.append(routing_key)
+        return await publish(*args, routing_key=routing_key, **kwargs)
+
+    monkeypatch.setattr(broker, "publish", confirmed_publish)
+    benchmark.pedantic(deliver, args=(broker, message), rounds=ROUNDS, iterations=1)
+    # Under --benchmark-disable the benchmark is run once as a test, without stats
+    if benchmark.stats is None:
+        assert len(published) == MESSAGES
+        return
+    assert len(published) == MESSAGES * ROUNDS
+    benchmark.extra_info["messages_per_s"] = MESSAGES / benchmark.stats.stats.mean
@@ -0,0 +1,41 @@
+"""Benchmarks how long the API and a Celery worker take to import what they need before they can serve, each in a
+fresh interpreter. The worker imports its tasks and preloads every feed, as it does in worker_init before forking.
+
+Usage:
+    pytest benchmarks/test_startup.py --benchmark-autosave
+"""
+import subprocess
+import sys
+
+import pytest
+
+STARTUP = {
+    "api": "import src.main",
+    "worker": (
+        "from src.celery import app\n"
+        "app.loader.import_default_modules()\n"
+        "from src.factories import preparer_factory\n"
+        "preparer_factory.preload()\n"
+    ),
+}
+
+
+@pytest.mark.parametrize("process", list(STARTUP))
+def test_startup(benchmark, process):
+    def start():
+        subprocess.run([sys.executable, "-c", STARTUP[process]], check=True)
+
+    benchmark.pedantic(start, rounds=5, iterations=1)
+    modules = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"{STARTUP[process]}\nimport sys\nprint(len(sys.modules), 'pandas' in sys.modules)",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    benchmark.extra_info.update(
+        {"modules": int(modules[0]), "imports_pandas": modules[1] == "True"}
+    )
@@ -0,0 +1,156 @@
+"""Compares Celery prefork children forked from a cold parent, which has only imported its tasks, against children
+forked from a warm parent, which has run bootstrap.preload_parent and whose children run bootstrap.init_child. Each
+child prepares the same synthetic input as its first task, then reports how long the task took and its memory from
+/proc/self/smaps_rollup while all of its siblings are still alive: PSS, which splits shared pages between the
+processes sharing them, and USS, the pages only that child holds.
+
+Usage:
+    python -m benchmarks.worker_bootstrap --children 4 --size-mb 10
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+MODES = ["cold", "warm"]
+
+
+def memory() -> dict[str, float]:
+    """PSS and USS of the current process in MB."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "pss_mb": fields["Pss"],
+        "uss_mb": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def run_parent(mode: str, feed: str, input_path: str, output_dir: str, children: int):
+    """Start up as a worker parent in the given mode, fork the children and print each child's measurements as a
+    line of JSON."""
+    from src.celery import app
+    from src.settings import settings
+
+    settings.output_dir = f"file://{output_dir}"
+    # Celery imports the task modules in the parent whether or not it preloads anything else
+    app.loader.import_default_modules()
+    if mode == "warm":
+        from src.bootstrap import preload_parent
+
+        preload_parent()
+
+    results_r, results_w = os.pipe()
+    release_r, release_w = os.pipe()
+    pids = []
+    for child in range(children):
+        pid = os.fork()
+        if pid == 0:
+            os.close(results_r)
+            os.close(release_w)
+            run_child(mode, feed, input_path, child, results_w)
+            # Wait for every sibling to be measured, so they all share the parent's pages while they are
+            os.read(release_r, 1)
+            os._exit(0)
+        pids.append(pid)
+    os.close(results_w)
+    os.close(release_r)
+    with os.fdopen(results_r) as results:
+        for _ in range(children):
+            print(results.readline(), end="", flush=True)
+    os.close(release_w)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+
+def run_child(mode: str, feed: str, input_path: str, child: int, results_w: int):
+    from src.cache import get_cache
+    from src.catalogue_submitter import get_catalogue_submitter
+    from src.factories import preparer_factory
+
+    if mode == "warm":
+        from src.bootstrap import init_child
+
+        init_child()
+    start = time.perf_counter()
+    # A real task checks the result cache and submits to the catalogue, setting them up if init_child hasn't
+    get_cache()
+    get_catalogue_submitter()
+    file_preparer = preparer_factory.create(
+        feed,
+        1,
+        f"bootstrap-{child}",
+        datetime.date(2023, 1, 1),
+        datetime.date(2023, 12, 31),
+        datetime.datetime(2024, 1, 1),
+    )
+    file_preparer.stream_outputs_to_file(file_preparer.iter_script(input_path))
+    result = {"first_task_s": time.perf_counter() - start, **memory()}
+    os.write(results_w, (json.dumps(result) + "\n").encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--children", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=10)
+    parser.add_argument("--feed", default="retaillink_daily_sales")
+    parser.add_argument("--parent", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.parent:
+        run_parent(args.parent, args.feed, args.input, args.output_dir, args.children)
+        return
+
+    from src.factories import preparer_factory
+
+    from .generators import generate
+
+    with tempfile.TemporaryDirectory() as directory:
+        _, file_handler, _ = preparer_factory.resolve(args.feed, 1)
+        input_path, _, rows = generate(
+            args.feed, file_handler, Path(directory), args.size_mb * 1024**2
+        )
+        print(f"{args.children} children, first task of {rows} rows of {args.feed}")
+        for mode in MODES:
+            # Each mode starts from a fresh interpreter, so neither inherits the other's imports
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.worker_bootstrap",
+                    "--parent",
+                    mode,
+                    "--feed",
+                    args.feed,
+                    "--input",
+                    str(input_path),
+                    "--output-dir",
+                    os.path.join(directory, mode),
+                    "--children",
+                    str(args.children),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results = [json.loads(line) for line in output.splitlines()]
+            summary = ", ".join(
+                f"{key} {statistics.mean(result[key] for result in results):.2f}"
+                for key in ["first_task_s", "pss_mb", "uss_mb"]
+            )
+            print(f"{mode}: mean {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +0,0 @@
-from .scripts import retaillink
-from .scripts import waitroseconnect
-from .scripts import horizon
@@ -0,0 +1,80 @@
+from collections.abc import Iterable
+
+from .cache import MemcachedCache, MemoryCache, get_cache
+from .settings import settings
+
+
+class BatchStatusStore:
+    """Status of each file in a batch, by file location, kept in the cache so that the API can report the progress
+    of a batch while the worker prepares it. Each status is a dict matching schema.FileStatus.
+
+    The locations of the files are stored once when the batch starts, and the status of each file under its own key,
+    so updating a file only writes that file's status, and the statuses of a batch are read back in one request.
+
+    Args:
+        cache (MemcachedCache | MemoryCache | None, optional): Cache to keep statuses in. Defaults to the process wide
+            memcached cache.
+        timeout (int | None, optional): Number of seconds to keep statuses for. Defaults to
+            settings.result_cache_timeout.
+    """
+
+    prefix = "batch"
+
+    def __init__(
+        self,
+        cache: MemcachedCache | MemoryCache | None = None,
+        timeout: int | None = None,
+    ):
+        self.cache = cache or get_cache()
+        self.timeout = timeout or settings.result_cache_timeout
+
+    def start(self, group_id: str, file_locations: Iterable[str]):
+        """Mark every file of a batch as pending.
+
+        Args:
+            group_id (str): ID of the batch
+            file_locations (Iterable[str]): Locations of the files in the batch, in the order they were submitted
+        """
+        file_locations = list(file_locations)
+        self.cache.set_many(
+            {
+                self._key(group_id, index): {"status": "pending"}
+                for index in range(len(file_locations))
+            },
+            self.timeout,
+        )
+        self.cache.set(self._key(group_id), file_locations, self.timeout)
+
+    def update(self, group_id: str, index: int, status: dict):
+        """Set the status of a file in a batch.
+
+        Args:
+            group_id (str): ID of the batch
+            index (int): Index of the file in the batch
+            status (dict): New status of the file
+        """
+        self.cache.set(self._key(group_id, index), status, self.timeout)
+
+    def get(self, group_id: str) -> dict[str, dict] | None:
+        """Get the status of every file in a batch.
+
+        Args:
+            group_id (str): ID of the batch
+
+        Returns:
+            dict[str, dict] | None: Status of each file by location, or None if the batch is unknown or has expired
+        """
+        file_locations = self.cache.get(self._key(group_id))
+        if file_locations is None:
+            return None
+        keys = [self._key(group_id, index) for index in range(len(file_locations))]
+        statuses = self.cache.get_many(keys)
+        return {
+            location: statuses.get(key, {"status": "pending"})
+            for location, key in zip(file_locations, keys)
+        }
+
+    def _key(self, group_id: str, index: int | None = None) -> str:
+        if index is None:
+            return f"{self.prefix}:{group_id}"
+        return f"{self.prefix}:{group_id}:{index}"
@@ -0,0 +1,71 @@
+"""Warm start for Celery prefork workers. The parent process imports everything the tasks need and freezes its heap
+before forking, so children share those pages copy-on-write instead of each importing them again, and each child sets
+up its process wide resources once when it starts rather than on its first task.
+"""
+import gc
+import importlib
+import logging
+
+import fsspec
+
+from .settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Heavy modules imported by the tasks, imported in the parent so that children inherit them
+PRELOAD_MODULES = [
+    "numpy",
+    "pandas",
+    "pandas.io.formats.csvs",
+    "pyarrow",
+    "pyarrow.compute",
+    "pyarrow.csv",
+    "pyarrow.pandas_compat",
+    "pyarrow.parquet",
+    "charset_normalizer",
+    "fsspec",
+    "s3fs",
+    "src.tasks",
+]
+
+
+def preload_parent():
+    """Import the heavy modules and, if settings.preload_feeds is set, the scripts of every feed. Then move every
+    object into the garbage collector's permanent generation, so collections in the children never touch, and so
+    copy, the pages they inherit. Called in the parent before it forks its children.
+
+    Collection is disabled while importing, as collecting would leave freed holes among the imported objects that
+    the children would then fill, copying those pages.
+    """
+    from .factories import preparer_factory
+
+    gc.disable()
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            logger.warning("Could not preload %s", module)
+    if settings.preload_feeds:
+        preparer_factory.preload()
+    gc.freeze()
+    gc.enable()
+
+
+def init_child():
+    """Set up the resources each child reuses across tasks: the cache and catalogue clients, the catalogue
+    submitter's event loop, the staging cache and the filesystems for the output directory. Called in each child
+    after it has been forked, as clients, sockets and threads can't be shared with the parent.
+    """
+    from .cache import get_cache
+    from .catalogue_submitter import get_catalogue_submitter
+    from .staging import get_staging_cache
+
+    get_cache()
+    get_staging_cache()
+    fsspec.core.url_to_fs(settings.output_dir)
+    try:
+        get_catalogue_submitter()
+    except Exception:
+        # The catalogue is only needed once a task has prepared its outputs, where the error is raised again
+        logger.exception("Could not set up the catalogue submitter")
@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+import logging
+import time
+
+from pymemcache.client.base import PooledClient
+from pymemcache.exceptions import MemcacheError
+from pymemcache import serde
+
+from .settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCache:
+    """Thread safe in-memory cache. Entries expire after their timeout, and the least recently used entry is evicted
+    once the cache holds max_entries entries.
+
+    Args:
+        max_entries (int, optional): Maximum number of entries to hold. Defaults to 1024.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Any, float | None]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, timeout: float | None = None):
+        """Set a value in the cache.
+
+        Args:
+            key (str): Key to set
+            value (Any): Value to set
+            timeout (float | None, optional): Number of seconds until the entry expires. Defaults to never expiring.
+        """
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Get several values from the cache.
+
+        Args:
+            keys (list[str]): Keys to get
+
+        Returns:
+            dict[str, Any]: Value of each key that is in the cache
+        """
+        values = {key: self.get(key) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def set_many(self, values: dict[str, Any], timeout: float | None = None):
+        """Set several values in the cache.
+
+        Args:
+            values (dict[str, Any]): Value of each key to set
+            timeout (float | None, optional): Number of seconds until the entries expire. Defaults to never expiring.
+        """
+        for key, value in values.items():
+            self.set(key, value, timeout)
+
+    def incr(self, key: str, delta: int = 1) -> int | None:
+        """Add to an integer value in the cache.
+
+        Args:
+            key (str): Key of the value
+            delta (int, optional): Amount to add. Defaults to 1.
+
+        Returns:
+            int | None: The new value, or None if the key isn't in the cache
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+                return None
+            value = entry[0] + delta
+            self._entries[key] = (value, entry[1])
+            return value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def available(self) -> bool:
+        """The in-memory cache can always be reached."""
+        return True
+
+
+class MemcachedCache:
+    """Cache backed by memcached, so that entries are shared across worker processes and hosts. If memcached can't be
+    reached, the in-memory fallback cache is used instead, so a memcached outage only costs cache hits.
+
+    Connections are pooled, so the cache can be shared by threads, e.g. the threads of prepare_files, with each request
+    taking a connection that no other thread is using.
+
+    Args:
+        server (str, optional): Memcached server as host:port. Defaults to settings.memcached_url.
+        fallback (MemoryCache | None, optional): Cache to use when memcached can't be reached.
+        timeout (float, optional): Connect and read timeout in seconds. Defaults to 1.0.
+    """
+
+    def __init__(
+        self,
+        server: str | None = None,
+        fallback: MemoryCache | None = None,
+        timeout: float = 1.0,
+    ):
+        self.client = PooledClient(
+            server or settings.memcached_url,
+            serde=serde.pickle_serde,
+            connect_timeout=timeout,
+            timeout=timeout,
+        )
+        self.fallback = fallback or MemoryCache()
+
+    def get(self, key: str) -> Any:
+        try:
+            return self.client.get(key)
+        except (MemcacheError, OSError) as e:
+            logger.warning("Memcached get failed, using in-memory cache: %s", e)
+            return self.fallback.get(key)
+
+    def set(self, key: str, value: Any, timeout: float | None = None):
+        """Set a value in the cache.
+
+        Args:
+            key (str): Key to set
+            value (Any): Value to set
+            timeout (float | None, optional): Number of seconds until the entry expires. Defaults to never expiring.
+        """
+        try:
+            self.client.set(key, value, expire=int(timeout or 0))
+        except (MemcacheError, OSError) as e:
+            logger.warning("Memcached set failed, using in-memory cache: %s", e)
+            self.fallback.set(key, value, timeout)
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Get several values from the cache in one request.
+
+        Args:
+            keys (list[str]): Keys to get
+
+        Returns:
+            dict[str, Any]: Value of each key that is in the cache
+        """
+        if not keys:
+            return {}
+        try:
+            return self.client.get_many(keys)
+        except (MemcacheError, OSError) as e:
+            logger.warning("Memcached get_many failed, using in-memory cache: %s", e)
+            return self.fallback.get_many(keys)
+
+    def set_many(self, values: dict[str, Any], timeout: float | None = None):
+        """Set several values in the cache in one request.
+
+        Args:
+            values (dict[str, Any]): Value of each key to set
+            timeout (float | None, optional): Number of seconds until the entries expire. Defaults to never expiring.
+        """
+        if not values:
+            return
+        try:
+            self.client.set_many(values, expire=int(timeout or 0))
+        except (MemcacheError, OSError) as e:
+            logger.warning("Memcached set_many failed, using in-memory cache: %s", e)
+            self.fallback.set_many(values, timeout)
+
+    def incr(self, key: str, delta: int = 1) -> int | None:
+        """Atomically add to an integer value in the cache, so that processes can count completions between them.
+
+        Args:
+            key (str): Key of the value, which must have been set to an int
+            delta (int, optional): Amount to add. Defaults to 1.
+
+        Returns:
+            int | None: The new value, or None if the key isn't in the cache
+        """
+        try:
+            value = self.client.incr(key, delta)
+        except (MemcacheError, OSError) as e:
+            logger.warning("Memcached incr failed, using in-memory cache: %s", e)
+            return self.fallback.incr(key, delta)
+        return None if value is None else int(value)
+
+    def delete(self, key: str):
+        self.fallback.delete(key)
+        try:
+            self.client.delete(key)
+        except (MemcacheError, OSError) as e:
+            logger.warning("Memcached delete failed: %s", e)
+
+    def available(self) -> bool:
+        """Check that memcached can be reached, for callers that can't fall back to the in-memory cache, e.g. because
+        other processes must see their entries.
+
+        Returns:
+            bool: Whether memcached answered
+        """
+        try:
+            self.client.version()
+        except (MemcacheError, OSError) as e:
+            logger.warning("Memcached can't be reached: %s", e)
+            return False
+        return True
+
+
+_cache: MemcachedCache | None = None
+
+
+def get_cache() -> MemcachedCache:
+    """Get the cache for the current process, creating it on first use.
+
+    Returns:
+        MemcachedCache: Cache backed by settings.memcached_url
+    """
+    global _cache
+    if _cache is None:
+        _cache = MemcachedCache()
+    return _cache
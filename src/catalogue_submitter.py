@@ -0,0 +1,311 @@
+from collections.abc import Callable
+from concurrent.futures import Future
+from pathlib import Path
+from threading import Thread
+from typing import IO, Literal
+import asyncio
+import fcntl
+import logging
+import os
+import uuid
+
+from m2m_base_client.clients import DataCatalogueClient
+from m2m_base_client.models import CatalogueFileRecord
+from pydantic import ValidationError
+
+from .data_catalogue import data_catalogue_client
+from .settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+Delivery = Literal["ack", "spool"]
+
+
+class CatalogueSubmitter:
+    """Submits catalogue records to the data catalogue in batches, from an event loop that runs in a background
+    thread for the life of the worker process. Keeping one loop means the client, and its HTTP connections, are reused
+    across tasks rather than being set up and torn down by asyncio.run for every task.
+
+    How records are batched and how long submit blocks depends on the delivery mode:
+
+    - "ack": submit returns once the batch containing the records has been posted, and raises if posting fails, so a
+      task is only acknowledged once its outputs are catalogued. Records are posted straight away when no post is in
+      flight, and records submitted while one is in flight are posted together as soon as it finishes, so tasks
+      never wait on a timer.
+    - "spool": submit returns once the records have been appended to a write-ahead spool file in spool_dir. Records
+      are collected across tasks and posted once batch_size records are pending, or flush_interval seconds after the
+      first pending record, whichever comes first. Spool files are deleted once their records have been posted, and
+      records left in spool files by a worker that stopped before posting them are posted when the next submitter
+      starts. A failed post is retried with exponential backoff, up to max_retries times. Records that still can't
+      be posted, or that the catalogue rejects outright, e.g. with a 4xx response, have their spool files moved to
+      the dead-letter directory in spool_dir, where they are kept for inspection but never retried.
+
+    Args:
+        client_factory (Callable[[], DataCatalogueClient], optional): Creates the client. Defaults to the process
+            wide data catalogue client.
+        batch_size (int | None, optional): Number of pending records that triggers a flush in "spool" mode.
+            Defaults to settings.catalogue_batch_size.
+        flush_interval (float | None, optional): Maximum number of seconds a record waits to be posted in "spool"
+            mode, and before the first retry of a failed post. Defaults to settings.catalogue_flush_interval.
+        delivery (Delivery | None, optional): Delivery mode, either "ack" or "spool". Defaults to
+            settings.catalogue_delivery.
+        spool_dir (str | None, optional): Directory to write spool files to. Defaults to settings.catalogue_spool_dir.
+        max_retries (int | None, optional): Number of times a failed post is retried in "spool" mode before its
+            records are dead-lettered. Defaults to settings.catalogue_max_retries.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], DataCatalogueClient] = data_catalogue_client,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        delivery: Delivery | None = None,
+        spool_dir: str | None = None,
+        max_retries: int | None = None,
+    ):
+        self.client = client_factory()
+        self.batch_size = batch_size or settings.catalogue_batch_size
+        self.flush_interval = flush_interval or settings.catalogue_flush_interval
+        self.delivery = delivery or settings.catalogue_delivery
+        self.spool_dir = Path(spool_dir or settings.catalogue_spool_dir)
+        self.max_retries = (
+            settings.catalogue_max_retries if max_retries is None else max_retries
+        )
+
+        self._pending: list[CatalogueFileRecord] = []
+        self._waiters: list[asyncio.Future] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flushing: asyncio.Task | None = None
+        # Spool files whose records are pending, which are deleted once the records have been posted
+        self._spool_files: list[tuple[Path, IO[str]]] = []
+        self._spool_file: tuple[Path, IO[str]] | None = None
+        # Number of consecutive failed posts of the pending records
+        self._retries = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(
+            target=self._loop.run_forever, name="catalogue-submitter", daemon=True
+        )
+        self._thread.start()
+        if self.delivery == "spool":
+            self._call(self._recover_spool_files()).result()
+
+    def submit(self, file_records: list[CatalogueFileRecord]):
+        """Submit records to be catalogued. Blocks until the records have been posted in "ack" mode, or until they
+        have been written to the spool in "spool" mode.
+
+        Args:
+            file_records (list[CatalogueFileRecord]): Records to catalogue
+        """
+        if not file_records:
+            return
+        waiter = self._call(self._add(list(file_records))).result()
+        if waiter is not None:
+            self._call(self._wait(waiter)).result()
+
+    def flush(self):
+        """Post all pending records, blocking until they have been posted."""
+        self._call(self._flush()).result()
+
+    def close(self):
+        """Flush pending records and stop the event loop. Records that can't be posted stay in the spool in "spool"
+        mode."""
+        if self._loop.is_closed():
+            return
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Failed to flush catalogue records on close")
+        finally:
+            for _, f in self._spool_files:
+                f.close()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def _call(self, coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _add(
+        self, file_records: list[CatalogueFileRecord]
+    ) -> asyncio.Future | None:
+        """Add records to the pending batch, returning a future that resolves once they have been posted in "ack"
+        mode."""
+        waiter = None
+        if self.delivery == "spool":
+            self._spool(file_records)
+        else:
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+        self._pending.extend(file_records)
+
+        if self.delivery == "ack" or (
+            len(self._pending) >= self.batch_size and not self._retries
+        ):
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(
+                self.flush_interval, self._start_flush
+            )
+        return waiter
+
+    @staticmethod
+    async def _wait(waiter: asyncio.Future):
+        await waiter
+
+    def _start_flush(self):
+        if self._flushing is None or self._flushing.done():
+            self._flushing = self._loop.create_task(self._flush())
+            self._flushing.add_done_callback(self._flushed)
+
+    def _flushed(self, _: asyncio.Task):
+        """Post the records that were added while a post was in flight, if they would have triggered a flush. Records
+        put back by a failed post are left to be retried after flush_interval."""
+        if (
+            self._pending
+            and self._flush_handle is None
+            and (self.delivery == "ack" or len(self._pending) >= self.batch_size)
+        ):
+            self._start_flush()
+
+    async def _flush(self):
+        """Post every pending record in one request. If posting fails, the error is raised by submit in "ack" mode,
+        while in "spool" mode the records are put back in the pending batch, along with their spool files, and retried
+        after a delay that starts at flush_interval seconds and doubles with each failure, up to
+        settings.catalogue_max_backoff. Records that fail permanently, or more than max_retries times, are
+        dead-lettered."""
+        if self._flushing is not None and self._flushing is not asyncio.current_task():
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        file_records, self._pending = self._pending, []
+        waiters, self._waiters = self._waiters, []
+        spool_files, self._spool_files = self._spool_files, []
+        self._spool_file = None
+        try:
+            await self.client.post(
+                "catalogue/", file_records=[file_records], flush=False
+            )
+        except Exception as e:
+            logger.exception("Failed to post %d catalogue records", len(file_records))
+            if self.delivery == "spool":
+                self._retries += 1
+                if _is_permanent(e) or self._retries > self.max_retries:
+                    self._retries = 0
+                    self._dead_letter(file_records, spool_files)
+                else:
+                    self._pending[:0] = file_records
+                    self._spool_files[:0] = spool_files
+                    delay = min(
+                        self.flush_interval * 2 ** (self._retries - 1),
+                        settings.catalogue_max_backoff,
+                    )
+                    if self._flush_handle is not None:
+                        self._flush_handle.cancel()
+                    self._flush_handle = self._loop.call_later(delay, self._start_flush)
+            for waiter in waiters:
+                waiter.set_exception(e)
+            return
+        self._retries = 0
+        for waiter in waiters:
+            waiter.set_result(None)
+        for path, f in spool_files:
+            path.unlink(missing_ok=True)
+            f.close()
+
+    def _dead_letter(
+        self,
+        file_records: list[CatalogueFileRecord],
+        spool_files: list[tuple[Path, IO[str]]],
+    ):
+        """Move the spool files of records that can't be posted to the dead-letter directory, so that they are no
+        longer retried, by this submitter or by the next one to start."""
+        dead_letter_dir = self.spool_dir / "dead-letter"
+        dead_letter_dir.mkdir(parents=True, exist_ok=True)
+        for path, f in spool_files:
+            path.replace(dead_letter_dir / path.name)
+            f.close()
+        logger.error(
+            "Dead-lettered %d catalogue records to %s",
+            len(file_records),
+            dead_letter_dir,
+        )
+
+    def _spool(self, file_records: list[CatalogueFileRecord]):
+        """Append records to the current spool file, which is locked for as long as this submitter owns it."""
+        if self._spool_file is None:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            path = self.spool_dir / f"{os.getpid()}-{uuid.uuid4().hex}.jsonl"
+            f = path.open("a", encoding="utf8")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._spool_file = (path, f)
+            self._spool_files.append(self._spool_file)
+        _, f = self._spool_file
+        f.writelines(f"{record.model_dump_json()}\n" for record in file_records)
+        f.flush()
+        os.fsync(f.fileno())
+
+    async def _recover_spool_files(self):
+        """Add the records of spool files that aren't locked by another submitter to the pending batch."""
+        if not self.spool_dir.exists():
+            return
+        for path in sorted(self.spool_dir.glob("*.jsonl")):
+            f = path.open("r+", encoding="utf8")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            file_records = [
+                CatalogueFileRecord.model_validate_json(line)
+                for line in f
+                if line.strip()
+            ]
+            self._spool_files.append((path, f))
+            self._pending.extend(file_records)
+        if self._pending:
+            self._start_flush()
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Whether a failed post can't succeed when retried, because the records failed validation or the catalogue
+    rejected the request with a 4xx status, other than 408 Request Timeout and 429 Too Many Requests.
+    """
+    if isinstance(error, ValidationError):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return (
+        isinstance(status_code, int)
+        and 400 <= status_code < 500
+        and status_code not in (408, 429)
+    )
+
+
+_submitter: CatalogueSubmitter | None = None
+
+
+def get_catalogue_submitter() -> CatalogueSubmitter:
+    """Get the catalogue submitter for the current process, creating it on first use.
+
+    Returns:
+        CatalogueSubmitter: Catalogue submitter configured from settings
+    """
+    global _submitter
+    if _submitter is None:
+        _submitter = CatalogueSubmitter()
+    return _submitter
+
+
+def close_catalogue_submitter():
+    """Flush and close the catalogue submitter for the current process, if one has been created."""
+    global _submitter
+    if _submitter is not None:
+        _submitter.close()
+        _submitter = None
@@ -1,11 +1,50 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 
 from .settings import settings
+from .instrumentation import mark_process_dead, start_metrics_server
 
 
+# Task names, so that the API can publish tasks without importing src.tasks and the scripts behind it
+PREPARE_FILE = "src.tasks.prepare_file"
+PREPARE_FILES = "src.tasks.prepare_files"
+PREPARE_PART = "src.tasks.prepare_part"
+MERGE_PARTS = "src.tasks.merge_parts"
+
 app = Celery(
     "data-preparer", broker=settings.broker_url.unicode_string(), include=["src.tasks"]
 )
+# Tasks published without a queue, e.g. from the Celery CLI, are treated as small
+app.conf.task_default_queue = settings.small_queue
+
+
+@worker_init.connect
+def start_worker(sender=None, **kwargs):
+    # Imported here rather than at module level, as the API imports this module to publish tasks
+    from .bootstrap import preload_parent
+    from .executors import set_worker_concurrency
+
+    set_worker_concurrency(getattr(sender, "concurrency", None) or 1)
+    if settings.metrics_port:
+        start_metrics_server(settings.metrics_port)
+    preload_parent()
+
+
+@worker_process_init.connect
+def start_worker_process(**kwargs):
+    from .bootstrap import init_child
+
+    init_child()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process_pool(**kwargs):
+    from .executors import shutdown_process_pool
+    from .catalogue_submitter import close_catalogue_submitter
+
+    shutdown_process_pool()
+    close_catalogue_submitter()
+    mark_process_dead()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+"""Section level checkpoints of preparing a file, so that a task that is retried after dying part way through a file
+resumes from the first section it hadn't finished, rather than from the start of the file.
+"""
+import json
+import os
+
+import fsspec
+
+from .output_sinks import OutputSink
+from .settings import settings
+
+
+class Checkpoint:
+    """Manifest of the sections of a file that have been prepared, and the output each was written to. The manifest
+    is kept as JSON in a directory of its own under the output directory, named after the result cache key of
+    preparing the file, so a retry finds it whether it is a redelivery of the same task or a new task for the same
+    file and options.
+
+    The output of a section is recorded as pending before it is written, and as done once the output sink has
+    committed it. When the manifest is loaded, a pending output is adopted if it was committed before the task died,
+    and otherwise the temporary files of its write are removed.
+
+    Args:
+        key (str): Result cache key of preparing the file
+        data_supplier (str): Who supplied the file
+        output_sink (OutputSink | None, optional): Sink to write the manifest with. Defaults to a new OutputSink.
+    """
+
+    def __init__(
+        self, key: str, data_supplier: str, output_sink: OutputSink | None = None
+    ):
+        self.directory = os.path.join(
+            settings.output_dir, data_supplier, "checkpoints", key.rpartition(":")[2]
+        )
+        self.output_sink = output_sink or OutputSink()
+        self.sections: dict[int, str] = {}
+        self.pending: dict[int, str] = {}
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def load(self) -> int:
+        """Load the manifest left by an earlier attempt, adopting or cleaning up the outputs it left pending.
+
+        Returns:
+            int: Number of sections that are done
+        """
+        fs, path = fsspec.core.url_to_fs(self.manifest_path)
+        try:
+            manifest = json.loads(fs.cat_file(path))
+        except FileNotFoundError:
+            return 0
+        self.sections = {int(index): p for index, p in manifest["sections"].items()}
+        for index, output_path in manifest["pending"].items():
+            fs, path = fsspec.core.url_to_fs(output_path)
+            if fs.exists(path):
+                self.sections[int(index)] = output_path
+            else:
+                self.output_sink.discard(output_path)
+        self.pending = {}
+        return len(self.sections)
+
+    def start(self, index: int, output_path: str):
+        """Record that the output of a section is about to be written.
+
+        Args:
+            index (int): Index of the section
+            output_path (str): Location the section's output will be written to
+        """
+        self.pending[index] = output_path
+        self._save()
+
+    def finish(self, index: int):
+        """Record that the output of a section has been committed.
+
+        Args:
+            index (int): Index of the section
+        """
+        self.sections[index] = self.pending.pop(index)
+        self._save()
+
+    def section_path(self, index: int) -> str:
+        """Location to write a section's output to, when sections are concatenated into one output file once they
+        are all done.
+
+        Args:
+            index (int): Index of the section
+
+        Returns:
+            str: Location of the section's output, next to the manifest
+        """
+        return os.path.join(self.directory, f"{index:05d}.parquet")
+
+    def output_paths(self) -> list[str]:
+        """Outputs of the sections that are done, in section order.
+
+        Returns:
+            list[str]: Output locations
+        """
+        return [self.sections[index] for index in sorted(self.sections)]
+
+    def clear(self):
+        """Delete the manifest, and any section outputs written next to it, once the file has been prepared."""
+        fs, path = fsspec.core.url_to_fs(self.directory)
+        try:
+            fs.rm(path, recursive=True)
+        except FileNotFoundError:
+            pass
+
+    def _save(self):
+        manifest = {"sections": self.sections, "pending": self.pending}
+        with self.output_sink.open(self.manifest_path) as f:
+            f.write(json.dumps(manifest).encode("utf8"))
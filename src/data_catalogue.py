@@ -1,32 +1,87 @@
+from typing import Any
 import asyncio
+import hashlib
 
 from m2m_base_client.clients import DataCatalogueClient
 from m2m_base_client.models import CatalogueFileRecord
+from prometheus_client import Counter
 
 from src.settings import settings
+from src.cache import MemcachedCache, MemoryCache
 
+TOKEN_CACHE_EVENTS = Counter(
+    "catalogue_token_cache_events",
+    "Hits, misses and refreshes of the data catalogue's token cache",
+    ["event"],
+)
 
-class DummyCache:
-    def __init__(self):
-        self.cache = {}
 
-    def get(self, key):
-        return self.cache.get(key)
+class TokenCache:
+    """Cache for the access tokens of DataCatalogueClient. Tokens are stored in memcached, so they are reused across
+    tasks and worker processes until they expire, with an in-memory fallback when memcached can't be reached. Tokens
+    are expired expiry_margin seconds early, so that a token is never used just as it runs out.
 
-    def set(self, key, value, timeout):
-        self.cache[key] = value
+    Cache hits, misses and refreshes (tokens fetched and stored) are counted by the catalogue_token_cache_events
+    metric, labelled by event.
+
+    Args:
+        cache (MemcachedCache | MemoryCache | None, optional): Cache to store the tokens in. Defaults to memcached at
+            settings.memcached_url.
+        expiry_margin (float, optional): Number of seconds to expire tokens early by. Defaults to 60.
+    """
+
+    prefix = "catalogue-token"
+
+    def __init__(
+        self,
+        cache: MemcachedCache | MemoryCache | None = None,
+        expiry_margin: float = 60,
+    ):
+        self.cache = cache or MemcachedCache(fallback=MemoryCache(max_entries=16))
+        self.expiry_margin = expiry_margin
+
+    def get(self, key: str) -> Any:
+        value = self.cache.get(self._key(key))
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: Any, timeout: float | None = None):
+        if timeout:
+            timeout = max(timeout - self.expiry_margin, 1)
+        self.cache.set(self._key(key), value, timeout)
+        self._count("refreshes")
+
+    def _key(self, key: str) -> str:
+        """Namespace the key and make it a valid memcached key, whatever characters it contains."""
+        return f"{self.prefix}:{hashlib.sha256(str(key).encode('utf8')).hexdigest()}"
+
+    @staticmethod
+    def _count(event: str):
+        TOKEN_CACHE_EVENTS.labels(event=event).inc()
+
+
+_client: DataCatalogueClient | None = None
 
 
 def data_catalogue_client() -> DataCatalogueClient:
-    return DataCatalogueClient(
-        client_id=settings.auth0.client_id,
-        client_secret=settings.auth0.client_secret.get_secret_value(),
-        authorization_base_url=str(settings.auth0.authorization_base_url),
-        audience=str(settings.auth0.audience).rstrip("/"),
-        cache=DummyCache(),
-        root_url=str(settings.auth0.root_url),
-        timeout=30.0,
-    )
+    """Get the data catalogue client for the current process, creating it on first use so that it is reused across
+    tasks along with its token cache.
+
+    Returns:
+        DataCatalogueClient: Data catalogue client configured from settings.auth0
+    """
+    global _client
+    if _client is None:
+        _client = DataCatalogueClient(
+            client_id=settings.auth0.client_id,
+            client_secret=settings.auth0.client_secret.get_secret_value(),
+            authorization_base_url=str(settings.auth0.authorization_base_url),
+            audience=str(settings.auth0.audience).rstrip("/"),
+            cache=TokenCache(),
+            root_url=str(settings.auth0.root_url),
+            timeout=30.0,
+        )
+    return _client
 
 
 def request_file_catalogue(
@@ -0,0 +1,47 @@
+from .cache import MemcachedCache, MemoryCache, get_cache
+from .settings import settings
+
+
+class DeliveryCounter:
+    """Number of times each task has been delivered, kept in the cache so that it survives the worker process that
+    was running the task dying. Tasks that are acknowledged late and requeued when their worker dies would otherwise
+    be redelivered forever if they always kill their worker, e.g. a file that always runs out of memory.
+
+    Only redelivered tasks are counted, so a task's first delivery costs no cache requests.
+
+    Args:
+        cache (MemcachedCache | MemoryCache | None, optional): Cache to keep counts in. Defaults to the process wide
+            memcached cache.
+        timeout (int | None, optional): Number of seconds to keep counts for. Defaults to
+            settings.result_cache_timeout.
+    """
+
+    prefix = "deliveries"
+
+    def __init__(
+        self,
+        cache: MemcachedCache | MemoryCache | None = None,
+        timeout: int | None = None,
+    ):
+        self.cache = cache or get_cache()
+        self.timeout = timeout or settings.result_cache_timeout
+
+    def count(self, task_id: str, redelivered: bool) -> int:
+        """Count a delivery of a task.
+
+        Args:
+            task_id (str): ID of the task
+            redelivered (bool): Whether the broker has delivered the task before, from its delivery_info
+
+        Returns:
+            int: Number of times the task has been delivered, including this one
+        """
+        if not redelivered:
+            return 1
+        key = f"{self.prefix}:{task_id}"
+        deliveries = self.cache.incr(key)
+        if deliveries is None:
+            # The first redelivery, as the first delivery isn't counted
+            deliveries = 2
+            self.cache.set(key, deliveries, self.timeout)
+        return deliveries
@@ -0,0 +1,239 @@
+from collections.abc import Hashable
+from io import SEEK_END
+from typing import BinaryIO
+import codecs
+import logging
+
+import charset_normalizer
+
+from .cache import MemcachedCache, MemoryCache, get_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class EncodingDetector:
+    """Encoding detection shared by all FileHandlers. Detection only looks at a bounded sample from the start and the
+    end of a file, so its cost doesn't depend on the size of the file.
+
+    The detected encoding is remembered under a key, typically (data_supplier, feed_identifier), so later files with
+    the same key that don't decode with the expected encoding are checked against the remembered encoding, and
+    detection only runs again if the sample doesn't decode with it either. As the sample may miss the bytes that
+    don't decode, files that fail to decode part way through are detected again from the whole file with
+    detect_file.
+
+    Args:
+        sample_size (int, optional): Number of bytes to sample from each end of a file. Defaults to 64KB.
+        preferred_encodings (tuple[str, ...], optional): Encodings to pick when several candidates fit the sample
+            equally well. Defaults to utf8, then cp1252, then latin1.
+        cache (MemcachedCache | MemoryCache | None, optional): Cache to remember encodings in. Defaults to the process
+            wide memcached cache.
+    """
+
+    prefix = "encoding"
+
+    def __init__(
+        self,
+        sample_size: int = 64 * 1024,
+        preferred_encodings: tuple[str, ...] = ("utf_8", "cp1252", "latin_1"),
+        cache: MemcachedCache | MemoryCache | None = None,
+    ):
+        self.sample_size = sample_size
+        self.preferred_encodings = [
+            codecs.lookup(encoding).name for encoding in preferred_encodings
+        ]
+        self._cache = cache
+
+    @property
+    def cache(self) -> MemcachedCache | MemoryCache:
+        if self._cache is None:
+            self._cache = get_cache()
+        return self._cache
+
+    def resolve(
+        self,
+        sample: tuple[bytes, bytes],
+        encoding: str | None = None,
+        key: Hashable | None = None,
+    ) -> str:
+        """Resolve the encoding of a file from a sample. The given encoding is tried first, then the encoding
+        remembered for the key, and the encoding is only detected if the sample doesn't decode with either of them.
+
+        Args:
+            sample (tuple[bytes, bytes]): Bytes from the start and the end of the file, from sample_file or
+                sample_buffer
+            encoding (str | None, optional): Encoding the file is expected to have. Defaults to None.
+            key (Hashable | None, optional): Key to remember the encoding under. Defaults to None.
+
+        Raises:
+            ValueError: If the encoding cannot be inferred.
+
+        Returns:
+            str: Encoding of the file
+        """
+        if encoding is not None and self.decodes(sample, encoding):
+            return encoding
+        cache_key = self._cache_key(key) if key is not None else None
+        remembered = self.cache.get(cache_key) if cache_key is not None else None
+        if remembered is not None and self.decodes(sample, remembered):
+            return remembered
+
+        detected = self.detect(sample)
+        logger.info("Detected %s encoding for %s", detected, key)
+        if cache_key is not None:
+            self.cache.set(cache_key, detected)
+        return detected
+
+    def detect(self, sample: tuple[bytes, bytes]) -> str:
+        """Detect the encoding of a sample with charset-normalizer. Of the candidates that fit the sample best, the
+        first preferred encoding is picked, as single byte encodings are often indistinguishable on short samples.
+
+        Args:
+            sample (tuple[bytes, bytes]): Bytes from the start and the end of the file
+
+        Raises:
+            ValueError: If the encoding cannot be inferred.
+
+        Returns:
+            str: Detected encoding
+        """
+        prefix, suffix = sample
+        for encoding in self._candidates(prefix + suffix):
+            if self.decodes(sample, encoding):
+                return encoding
+        raise ValueError("Could not infer encoding")
+
+    def detect_file(self, f: BinaryIO, encoding: str) -> str:
+        """Detect the encoding of a whole file that fails to decode part way through with the encoding resolved from
+        its sample. Candidates are detected from the start of the file and the block that failed to decode, and the
+        first candidate that decodes the whole file is picked. The file's position is left unchanged.
+
+        Args:
+            f (BinaryIO): Seekable binary file object
+            encoding (str): Encoding the file failed to decode with
+
+        Raises:
+            ValueError: If the encoding cannot be inferred.
+
+        Returns:
+            str: Detected encoding
+        """
+        start = f.tell()
+        try:
+            prefix = f.read(self.sample_size)
+            f.seek(start)
+            failed = self._failing_block(f, encoding)
+            for candidate in self._candidates(prefix + failed):
+                f.seek(start)
+                if (
+                    candidate != codecs.lookup(encoding).name
+                    and self._failing_block(f, candidate) == b""
+                ):
+                    logger.info("Detected %s encoding from the whole file", candidate)
+                    return candidate
+        finally:
+            f.seek(start)
+        raise ValueError("Could not infer encoding")
+
+    def _candidates(self, sample: bytes) -> list[str]:
+        """List the encodings charset-normalizer finds for a sample, from the best fit to the worst. Of the encodings
+        that fit equally well, preferred encodings come first, as single byte encodings are often indistinguishable
+        on short samples."""
+
+        def rank(encoding: str, chaos: float) -> tuple[float, int]:
+            if encoding in self.preferred_encodings:
+                return chaos, self.preferred_encodings.index(encoding)
+            return chaos, len(self.preferred_encodings)
+
+        matches = [
+            (codecs.lookup(match.encoding).name, match.chaos)
+            for match in charset_normalizer.from_bytes(sample)
+        ]
+        return [encoding for encoding, _ in sorted(matches, key=lambda m: rank(*m))]
+
+    def _failing_block(self, f: BinaryIO, encoding: str) -> bytes:
+        """Decode a file block by block, returning the first block that fails to decode, or empty bytes if the whole
+        file decodes."""
+        decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+        while block := f.read(self.sample_size):
+            try:
+                decoder.decode(block, final=False)
+            except UnicodeDecodeError:
+                return block
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return decoder.getstate()[0]
+        return b""
+
+    @staticmethod
+    def decodes(sample: tuple[bytes, bytes], encoding: str) -> bool:
+        """Check that a sample decodes with an encoding. The prefix may end, and the suffix may start, part way
+        through a multibyte character, as the sample may have been cut from a longer file.
+
+        Args:
+            sample (tuple[bytes, bytes]): Bytes from the start and the end of the file
+            encoding (str): Encoding to check
+
+        Returns:
+            bool: Whether the sample decodes
+        """
+        prefix, suffix = sample
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+            decoder.decode(prefix, final=False)
+        except (UnicodeDecodeError, LookupError):
+            return False
+        if not suffix:
+            return True
+        for start in range(min(4, len(suffix))):
+            try:
+                codecs.decode(suffix[start:], encoding)
+                return True
+            except UnicodeDecodeError:
+                continue
+        return False
+
+    def sample_file(self, f: BinaryIO) -> tuple[bytes, bytes]:
+        """Sample the start and the end of a binary file, leaving its position unchanged.
+
+        Args:
+            f (BinaryIO): Seekable binary file object
+
+        Returns:
+            tuple[bytes, bytes]: Bytes from the start and the end of the file. The end is empty if the file fits in
+                the first sample.
+        """
+        start = f.tell()
+        prefix = f.read(self.sample_size)
+        suffix = b""
+        if len(prefix) == self.sample_size:
+            end = f.seek(0, SEEK_END)
+            f.seek(max(end - self.sample_size, start + self.sample_size))
+            suffix = f.read(self.sample_size)
+        f.seek(start)
+        return prefix, suffix
+
+    def sample_buffer(
+        self, buffer: bytes | bytearray | memoryview
+    ) -> tuple[bytes, bytes]:
+        """Sample the start and the end of an in memory buffer.
+
+        Args:
+            buffer (bytes | bytearray | memoryview): Buffer to sample
+
+        Returns:
+            tuple[bytes, bytes]: Bytes from the start and the end of the buffer
+        """
+        with memoryview(buffer) as view, view.cast("B") as view:
+            prefix = view[: self.sample_size].tobytes()
+            suffix = view[max(len(view) - self.sample_size, self.sample_size) :]
+            return prefix, suffix.tobytes()
+
+    def _cache_key(self, key: Hashable) -> str:
+        """Build a valid memcached key from the key."""
+        parts = key if isinstance(key, tuple) else (key,)
+        return ":".join([self.prefix, *("".join(str(p).split()) for p in parts)])
+
+
+encoding_detector = EncodingDetector()
@@ -0,0 +1,290 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Hashable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import multiprocessing
+import os
+from typing import TextIO, BinaryIO
+
+import pandas as pd
+
+from .scripts.base import BaseScript
+from .settings import settings
+from .file_handlers import FileHandler, MemoryReader, buffer_of, redecode, text_view
+
+
+def run_script(script: BaseScript, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
+    """Run a script on a file object. If the file object fails to decode part way through, as its encoding was
+    resolved from a sample that missed the bytes that don't decode, the script is run again on the file object
+    reopened with the encoding detected from the whole file.
+
+    Args:
+        script (BaseScript): Script to run
+        file_obj (TextIO | BinaryIO): File object yielded by a FileHandler
+
+    Returns:
+        pd.DataFrame: Dataframe of the file object
+    """
+    try:
+        return script.run(file_obj)
+    except UnicodeDecodeError:
+        redecoded = redecode(file_obj)
+        if redecoded is None:
+            raise
+    with redecoded:
+        return script.run(redecoded)
+
+
+class SectionExecutor(ABC):
+    """Abstract SectionExecutor class that decides how a script is run over the file objects yielded by a
+    FileHandler."""
+
+    @abstractmethod
+    def map(
+        self, script: BaseScript, file_objects: Iterable[TextIO | BinaryIO]
+    ) -> Iterator[pd.DataFrame]:
+        """Run the script on each file object, yielding the results in the same order as the file objects.
+
+        Args:
+            script (BaseScript): Script to run
+            file_objects (Iterable[TextIO | BinaryIO]): File objects yielded by a FileHandler
+
+        Yields:
+            Iterator[pd.DataFrame]: Dataframe for each file object
+        """
+
+    def map_file(
+        self,
+        script: BaseScript,
+        file_handler: FileHandler,
+        file_path: str,
+        encoding_key: Hashable | None = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Run the script on each section of a file, yielding the results in the same order as the file handler
+        yields the sections.
+
+        Args:
+            script (BaseScript): Script to run
+            file_handler (FileHandler): File handler to open the file with
+            file_path (str): Path to the file
+            encoding_key (Hashable | None, optional): Key the file handler remembers the detected encoding under
+
+        Returns:
+            Iterator[pd.DataFrame]: Dataframe for each section
+        """
+        return self.map(script, file_handler.open(file_path, encoding_key))
+
+
+class SerialExecutor(SectionExecutor):
+    """Runs the script on each file object in the current process, one after another."""
+
+    def map(
+        self, script: BaseScript, file_objects: Iterable[TextIO | BinaryIO]
+    ) -> Iterator[pd.DataFrame]:
+        for file_obj in file_objects:
+            yield run_script(script, file_obj)
+
+
+class ProcessPoolSectionExecutor(SectionExecutor):
+    """Runs the script on each file object in a process pool. The contents of each file object are copied into shared
+    memory, so only the name of the shared memory block is sent to the worker process rather than the pickled section.
+    Results are yielded in the original order, with at most max_pending sections in flight at a time.
+
+    Args:
+        pool (ProcessPoolExecutor | None, optional): Pool to run the script in. Defaults to the process wide pool.
+        max_pending (int | None, optional): Maximum number of sections in flight. Defaults to twice max_workers.
+        max_workers (int | None, optional): Number of processes in the pool. Defaults to the size of the process
+            wide pool.
+    """
+
+    def __init__(
+        self,
+        pool: ProcessPoolExecutor | None = None,
+        max_pending: int | None = None,
+        max_workers: int | None = None,
+    ):
+        self.pool = pool or get_process_pool()
+        self.max_pending = max_pending or 2 * (max_workers or process_pool_size())
+
+    def map(
+        self, script: BaseScript, file_objects: Iterable[TextIO | BinaryIO]
+    ) -> Iterator[pd.DataFrame]:
+        return self._results(self._submit(script, f) for f in file_objects)
+
+    def map_file(
+        self,
+        script: BaseScript,
+        file_handler: FileHandler,
+        file_path: str,
+        encoding_key: Hashable | None = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Run the script on each section of a file. If the file handler can open sections independently, each
+        worker process opens its own section, so sections are read in parallel and never pass through this process.
+        Otherwise the sections are read here and sent to the workers as with map.
+        """
+        refs = file_handler.section_refs(file_path)
+        if refs is None:
+            return self.map(script, file_handler.open(file_path, encoding_key))
+        return self._results(
+            (
+                self.pool.submit(
+                    _run_section_ref,
+                    script,
+                    file_handler,
+                    file_path,
+                    ref,
+                    encoding_key,
+                ),
+                None,
+            )
+            for ref in refs
+        )
+
+    def _results(
+        self, submissions: Iterable[tuple[Future, SharedMemory | None]]
+    ) -> Iterator[pd.DataFrame]:
+        """Yield the results of submissions in order, pulling the next submission whenever fewer than max_pending
+        are in flight."""
+        pending: deque[tuple[Future, SharedMemory | None]] = deque()
+        try:
+            for submission in submissions:
+                pending.append(submission)
+                if len(pending) >= self.max_pending:
+                    yield self._result(*pending.popleft())
+            while pending:
+                yield self._result(*pending.popleft())
+        finally:
+            for future, shm in pending:
+                future.cancel()
+            for future, shm in pending:
+                if not future.cancelled():
+                    future.exception()
+                _release(shm)
+
+    def _submit(
+        self, script: BaseScript, file_obj: TextIO | BinaryIO
+    ) -> tuple[Future, SharedMemory | None]:
+        """Submit a file object to the pool, copying its contents into shared memory if it is backed by a buffer.
+        Otherwise the file object itself is pickled.
+
+        Args:
+            script (BaseScript): Script to run
+            file_obj (TextIO | BinaryIO): File object to run the script on
+
+        Returns:
+            tuple[Future, SharedMemory | None]: Future for the result and the shared memory block, if one was used.
+        """
+        contents = buffer_of(file_obj)
+        if contents is None:
+            return self.pool.submit(run_script, script, file_obj), None
+
+        buffer, encoding = contents
+        shm = SharedMemory(create=True, size=max(len(buffer), 1))
+        shm.buf[: len(buffer)] = buffer
+        future = self.pool.submit(
+            _run_section,
+            script,
+            shm.name,
+            len(buffer),
+            encoding,
+            getattr(file_obj, "name", None),
+        )
+        return future, shm
+
+    @staticmethod
+    def _result(future: Future, shm: SharedMemory | None) -> pd.DataFrame:
+        try:
+            return future.result()
+        finally:
+            _release(shm)
+
+
+def _release(shm: SharedMemory | None):
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+
+
+def _run_section(
+    script: BaseScript,
+    shm_name: str,
+    size: int,
+    encoding: str | None,
+    name: str | None,
+) -> pd.DataFrame:
+    """Run a script on a section stored in shared memory. This is called in the worker process."""
+    shm = SharedMemory(shm_name)
+    try:
+        if encoding is None:
+            file_obj = MemoryReader(shm.buf[:size], name)
+        else:
+            file_obj = text_view(shm.buf[:size], encoding, name)
+        with file_obj:
+            return run_script(script, file_obj)
+    finally:
+        shm.close()
+
+
+def _run_section_ref(
+    script: BaseScript,
+    file_handler: FileHandler,
+    file_path: str,
+    ref: Hashable,
+    encoding_key: Hashable | None,
+) -> pd.DataFrame:
+    """Open a section of a file and run a script on it. This is called in the worker process."""
+    with file_handler.open_section(file_path, ref, encoding_key) as file_obj:
+        return run_script(script, file_obj)
+
+
+_process_pool: ProcessPoolExecutor | None = None
+_worker_concurrency = 1
+
+
+def set_worker_concurrency(concurrency: int):
+    """Record how many Celery worker processes share the machine, so that their process pools share its CPUs rather
+    than each taking all of them. Called in the parent process before the worker processes are forked.
+
+    Args:
+        concurrency (int): Number of Celery worker processes
+    """
+    global _worker_concurrency
+    _worker_concurrency = max(1, concurrency)
+
+
+def process_pool_size() -> int:
+    """Number of processes in the process pool of the current process.
+
+    Returns:
+        int: settings.preparer_processes, defaulting to an even share of the CPUs between the Celery worker processes
+    """
+    return settings.preparer_processes or max(
+        1, (os.cpu_count() or 1) // _worker_concurrency
+    )
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the process pool for the current process, creating it on first use so that each Celery worker process
+    creates its pool once and reuses it across tasks.
+
+    Pool processes are started by a forkserver rather than forked from the worker process, which by then runs the
+    catalogue submitter's and staging cache's threads.
+
+    Returns:
+        ProcessPoolExecutor: Process pool with process_pool_size workers
+    """
+    global _process_pool
+    if _process_pool is None:
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        _process_pool = ProcessPoolExecutor(process_pool_size(), mp_context=context)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    """Shut down the process pool for the current process, if one has been created."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
@@ -1,15 +1,46 @@
-import datetime
+from collections.abc import Iterable
 from typing import Type
+import datetime
+import importlib
 
 from src.scripts.base import BaseScript
 from src.file_handlers import FileHandler, BasicFileHandler
 from src.preparer import FilePreparer
+from src.executors import SectionExecutor
+from src.output_formats import OutputFormat, CSVOutputFormat, OUTPUT_FORMATS
+
+
+# Module that registers the script for each feed and version. Modules are only imported when their feed is first
+# created, or when the feeds are preloaded, so that processes that only publish tasks never import the scripts.
+FEED_MODULES: dict[tuple[str, int], str] = {
+    ("retaillink_daily_sales", 1): "src.scripts.retaillink.daily_sales",
+    ("retaillink_current_store_stock", 1): "src.scripts.retaillink.current_store_stock",
+    (
+        "waitroseconnect_daily_line_sales",
+        1,
+    ): "src.scripts.waitroseconnect.daily_line_sales",
+    (
+        "horizon_daily_performance_sales",
+        1,
+    ): "src.scripts.horizon.daily_performance_sales",
+}
 
 
 class PreparerFactory:
-    """Factory class that can be used to create instances of FilePreparer"""
+    """Factory class that can be used to create instances of FilePreparer. Scripts register themselves when their
+    module is imported, and the module of a feed in the manifest is imported the first time the feed is resolved.
 
-    _registry: dict[tuple[str, int], tuple[Type[BaseScript], FileHandler]] = {}
+    Args:
+        manifest (dict[tuple[str, int], str] | None, optional): Module to import for each feed and version. Defaults
+            to FEED_MODULES.
+    """
+
+    _registry: dict[
+        tuple[str, int], tuple[Type[BaseScript], FileHandler, OutputFormat]
+    ] = {}
+
+    def __init__(self, manifest: dict[tuple[str, int], str] | None = None):
+        self.manifest = FEED_MODULES if manifest is None else manifest
 
     def _register(
         self,
@@ -17,19 +48,29 @@ class PreparerFactory:
         feed_version: int,
         script: Type[BaseScript],
         file_handler: FileHandler,
+        output_format: OutputFormat | None = None,
     ):
-        """Register a script and file handler for a given feed and version
+        """Register a script, file handler and output format for a given feed and version
 
         Args:
             feed_identifier (str): Identifier of feed
             feed_version (int): Version of feed
             script (Type[BaseScript]): Script to use for processing feed
             file_handler (FileHandler): File handler to use for opening the file. Defaults to BasicFileHandler.
+            output_format (OutputFormat | None): Format to write the prepared file in. Defaults to CSVOutputFormat.
         """
-        self._registry[(feed_identifier, feed_version)] = (script, file_handler)
+        self._registry[(feed_identifier, feed_version)] = (
+            script,
+            file_handler,
+            output_format or CSVOutputFormat(),
+        )
 
     def register(
-        self, feed: str, version: int, opener: FileHandler = BasicFileHandler()
+        self,
+        feed: str,
+        version: int,
+        opener: FileHandler = BasicFileHandler(),
+        output_format: OutputFormat | None = None,
     ):
         """Decorator to register a script and file handler for a given feed and version
 
@@ -37,10 +78,11 @@ class PreparerFactory:
             feed (str): Identifier of feed
             version (int): Version of feed
             opener (FileHandler): File handler to use for opening the file
+            output_format (OutputFormat | None): Format to write the prepared file in. Defaults to CSVOutputFormat.
         """
 
         def decorator(script: Type[BaseScript]):
-            self._register(feed, version, script, opener)
+            self._register(feed, version, script, opener, output_format)
             return script
 
         return decorator
@@ -53,6 +95,8 @@ class PreparerFactory:
         start_date: datetime.date,
         end_date: datetime.date,
         source_creation_timestamp: datetime.datetime,
+        executor: SectionExecutor | None = None,
+        output_format: str | None = None,
     ) -> FilePreparer:
         """Create a FilePreparer instance for the given feed and version
 
@@ -63,11 +107,17 @@ class PreparerFactory:
             start_date (datetime.date): Start date of the data contained in the file (inclusive)
             end_date (datetime.date): End date of the data contained in the file (inclusive)
             source_creation_timestamp (datetime.datetime): Source creation timestamp of the file
+            executor (SectionExecutor | None, optional): Executor used to run the script on each section of the
+                file. Defaults to running each section in the current process.
+            output_format (str | None, optional): Name of the format to write the prepared file in. Defaults to the
+                format the feed was registered with.
 
         Returns:
             FilePreparer: Instance of FilePreparer for the given feed and version
         """
-        script_cls, file_handler = self._registry[(identifier, version)]
+        script_cls, file_handler, feed_output_format = self.resolve(identifier, version)
+        if output_format is not None and output_format != feed_output_format.name:
+            feed_output_format = OUTPUT_FORMATS[output_format]()
         return FilePreparer(
             script_cls,
             file_handler,
@@ -77,7 +127,53 @@ class PreparerFactory:
             start_date,
             end_date,
             source_creation_timestamp,
+            executor,
+            feed_output_format,
         )
 
+    def resolve(
+        self, identifier: str, version: int
+    ) -> tuple[Type[BaseScript], FileHandler, OutputFormat]:
+        """Get the script, file handler and output format registered for a feed, importing the feed's module from
+        the manifest if it hasn't been imported yet.
+
+        Args:
+            identifier (str): Identifier of feed
+            version (int): Version of feed
+
+        Raises:
+            KeyError: If no script is registered for the feed and version.
+
+        Returns:
+            tuple[Type[BaseScript], FileHandler, OutputFormat]: Script, file handler and output format of the feed
+        """
+        key = (identifier, version)
+        if key not in self._registry and key in self.manifest:
+            importlib.import_module(self.manifest[key])
+        try:
+            return self._registry[key]
+        except KeyError:
+            raise KeyError(
+                f"No script registered for {identifier} version {version}"
+            ) from None
+
+    def feeds(self) -> list[tuple[str, int]]:
+        """List every feed and version that can be created, whether or not its module has been imported.
+
+        Returns:
+            list[tuple[str, int]]: Feed identifier and version of each feed
+        """
+        return sorted(set(self.manifest) | set(self._registry))
+
+    def preload(self, feeds: Iterable[tuple[str, int]] | None = None):
+        """Import the modules of feeds ahead of their first use, e.g. in a worker before it forks.
+
+        Args:
+            feeds (Iterable[tuple[str, int]] | None, optional): Feeds to preload. Defaults to every feed in the
+                manifest.
+        """
+        for identifier, version in self.manifest if feeds is None else feeds:
+            self.resolve(identifier, version)
+
 
 preparer_factory = PreparerFactory()
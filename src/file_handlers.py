@@ -1,135 +1,777 @@
 from abc import ABC, abstractmethod
-from io import StringIO, BytesIO
+from io import BytesIO, BufferedIOBase, TextIOWrapper, SEEK_SET, SEEK_CUR
+import logging
+import mmap
+import os
 import zipfile
 import re
-from collections.abc import Generator
+from collections.abc import Container, Generator, Hashable
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import TextIO, BinaryIO
 
-import chardet
 import fsspec
+import numpy as np
+from fsspec.implementations.local import LocalFileSystem
+
+from .encoding_detection import encoding_detector
+from .instrumentation import Instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = b" \t\n\r\x0b\x0c"
+
+# Length of quoted record from which quote characters are no longer trusted to delimit records
+MAX_RECORD_SIZE = 1024 * 1024
+# Number of bytes scanned at a time when counting quotes, which bounds the size of the temporary arrays
+_BLOCK_SIZE = 1024 * 1024
+
+
+class MemoryReader(BufferedIOBase):
+    """Read only binary file object over an existing buffer. Unlike BytesIO, this never copies the buffer, so it can
+    be used to expose a slice of a larger bytearray or mmap as a file."""
+
+    def __init__(self, buffer: bytes | bytearray | memoryview, name: str | None = None):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+        if name is not None:
+            self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def getbuffer(self) -> memoryview:
+        """Return a view of the underlying buffer, without copying it."""
+        return self._view
+
+    def read(self, size: int | None = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else self._position + size
+        data = self._view[self._position : end].tobytes()
+        self._position += len(data)
+        return data
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def readinto(self, b) -> int:
+        data = self._view[self._position : self._position + len(b)]
+        b[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_SET:
+            self._position = offset
+        elif whence == SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = len(self._view) + offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        """Release the view of the underlying buffer, so that it can be resized or unmapped."""
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def text_view(
+    buffer: bytes | bytearray | memoryview,
+    encoding: str = "utf8",
+    name: str | None = None,
+) -> TextIOWrapper:
+    """Wrap a buffer in a text mode file object that decodes it incrementally as it is read, rather than decoding the
+    whole buffer into a new string up front.
+
+    Args:
+        buffer (bytes | bytearray | memoryview): The encoded contents of the file.
+        encoding (str, optional): The encoding of the buffer. Defaults to "utf8".
+        name (str | None, optional): Name of the file. Defaults to None.
+
+    Returns:
+        TextIOWrapper: A text mode file object over the buffer.
+    """
+    return TextIOWrapper(MemoryReader(buffer, name), encoding=encoding, newline="")
+
+
+def buffer_of(
+    file_obj: TextIO | BinaryIO,
+) -> tuple[memoryview, str | None] | None:
+    """Get the encoded contents of a file object yielded by a FileHandler, without copying them.
+
+    Args:
+        file_obj (TextIO | BinaryIO): The file object.
+
+    Returns:
+        tuple[memoryview, str | None] | None: A view of the contents and their encoding, which is None for binary
+            files. None if the file object is not backed by an in memory buffer.
+    """
+    if isinstance(file_obj, TextIOWrapper):
+        if isinstance(file_obj.buffer, (MemoryReader, BytesIO)):
+            return file_obj.buffer.getbuffer(), file_obj.encoding
+    elif isinstance(file_obj, (MemoryReader, BytesIO)):
+        return file_obj.getbuffer(), None
+    return None
+
+
+def redecode(file_obj: TextIO | BinaryIO) -> TextIOWrapper | None:
+    """Reopen a text file object that failed to decode part way through, which happens when its encoding was resolved
+    from a sample that missed the bytes that don't decode. The encoding is detected from the whole file.
+
+    Args:
+        file_obj (TextIO | BinaryIO): The file object that failed to decode.
+
+    Returns:
+        TextIOWrapper | None: A text mode file object over the same contents, from the start. None if file_obj isn't
+            a text file object whose contents can be read again.
+    """
+    if not isinstance(file_obj, TextIOWrapper):
+        return None
+    contents = buffer_of(file_obj)
+    if contents is not None:
+        buffer, encoding = contents
+        with MemoryReader(buffer) as reader:
+            detected = encoding_detector.detect_file(reader, encoding)
+        return text_view(buffer, detected, getattr(file_obj, "name", None))
+    raw = file_obj.buffer
+    if not raw.seekable():
+        return None
+    raw.seek(0)
+    detected = encoding_detector.detect_file(raw, file_obj.encoding)
+    return TextIOWrapper(raw, encoding=detected, newline="")
+
+
+def local_path(file_path: str) -> str | None:
+    """Get the local path of a file, if it is on the local filesystem.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        str | None: The local path, or None if the file isn't local.
+    """
+    fs, path = fsspec.core.url_to_fs(file_path)
+    return path if isinstance(fs, LocalFileSystem) else None
+
+
+@contextmanager
+def mapped_file(file_path: str) -> Generator[mmap.mmap | bytes | None, None, None]:
+    """Memory map a local file read only, so that it can be parsed straight from the page cache without being read
+    into a buffer first. Slices of the map should be taken with memoryview, which doesn't copy them.
+
+    The map is closed on exit unless views of it are still referenced, in which case it is unmapped once they have
+    been released.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Yields:
+        Generator[mmap.mmap | bytes | None, None, None]: The map, empty bytes for an empty file as those can't be
+            mapped, or None if the file isn't local.
+    """
+    path = local_path(file_path)
+    if path is None:
+        yield None
+        return
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_SEQUENTIAL"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    try:
+        yield mapped
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            pass
 
 
 class FileHandler(ABC):
-    """Abstract FileHandler class that all file handlers should inherit from."""
+    """Abstract FileHandler class that all file handlers should inherit from.
+
+    Attributes:
+        ranged_reads (bool): Whether the handler reads remote files with its own range requests, fetching only the
+            parts it needs, so they aren't staged on local disk first.
+    """
+
+    ranged_reads: bool = False
 
     @abstractmethod
-    def open(self, file_path: str) -> Generator[StringIO | BytesIO, None, None]:
-        """Open a file and return a file like object.
+    def open(
+        self, file_path: str, encoding_key: Hashable | None = None
+    ) -> Generator[TextIO | BinaryIO, None, None]:
+        """Open a file and return a file like object. Text files are decoded with the handler's encoding, unless a
+        sample of the file doesn't decode with it, in which case the encoding is detected by encoding_detector.
 
         Args:
             file_path (str): The path to the file to open.
+            encoding_key (Hashable | None, optional): Key to remember the detected encoding under, e.g.
+                (data_supplier, feed_identifier), so that later files with the same key skip detection.
 
         Yields:
-            Generator[StringIO | BytesIO, None, None]: A file like object.
+            Generator[TextIO | BinaryIO, None, None]: A file like object.
+        """
+
+    def section_refs(self, file_path: str) -> list[Hashable] | None:
+        """List references to the sections of a file that can be opened independently, so that they can be prepared
+        in parallel. File handlers whose sections can only be read in order return None. File handlers that return
+        references must also define open_section(file_path, ref, encoding_key), a context manager that gives a file
+        like object for the referenced section. Callers only open sections once section_refs has returned references.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            list[Hashable] | None: A reference to each section, in the order open yields them.
+        """
+        return None
+
+    def section_bounds(
+        self, buffer: mmap.mmap | bytes, encoding: str
+    ) -> list[tuple[int, int]] | None:
+        """Find the byte range of each section that open would yield for a file with the given contents, so that
+        sections can be split between tasks that each read only their own range. File handlers whose sections aren't
+        byte ranges of the file return None.
+
+        Args:
+            buffer (mmap.mmap | bytes): Contents of the file
+            encoding (str): Encoding of the file
+
+        Returns:
+            list[tuple[int, int]] | None: Start and end index of each non-empty section, in the order open yields them
         """
+        return None
 
 
 class BasicFileHandler(FileHandler):
-    """Basic file handler that reads the entire file into memory."""
+    """Basic file handler that reads the entire file into memory. Local files are memory mapped instead, if use_mmap
+    is True."""
 
-    def __init__(self, encoding: str = "utf8"):
+    def __init__(self, encoding: str = "utf8", use_mmap: bool = True):
         self.encoding = encoding
-
-    def open(self, file_path: str) -> Generator[StringIO, None, None]:
-        with fsspec.open(file_path) as f:
-            string = f.read().decode(self.encoding)
-        yield StringIO(string)
+        self.use_mmap = use_mmap
+
+    def open(
+        self, file_path: str, encoding_key: Hashable | None = None
+    ) -> Generator[TextIOWrapper, None, None]:
+        with mapped_file(file_path) if self.use_mmap else nullcontext() as content:
+            if content is None:
+                with fsspec.open(file_path) as f:
+                    content = f.read()
+            encoding = encoding_detector.resolve(
+                encoding_detector.sample_buffer(content), self.encoding, encoding_key
+            )
+            yield text_view(content, encoding)
+
+    def section_bounds(
+        self, buffer: mmap.mmap | bytes, encoding: str
+    ) -> list[tuple[int, int]]:
+        return [(0, len(buffer))]
 
 
 class ChunkedFileHandler(FileHandler):
-    """Chunked file handler that reads the file in chunks."""
+    """Chunked file handler that streams the file through a fixed size buffer and yields chunks of complete records.
+
+    Chunks always end on a newline that is outside a quoted field, so quoted fields containing newlines are never
+    split. The buffer is reused between chunks, so each file object that is yielded is only valid until the next one
+    is requested. The buffer only grows if a single record is larger than chunk_size.
+
+    A quoted record longer than max_record_size is assumed to be a stray quote character in an unquoted field, e.g.
+    an inch mark, rather than a real record, and the chunk ends at the last newline instead. Otherwise a stray quote
+    would make every later newline look quoted, and the chunk would grow to the rest of the file.
 
-    def __init__(self, chunk_size: int = 1024 * 1024 * 50, encoding: str = "utf8"):
+    Local files are memory mapped instead if use_mmap is True, and each chunk is a view of the map, so nothing is
+    copied before the chunk is parsed.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1024 * 1024 * 50,
+        encoding: str = "utf8",
+        quotechar: str = '"',
+        use_mmap: bool = True,
+        max_record_size: int = MAX_RECORD_SIZE,
+    ):
         self.encoding = encoding
         self.chunk_size = chunk_size
-
-    def open(self, file_path: str) -> Generator[StringIO, None, None]:
-        with fsspec.open(file_path) as f:
+        self.quotechar = quotechar
+        self.use_mmap = use_mmap
+        self.max_record_size = max_record_size
+        self._check_encoding(encoding)
+
+    def open(
+        self, file_path: str, encoding_key: Hashable | None = None
+    ) -> Generator[TextIOWrapper, None, None]:
+        with mapped_file(file_path) if self.use_mmap else nullcontext() as mapped:
+            if mapped is not None:
+                encoding = encoding_detector.resolve(
+                    encoding_detector.sample_buffer(mapped), self.encoding, encoding_key
+                )
+                self._check_encoding(encoding)
+                for start, end in self._chunk_bounds(
+                    mapped, self.quotechar.encode(encoding)
+                ):
+                    yield text_view(memoryview(mapped)[start:end], encoding)
+                return
+
+        buffer = bytearray(self.chunk_size)
+        filled = 0
+        with fsspec.open(file_path, "rb") as f:
+            encoding = encoding_detector.resolve(
+                encoding_detector.sample_file(f), self.encoding, encoding_key
+            )
+            self._check_encoding(encoding)
+            quote = self.quotechar.encode(encoding)
             while True:
-                new_content = f.read(self.chunk_size)
-                new_content += f.readline()
-                if not new_content:
+                eof = False
+                while filled < len(buffer):
+                    with memoryview(buffer) as view:
+                        read = f.readinto(view[filled:])
+                    if not read:
+                        eof = True
+                        break
+                    filled += read
+
+                end = (
+                    filled
+                    if eof
+                    else self._chunk_end(buffer, 0, filled, quote, self.max_record_size)
+                )
+                if end is None:
+                    # A single line is larger than the buffer. Allocate a new buffer rather than resizing, as
+                    # the previous chunk may still be referenced by the caller.
+                    buffer = buffer + bytearray(len(buffer))
+                    continue
+                if end:
+                    yield text_view(memoryview(buffer)[:end], encoding)
+                if eof:
                     return
-                yield StringIO(new_content.decode(self.encoding))
+
+                remainder = filled - end
+                buffer[:remainder] = buffer[end:filled]
+                filled = remainder
+
+    def section_bounds(
+        self, buffer: mmap.mmap | bytes, encoding: str
+    ) -> list[tuple[int, int]]:
+        self._check_encoding(encoding)
+        return list(self._chunk_bounds(buffer, self.quotechar.encode(encoding)))
+
+    def _check_encoding(self, encoding: str):
+        """Records are split on the encoded newline and quote characters, which only works for ASCII compatible
+        encodings."""
+        if (
+            "\n".encode(encoding) != b"\n"
+            or self.quotechar.encode(encoding) != self.quotechar.encode()
+        ):
+            raise ValueError(f"{encoding} is not an ASCII compatible encoding")
+
+    def _chunk_bounds(
+        self, buffer: mmap.mmap | bytes, quote: bytes
+    ) -> Generator[tuple[int, int], None, None]:
+        """Split a buffer into chunks of complete records of about chunk_size bytes.
+
+        Args:
+            buffer (mmap.mmap | bytes): The buffer to split.
+            quote (bytes): The encoded quote character.
+
+        Yields:
+            Generator[tuple[int, int], None, None]: The start and end index of each chunk.
+        """
+        yield from self._record_ranges(
+            buffer, 0, len(buffer), self.chunk_size, quote, self.max_record_size
+        )
+
+    @staticmethod
+    def _record_ranges(
+        buffer: mmap.mmap | bytes,
+        start: int,
+        end: int,
+        size: int,
+        quote: bytes,
+        max_record_size: int,
+    ) -> Generator[tuple[int, int], None, None]:
+        """Split a range of a buffer into runs of complete records of about size bytes. If no record ends within size
+        bytes, the window searched is doubled until one does, so a long record is only scanned a bounded number of
+        times, and quotes are no longer trusted once the window reaches max_record_size bytes.
+
+        Args:
+            buffer (mmap.mmap | bytes): The buffer to split.
+            start (int): Index of the start of the first record.
+            end (int): Index of the end of the range.
+            size (int): Approximate number of bytes in each run.
+            quote (bytes): The encoded quote character.
+            max_record_size (int): Length of quoted record from which quotes are no longer trusted.
+
+        Yields:
+            Generator[tuple[int, int], None, None]: The start and end index of each run.
+        """
+        while start < end:
+            window, boundary = size, None
+            while boundary is None and start + window < end:
+                boundary = ChunkedFileHandler._chunk_end(
+                    buffer, start, start + window, quote, max_record_size
+                )
+                window *= 2
+            yield start, boundary or end
+            start = boundary or end
+
+    @staticmethod
+    def _chunk_end(
+        buffer: bytearray | mmap.mmap | bytes,
+        start: int,
+        end: int,
+        quote: bytes,
+        max_record_size: int,
+    ) -> int | None:
+        """Find where a chunk of the records between start and end should end. That is the end of the last complete
+        record, unless no record ends in a range of at least max_record_size bytes. Then a stray quote character is
+        assumed to have made every newline look quoted, and the chunk ends at the last newline instead, so the next
+        chunk starts counting quotes afresh.
+
+        Args:
+            buffer (bytearray | mmap.mmap | bytes): The buffer to search.
+            start (int): Index of the start of the first record.
+            end (int): Index to search up to.
+            quote (bytes): The encoded quote character.
+            max_record_size (int): Length of quoted record from which quotes are no longer trusted.
+
+        Returns:
+            int | None: The index the chunk should end at, or None if there is no newline to end it at.
+        """
+        boundary = ChunkedFileHandler._record_boundary(buffer, start, end, quote)
+        if boundary is None and end - start >= max_record_size:
+            last = buffer.rfind(b"\n", start, end)
+            if last != -1:
+                logger.warning(
+                    "No record ends within %d bytes, splitting on the last newline",
+                    end - start,
+                )
+                return last + 1
+        return boundary
+
+    @staticmethod
+    def _record_boundary(
+        buffer: bytearray | mmap.mmap | bytes, start: int, end: int, quote: bytes
+    ) -> int | None:
+        """Find the end of the last complete record between start and end. start is always the beginning of a
+        record, so a newline is inside a quoted field if there is an odd number of quote characters before it. The
+        parity of the quotes is carried forward through the range in blocks, so each byte is only looked at once.
+
+        Args:
+            buffer (bytearray | mmap.mmap | bytes): The buffer to search.
+            start (int): Index of the start of the first record.
+            end (int): Index to search up to, e.g. the number of bytes in the buffer that have been filled.
+            quote (bytes): The encoded quote character.
+
+        Returns:
+            int | None: The index just after the last newline that ends a record, or None if there isn't one.
+        """
+        last = buffer.rfind(b"\n", start, end)
+        if last == -1 or buffer.find(quote, start, last) == -1:
+            return None if last == -1 else last + 1
+        array = np.frombuffer(buffer, dtype=np.uint8)
+        boundary, parity = None, 0
+        for block_start in range(start, last + 1, _BLOCK_SIZE):
+            block = array[block_start : min(block_start + _BLOCK_SIZE, last + 1)]
+            # Wrapping around in uint8 keeps the parity of the running count
+            quoted = (np.cumsum(block == quote[0], dtype=np.uint8) + parity) & 1
+            ends = np.flatnonzero((block == ord("\n")) & (quoted == 0))
+            if len(ends):
+                boundary = block_start + int(ends[-1]) + 1
+            parity = int(quoted[-1])
+        return boundary
 
 
 class SeparatedFileHandler(FileHandler):
-    """Separated file handler that splits the file on a separator and yields each chunk."""
+    """Separated file handler that streams the file, splits it on a separator and yields each section as soon as it
+    has been read. Only the current section and one block are held in memory at a time.
+
+    Local files are memory mapped instead if use_mmap is True, and each section is a view of the map.
+    """
 
     def __init__(
         self,
         separator: str = "{s}CHUNK{s}\n".format(s="#" * 114),
         encoding: str = "utf8",
+        block_size: int = 1024 * 1024 * 8,
+        use_mmap: bool = True,
     ):
         self.encoding = encoding
         self.separator = separator
+        self.block_size = block_size
+        self.use_mmap = use_mmap
+
+    def open(
+        self, file_path: str, encoding_key: Hashable | None = None
+    ) -> Generator[TextIOWrapper, None, None]:
+        with mapped_file(file_path) if self.use_mmap else nullcontext() as mapped:
+            if mapped is not None:
+                encoding = encoding_detector.resolve(
+                    encoding_detector.sample_buffer(mapped), self.encoding, encoding_key
+                )
+                separator = self.separator.encode(encoding)
+                start = 0
+                index = mapped.find(separator)
+                while index != -1:
+                    yield from self._section(mapped, start, index, encoding)
+                    start = index + len(separator)
+                    index = mapped.find(separator, start)
+                yield from self._section(mapped, start, len(mapped), encoding)
+                return
+
+        buffer = bytearray()
+        with fsspec.open(file_path, "rb") as f:
+            encoding = encoding_detector.resolve(
+                encoding_detector.sample_file(f), self.encoding, encoding_key
+            )
+            separator = self.separator.encode(encoding)
+            while True:
+                block = f.read(self.block_size)
+                # The separator may straddle the previous block and this one
+                search_from = max(0, len(buffer) - len(separator) + 1)
+                buffer += block
+                start = 0
+                index = buffer.find(separator, search_from)
+                while index != -1:
+                    yield from self._section(buffer, start, index, encoding)
+                    start = index + len(separator)
+                    index = buffer.find(separator, start)
+                if not block:
+                    yield from self._section(buffer, start, len(buffer), encoding)
+                    return
+                if start:
+                    # Sections that have been yielded are views of the buffer, so move the remainder to a new
+                    # buffer rather than resizing this one.
+                    buffer = buffer[start:]
+
+    def section_bounds(
+        self, buffer: mmap.mmap | bytes, encoding: str
+    ) -> list[tuple[int, int]]:
+        separator = self.separator.encode(encoding)
+        bounds = []
+        start = 0
+        while start <= len(buffer):
+            index = buffer.find(separator, start)
+            end = len(buffer) if index == -1 else index
+            section = self._trim(buffer, start, end)
+            if section[0] < section[1]:
+                bounds.append(section)
+            if index == -1:
+                break
+            start = index + len(separator)
+        return bounds
+
+    @staticmethod
+    def _section(
+        buffer: bytearray | mmap.mmap | bytes, start: int, end: int, encoding: str
+    ) -> Generator[TextIOWrapper, None, None]:
+        """Yield a text view of the buffer between start and end, with surrounding whitespace removed. Nothing is
+        yielded if the section is empty.
 
-    def open(self, file_path: str) -> Generator[StringIO, None, None]:
-        with fsspec.open(file_path) as f:
-            string = f.read().decode(self.encoding)
-            for i in string.split(self.separator):
-                if i:
-                    yield StringIO(i.strip())
+        Args:
+            buffer (bytearray | mmap.mmap | bytes): The buffer containing the section.
+            start (int): Index of the start of the section.
+            end (int): Index of the end of the section.
+            encoding (str): The encoding of the buffer.
+
+        Yields:
+            Generator[TextIOWrapper, None, None]: A text mode file object over the section.
+        """
+        start, end = SeparatedFileHandler._trim(buffer, start, end)
+        if start < end:
+            yield text_view(memoryview(buffer)[start:end], encoding)
+
+    @staticmethod
+    def _trim(
+        buffer: bytearray | mmap.mmap | bytes, start: int, end: int
+    ) -> tuple[int, int]:
+        """Move start and end inwards past any whitespace around the section."""
+        while start < end and buffer[start] in _WHITESPACE:
+            start += 1
+        while end > start and buffer[end - 1] in _WHITESPACE:
+            end -= 1
+        return start, end
 
 
 class ZipFileHandler(FileHandler):
-    """Zip file handler that finds files matching a regex and yields the contents of each file."""
+    """Zip file handler that finds files matching a regex and streams the contents of each file.
+
+    The zip file is opened through fsspec, so for remote files only the central directory and the members that are
+    read are fetched, with ranged reads of block_size bytes, and remote files aren't staged. Each member is
+    decompressed and decoded incrementally as it is read, so memory use doesn't depend on the size of the members.
+    Members can also be opened independently with open_section, which lets them be prepared in parallel.
+
+    If a member doesn't decode with the given encoding, its encoding is detected by encoding_detector from a sample
+    of its first bytes, as sampling the end of a member would mean decompressing all of it.
+    """
+
+    ranged_reads = True
 
     def __init__(
-        self, regex: str = r".*", encoding: str = "utf8", is_binary_file: bool = False
+        self,
+        regex: str = r".*",
+        encoding: str = "utf8",
+        is_binary_file: bool = False,
+        block_size: int = 1024 * 1024 * 5,
     ):
         self.encoding = encoding
         self.regex = regex
         self.is_binary_file = is_binary_file
-
-    def open(self, file_path: str) -> Generator[StringIO | BytesIO, None, None]:
-        zip_file = fsspec.open(file_path)
-        with zipfile.ZipFile(zip_file, "r") as zf:
-            matching_files = [
-                f for f in zf.namelist() if re.match(self.regex, f) is not None
-            ]
-
-            for filename in matching_files:
-                bytes = zf.read(filename)
-                if self.is_binary_file:
-                    file_obj = BytesIO(bytes)
-                else:
-                    uni_string = self._to_unicode(bytes)
-                    file_obj = StringIO(uni_string)
-                file_obj.name = filename
+        self.block_size = block_size
+
+    def open(
+        self, file_path: str, encoding_key: Hashable | None = None
+    ) -> Generator[TextIOWrapper | BinaryIO, None, None]:
+        with self._open_zip(file_path) as zf:
+            for info in self._matching_members(zf):
+                with self._open_member(zf, info, encoding_key) as file_obj:
+                    yield file_obj
+
+    def section_refs(self, file_path: str) -> list[str]:
+        with self._open_zip(file_path) as zf:
+            return [info.filename for info in self._matching_members(zf)]
+
+    @contextmanager
+    def open_section(
+        self, file_path: str, ref: str, encoding_key: Hashable | None = None
+    ) -> Generator[TextIOWrapper | BinaryIO, None, None]:
+        with self._open_zip(file_path) as zf:
+            with self._open_member(zf, zf.getinfo(ref), encoding_key) as file_obj:
                 yield file_obj
-        return
-
-    def _to_unicode(self, raw: bytes) -> str:
-        """Try to decode the bytes using the specified encoding. If that fails, try to infer the encoding.
 
-        Args:
-            raw (bytes): The bytes to decode.
-
-        Raises:
-            ValueError: If the encoding cannot be inferred.
+    @contextmanager
+    def _open_zip(self, file_path: str) -> Generator[zipfile.ZipFile, None, None]:
+        with fsspec.open(file_path, "rb", block_size=self.block_size) as f:
+            with zipfile.ZipFile(f, "r") as zf:
+                yield zf
 
-        Returns:
-            str: The decoded string.
+    def _matching_members(self, zf: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+        return [
+            info
+            for info in zf.infolist()
+            if not info.is_dir() and re.match(self.regex, info.filename) is not None
+        ]
 
-        """
-        try:
-            return str(raw, self.encoding)
-        except UnicodeDecodeError:
-            encoding = chardet.detect(raw)["encoding"]
-            if encoding is None:
-                raise ValueError("Could not infer encoding")
-            else:
-                return str(raw, encoding)
+    def _open_member(
+        self,
+        zf: zipfile.ZipFile,
+        info: zipfile.ZipInfo,
+        encoding_key: Hashable | None = None,
+    ) -> TextIOWrapper | BinaryIO:
+        if self.is_binary_file:
+            return zf.open(info)
+        with zf.open(info) as member:
+            sample = member.read(encoding_detector.sample_size), b""
+        encoding = encoding_detector.resolve(sample, self.encoding, encoding_key)
+        return TextIOWrapper(zf.open(info), encoding=encoding, newline="")
 
 
 class BinaryFileHandler(FileHandler):
-    """Binary file handler that reads the entire file into memory."""
+    """Binary file handler that reads the entire file into memory. Local files are memory mapped instead, if use_mmap
+    is True."""
 
-    def __init__(self, encoding: str = "utf8"):
+    def __init__(self, encoding: str = "utf8", use_mmap: bool = True):
         self.encoding = encoding
-
-    def open(self, file_path: str) -> Generator[BytesIO, None, None]:
+        self.use_mmap = use_mmap
+
+    def open(
+        self, file_path: str, encoding_key: Hashable | None = None
+    ) -> Generator[BinaryIO, None, None]:
+        with mapped_file(file_path) if self.use_mmap else nullcontext() as mapped:
+            if mapped is not None:
+                yield MemoryReader(mapped)
+                return
         with fsspec.open(file_path, "rb") as f:
             string = f.read()
             yield BytesIO(string)
         return
+
+
+class InstrumentedFileHandler(FileHandler):
+    """Measures the time a file handler spends reading and decoding each section as the "open" stage. Sections opened
+    by worker processes are measured as part of the stage that waits for their results, as the handler is pickled as
+    the file handler it wraps.
+
+    Args:
+        file_handler (FileHandler): File handler to measure
+        instrumentation (Instrumentation): Instrumentation to record the stage in
+    """
+
+    def __init__(self, file_handler: FileHandler, instrumentation: Instrumentation):
+        self.file_handler = file_handler
+        self.instrumentation = instrumentation
+
+    def open(
+        self, file_path: str, encoding_key: Hashable | None = None
+    ) -> Generator[TextIO | BinaryIO, None, None]:
+        yield from self.instrumentation.iterate(
+            "open", self.file_handler.open(file_path, encoding_key)
+        )
+
+    def section_refs(self, file_path: str) -> list[Hashable] | None:
+        with self.instrumentation.stage("open"):
+            return self.file_handler.section_refs(file_path)
+
+    def open_section(
+        self, file_path: str, ref: Hashable, encoding_key: Hashable | None = None
+    ) -> AbstractContextManager[TextIO | BinaryIO]:
+        return self.file_handler.open_section(file_path, ref, encoding_key)
+
+    def section_bounds(
+        self, buffer: mmap.mmap | bytes, encoding: str
+    ) -> list[tuple[int, int]] | None:
+        with self.instrumentation.stage("open"):
+            return self.file_handler.section_bounds(buffer, encoding)
+
+    @property
+    def encoding(self) -> str:
+        return getattr(self.file_handler, "encoding", "utf8")
+
+    def __reduce__(self):
+        return _unwrap, (self.file_handler,)
+
+
+def _unwrap(file_handler: FileHandler) -> FileHandler:
+    return file_handler
+
+
+class SkippingFileHandler(FileHandler):
+    """Yields only the sections of a file whose index isn't in skip, so that a resumed preparation doesn't run the
+    script on sections it has already prepared. Skipped sections that can be opened independently aren't read at all.
+
+    Args:
+        file_handler (FileHandler): File handler to open the file with
+        skip (Container[int]): Indexes of the sections to skip, in the order file_handler yields them
+    """
+
+    def __init__(self, file_handler: FileHandler, skip: Container[int]):
+        self.file_handler = file_handler
+        self.skip = skip
+
+    def open(
+        self, file_path: str, encoding_key: Hashable | None = None
+    ) -> Generator[TextIO | BinaryIO, None, None]:
+        for index, f in enumerate(self.file_handler.open(file_path, encoding_key)):
+            if index not in self.skip:
+                yield f
+
+    def section_refs(self, file_path: str) -> list[Hashable] | None:
+        refs = self.file_handler.section_refs(file_path)
+        if refs is None:
+            return None
+        return [ref for index, ref in enumerate(refs) if index not in self.skip]
+
+    def open_section(
+        self, file_path: str, ref: Hashable, encoding_key: Hashable | None = None
+    ) -> AbstractContextManager[TextIO | BinaryIO]:
+        return self.file_handler.open_section(file_path, ref, encoding_key)
@@ -0,0 +1,293 @@
+"""Splitting a single input file into parts that are prepared by separate tasks, so that a large file is prepared by
+many workers at once, and merging the prepared parts back into the outputs that a single task would have written.
+"""
+from collections.abc import Generator, Hashable, Iterator
+from contextlib import contextmanager
+from typing import NamedTuple, TextIO, BinaryIO, Type
+import os
+
+import fsspec
+import pandas as pd
+
+from .cache import MemcachedCache, MemoryCache, get_cache
+from .encoding_detection import encoding_detector
+from .file_handlers import (
+    MAX_RECORD_SIZE,
+    ChunkedFileHandler,
+    FileHandler,
+    mapped_file,
+    text_view,
+)
+from .scripts.base import BaseScript
+from .settings import settings
+
+
+class FilePart(NamedTuple):
+    """A part of an input file, prepared by its own task.
+
+    Attributes:
+        index (int): Position of the part in the file
+        section (int): Index of the section of the file the part belongs to. A single task gives each section its
+            own dataframe, so row numbers restart for each section and continue across the parts of a section.
+        start (int | None): Index of the first byte of the part, for parts that are byte ranges of the file
+        end (int | None): Index just past the last byte of the part
+        member (str | None): Reference to the section, for parts that are sections opened with open_section, e.g.
+            zip members
+        header (tuple[int, int] | None): Byte range of the header of the part's section, for parts after the first
+            of a section whose script reads a header
+    """
+
+    index: int
+    section: int
+    start: int | None = None
+    end: int | None = None
+    member: str | None = None
+    header: tuple[int, int] | None = None
+
+
+def plan_parts(
+    script_cls: Type[BaseScript],
+    file_handler: FileHandler,
+    file_path: str,
+    part_size: int | None = None,
+    encoding_key: Hashable | None = None,
+) -> tuple[list[FilePart], str | None] | None:
+    """Split a file into parts that can be prepared independently. Sections that can be opened on their own, such as
+    zip members, are one part each. Otherwise the file is split into the byte ranges of the sections the file handler
+    yields, and sections of splittable scripts are split further into runs of whole records of about part_size bytes.
+
+    Args:
+        script_cls (Type[BaseScript]): Script of the feed
+        file_handler (FileHandler): File handler of the feed
+        file_path (str): Path to a local copy of the file
+        part_size (int | None, optional): Approximate size of each part of a section. Defaults to
+            settings.part_size.
+        encoding_key (Hashable | None, optional): Key the file handler remembers the detected encoding under
+
+    Returns:
+        tuple[list[FilePart], str | None] | None: The parts, and the encoding to decode byte range parts with. None if
+            the file can't be split.
+    """
+    part_size = part_size or settings.part_size
+    refs = file_handler.section_refs(file_path)
+    if refs is not None:
+        return [
+            FilePart(index, index, member=ref) for index, ref in enumerate(refs)
+        ], None
+
+    with mapped_file(file_path) as mapped:
+        if mapped is None:
+            raise ValueError(f"{file_path} must be staged locally to be split")
+        encoding = encoding_detector.resolve(
+            encoding_detector.sample_buffer(mapped),
+            getattr(file_handler, "encoding", "utf8"),
+            encoding_key,
+        )
+        sections = file_handler.section_bounds(mapped, encoding)
+        if sections is None:
+            return None
+        parts = []
+        for section, (start, end) in enumerate(sections):
+            if not script_cls.splittable:
+                parts.append(FilePart(len(parts), section, start, end))
+                continue
+            header, body_start = None, start
+            if script_cls.source_header:
+                header_end = mapped.find(b"\n", start, end)
+                body_start = end if header_end == -1 else header_end + 1
+                header = (start, body_start)
+            # The first part of a section reads the header in place, so it also gets the first records
+            ranges = list(
+                ChunkedFileHandler._record_ranges(
+                    mapped,
+                    body_start,
+                    end,
+                    part_size,
+                    '"'.encode(encoding),
+                    getattr(file_handler, "max_record_size", MAX_RECORD_SIZE),
+                )
+            ) or [(body_start, end)]
+            for number, (part_start, part_end) in enumerate(ranges):
+                parts.append(
+                    FilePart(
+                        len(parts),
+                        section,
+                        start if number == 0 else part_start,
+                        part_end,
+                        header=header if number > 0 else None,
+                    )
+                )
+        return parts, encoding
+
+
+@contextmanager
+def open_part(
+    file_handler: FileHandler,
+    file_path: str,
+    part: FilePart,
+    encoding: str | None,
+    encoding_key: Hashable | None = None,
+) -> Generator[TextIO | BinaryIO, None, None]:
+    """Open a part of a file. Byte ranges of local files are read from a memory map of the file, while only the
+    part's byte range is fetched of remote files.
+
+    Args:
+        file_handler (FileHandler): File handler of the feed
+        file_path (str): Path to the file
+        part (FilePart): Part to open
+        encoding (str | None): Encoding of the file, from plan_parts
+        encoding_key (Hashable | None, optional): Key the file handler remembers the detected encoding under
+
+    Yields:
+        Generator[TextIO | BinaryIO, None, None]: File object of the part
+    """
+    if part.member is not None:
+        with file_handler.open_section(file_path, part.member, encoding_key) as f:
+            yield f
+        return
+
+    with mapped_file(file_path) as mapped:
+        if mapped is not None:
+            content = memoryview(mapped)[part.start : part.end]
+            header = mapped[slice(*part.header)] if part.header else None
+        else:
+            fs, path = fsspec.core.url_to_fs(file_path)
+            content = fs.cat_file(path, start=part.start, end=part.end)
+            header = fs.cat_file(path, *part.header) if part.header else None
+        if header is not None:
+            content = header + bytes(content)
+        with text_view(content, encoding) as f:
+            yield f
+        if isinstance(content, memoryview):
+            content.release()
+
+
+class PartResultStore:
+    """Results of the parts of a file, kept in the cache so that the task preparing the last part to finish knows
+    that every part is done and the parts can be merged. Completions are counted with an atomic increment, so parts
+    can be prepared by any number of worker processes and hosts. A part that couldn't be prepared is recorded as
+    finished with a "failed" key holding the error, so the parts are still merged, or rather cleaned up, once every
+    part has finished.
+
+    Args:
+        cache (MemcachedCache | MemoryCache | None, optional): Cache to keep results in. Defaults to the process wide
+            memcached cache.
+        timeout (int | None, optional): Number of seconds to keep results for. Defaults to
+            settings.result_cache_timeout.
+    """
+
+    prefix = "parts"
+
+    def __init__(
+        self,
+        cache: MemcachedCache | MemoryCache | None = None,
+        timeout: int | None = None,
+    ):
+        self.cache = cache or get_cache()
+        self.timeout = timeout or settings.result_cache_timeout
+
+    def available(self) -> bool:
+        """Check that the cache can be reached, as the in-memory fallback of memcached isn't shared between processes
+        and would never count every part as finished.
+
+        Returns:
+            bool: Whether parts can be counted across workers
+        """
+        return self.cache.available()
+
+    def start(self, group_id: str):
+        """Reset the count of finished parts of a file.
+
+        Args:
+            group_id (str): ID of the task that split the file
+        """
+        self.cache.set(self._key(group_id, "done"), 0, self.timeout)
+
+    def add(self, group_id: str, result: dict, parts: int) -> list[dict] | None:
+        """Record the result of a part.
+
+        Args:
+            group_id (str): ID of the task that split the file
+            result (dict): Result of the part, with the part's index
+            parts (int): Number of parts the file was split into
+
+        Raises:
+            RuntimeError: If the count of finished parts has been lost, e.g. because memcached can't be reached.
+
+        Returns:
+            list[dict] | None: Results of every part, in order, if this was the last part to finish. Otherwise None.
+        """
+        self.cache.set(self._key(group_id, result["index"]), result, self.timeout)
+        done = self.cache.incr(self._key(group_id, "done"))
+        if done is None:
+            raise RuntimeError(f"The count of finished parts of {group_id} was lost")
+        if done != parts:
+            return None
+        return [self.cache.get(self._key(group_id, index)) for index in range(parts)]
+
+    def delete(self, group_id: str, parts: int):
+        """Delete the results of the parts of a file.
+
+        Args:
+            group_id (str): ID of the task that split the file
+            parts (int): Number of parts the file was split into
+        """
+        for index in range(parts):
+            self.cache.delete(self._key(group_id, index))
+        self.cache.delete(self._key(group_id, "done"))
+
+    def _key(self, group_id: str, suffix: int | str) -> str:
+        return f"{self.prefix}:{group_id}:{suffix}"
+
+
+def part_path(data_supplier: str, group_id: str, index: int) -> str:
+    """Location to write the prepared dataframe of a part to, until the parts are merged.
+
+    Args:
+        data_supplier (str): Who supplied the file
+        group_id (str): ID of the task that split the file
+        index (int): Index of the part
+
+    Returns:
+        str: Location of the part's dataframe
+    """
+    return os.path.join(
+        settings.output_dir, data_supplier, "parts", group_id, f"{index:05d}.parquet"
+    )
+
+
+def merged_dataframes(
+    script: BaseScript, results: list[dict], concat: bool = True
+) -> Iterator[pd.DataFrame]:
+    """Read the prepared dataframes of the parts back, with the row number columns of the script's output schema
+    offset by the number of rows in the earlier parts of the same section. Unless concat is True, the parts of each
+    section are concatenated, so the dataframes are the same as a single task would have produced for each section.
+
+    Args:
+        script (BaseScript): Script of the feed
+        results (list[dict]): Result of each part, in order, each with its section, rows and path
+        concat (bool, optional): Whether the dataframes will be concatenated into a single output, in which case the
+            dataframe of each part is yielded on its own to bound memory use. Defaults to True.
+
+    Yields:
+        Iterator[pd.DataFrame]: Dataframe of each part, or of each section if concat is False
+    """
+    row_numbers = [
+        name for name, column in script.output_schema.items() if column.row_number
+    ]
+    section, dataframes, offset = None, [], 0
+    for result in results:
+        if result["section"] != section:
+            if dataframes:
+                yield pd.concat(dataframes)
+            section, dataframes, offset = result["section"], [], 0
+        df = pd.read_parquet(result["path"])
+        for name in row_numbers:
+            df[name] += offset
+        offset += result["rows"]
+        if concat:
+            yield df
+        else:
+            dataframes.append(df)
+    if dataframes:
+        yield pd.concat(dataframes)
@@ -0,0 +1,257 @@
+from collections.abc import Generator, Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import TypeVar
+import itertools
+import os
+import resource
+import threading
+import time
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+
+
+T = TypeVar("T")
+
+LABELS = ["stage", "feed_identifier", "feed_version", "data_supplier"]
+
+STAGE_SECONDS = Histogram(
+    "prepare_stage_seconds",
+    "Wall time spent in each stage of preparing a file",
+    LABELS,
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+STAGE_CPU_SECONDS = Counter(
+    "prepare_stage_cpu_seconds", "CPU time spent in each stage", LABELS
+)
+STAGE_BYTES = Counter(
+    "prepare_stage_bytes", "Bytes read or written by each stage", LABELS + ["direction"]
+)
+STAGE_ROWS = Counter(
+    "prepare_stage_rows",
+    "Rows consumed or produced by each stage",
+    LABELS + ["direction"],
+)
+STAGE_PEAK_RSS = Histogram(
+    "prepare_stage_peak_rss_increase_bytes",
+    "Increase of the worker's peak resident set size during each stage",
+    LABELS,
+    buckets=(0, 2**20, 2**24, 2**26, 2**28, 2**30, 2**32),
+)
+
+
+@dataclass
+class StageStats:
+    """Measurements for one stage of preparing a file. Times are exclusive of any stage nested inside it."""
+
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    rows_in: int = 0
+    rows_out: int = 0
+    peak_rss_increase: int = 0
+
+
+class Instrumentation:
+    """Records wall time, CPU time, bytes, rows and the increase in peak RSS for each stage of preparing a file.
+    Entering the same stage several times adds to its measurements, so lazily evaluated stages can be measured one
+    item at a time with iterate. When stages are nested, time spent in the inner stage is only counted against it.
+
+    CPU time and peak RSS are measured for the whole process, so work done by threads while a stage is open is counted
+    against that stage. The peak RSS of a stage is measured from the RSS when it was entered rather than from the
+    process' lifetime peak, by resetting Linux's high-water mark, so a stage that allocates less than an earlier task
+    still shows its increase. Where the high-water mark can't be reset, only increases of the lifetime peak are seen.
+
+    Args:
+        feed_identifier (str): Feed of the file being prepared
+        feed_version (int): Version of the feed's script
+        data_supplier (str): Supplier of the file
+    """
+
+    def __init__(self, feed_identifier: str, feed_version: int, data_supplier: str):
+        self.labels = {
+            "feed_identifier": feed_identifier,
+            "feed_version": str(feed_version),
+            "data_supplier": data_supplier,
+        }
+        self.stages: dict[str, StageStats] = {}
+        self._nested: list[list[float]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[StageStats, None, None]:
+        """Measure a stage. Bytes and rows are counted by the caller on the yielded stats.
+
+        Args:
+            name (str): Name of the stage
+
+        Yields:
+            Generator[StageStats, None, None]: Measurements of the stage
+        """
+        stats = self.stages.setdefault(name, StageStats())
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        start_rss, peak_token = _open_peak_rss()
+        nested = [0.0, 0.0]
+        self._nested.append(nested)
+        try:
+            yield stats
+        finally:
+            self._nested.pop()
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            stats.wall_time += wall - nested[0]
+            stats.cpu_time += cpu - nested[1]
+            stats.peak_rss_increase = max(
+                stats.peak_rss_increase, _close_peak_rss(peak_token) - start_rss
+            )
+            if self._nested:
+                self._nested[-1][0] += wall
+                self._nested[-1][1] += cpu
+
+    def iterate(
+        self, name: str, iterable: Iterable[T], count_rows: bool = False
+    ) -> Iterator[T]:
+        """Measure the time spent producing each item of an iterable as a stage.
+
+        Args:
+            name (str): Name of the stage
+            iterable (Iterable[T]): Items to measure
+            count_rows (bool, optional): Whether to count the length of each item as rows out. Defaults to False.
+
+        Yields:
+            Iterator[T]: The items
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stats:
+                item = next(iterator, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    return
+                if count_rows:
+                    stats.rows_out += len(item)
+            yield item
+
+    def summary(self) -> dict[str, dict]:
+        """Get the measurements of every stage, to be attached to a task result.
+
+        Returns:
+            dict[str, dict]: Measurements for each stage, with the labels under "labels"
+        """
+        return {
+            "labels": self.labels,
+            "stages": {name: asdict(stats) for name, stats in self.stages.items()},
+        }
+
+    def publish(self):
+        """Record the measurements of every stage as Prometheus metrics."""
+        for name, stats in self.stages.items():
+            labels = {"stage": name, **self.labels}
+            STAGE_SECONDS.labels(**labels).observe(stats.wall_time)
+            STAGE_CPU_SECONDS.labels(**labels).inc(max(stats.cpu_time, 0))
+            STAGE_PEAK_RSS.labels(**labels).observe(stats.peak_rss_increase)
+            for direction in ("in", "out"):
+                STAGE_BYTES.labels(**labels, direction=direction).inc(
+                    getattr(stats, f"bytes_{direction}")
+                )
+                STAGE_ROWS.labels(**labels, direction=direction).inc(
+                    getattr(stats, f"rows_{direction}")
+                )
+
+
+_EXHAUSTED = object()
+
+
+# Peak RSS seen by each open stage, across every Instrumentation of the process, so that resetting the high-water mark
+# for one stage doesn't lose the peak of the stages that are already open
+_open_peaks: dict[int, int] = {}
+_open_peaks_lock = threading.Lock()
+_peak_tokens = itertools.count()
+
+
+def _peak_rss() -> int:
+    """Peak resident set size of the process in bytes, since the high-water mark was last reset on Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _reset_peak_rss():
+    """Reset the high-water mark of the process to its current RSS, where the kernel allows it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _open_peak_rss() -> tuple[int, int]:
+    """Start tracking the peak RSS of a stage, folding the current peak into the stages that are already open before
+    resetting it.
+
+    Returns:
+        tuple[int, int]: RSS to measure the stage's increase from, and a token to close the stage with
+    """
+    with _open_peaks_lock:
+        peak = _peak_rss()
+        for token in _open_peaks:
+            _open_peaks[token] = max(_open_peaks[token], peak)
+        _reset_peak_rss()
+        baseline = _peak_rss()
+        token = next(_peak_tokens)
+        _open_peaks[token] = baseline
+        return baseline, token
+
+
+def _close_peak_rss(token: int) -> int:
+    """Stop tracking the peak RSS of a stage.
+
+    Args:
+        token (int): Token returned by _open_peak_rss
+
+    Returns:
+        int: Peak RSS of the process while the stage was open
+    """
+    with _open_peaks_lock:
+        return max(_open_peaks.pop(token), _peak_rss())
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Get the registry to expose metrics from. When PROMETHEUS_MULTIPROC_DIR is set, metrics written by every process
+    sharing that directory are collected, so the Celery worker's child processes, and the API when it shares the
+    directory with the worker, expose the metrics of every task.
+
+    Returns:
+        CollectorRegistry: Registry to expose
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server(port: int):
+    """Serve metrics over HTTP from a background thread.
+
+    Args:
+        port (int): Port to serve metrics on
+    """
+    start_http_server(port, registry=metrics_registry())
+
+
+def mark_process_dead():
+    """Remove the live metrics of the current process when it exits, in multiprocess mode."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+import asyncio
+import uuid
+
+from fastapi import FastAPI, HTTPException
+from prometheus_client import make_asgi_app
 import uvicorn
 
-from .subscriptions import router as subscriptions_router
-from . import tasks, schema
+from .subscriptions import router as subscriptions_router, task_publisher
+from . import schema
+from .celery import PREPARE_FILE, PREPARE_FILES
+from .instrumentation import metrics_registry
+from .batches import BatchStatusStore
+from .routing import TaskRouter
 
 app = FastAPI(
     title="File Preparer",
@@ -10,12 +18,42 @@ app = FastAPI(
     lifespan=subscriptions_router.lifespan_context,
 )
 app.include_router(subscriptions_router)
+app.mount("/metrics", make_asgi_app(registry=metrics_registry()))
 
 
 @app.post("/prepare", response_model=schema.TaskResult)
-def prepare(prepare_file: schema.PrepareFile):
-    task = tasks.prepare_file.delay(**prepare_file.model_dump())
-    return {"task_id": task.id}
+async def prepare(prepare_file: schema.PrepareFile):
+    queue = await asyncio.to_thread(
+        TaskRouter().queue,
+        prepare_file.feed_identifier,
+        str(prepare_file.file_location),
+    )
+    task_id = await task_publisher.publish(
+        PREPARE_FILE, prepare_file.model_dump(), queue
+    )
+    return {"task_id": task_id}
+
+
+@app.post("/prepare/batch", response_model=schema.BatchResult)
+async def prepare_batch(prepare_files: schema.PrepareFiles):
+    group_id = str(uuid.uuid4())
+    kwargs = prepare_files.model_dump()
+    file_locations = [str(file.file_location) for file in prepare_files.files]
+    # The status store and the router block on I/O, so they are kept off the event loop
+    await asyncio.to_thread(BatchStatusStore().start, group_id, file_locations)
+    queue = await asyncio.to_thread(
+        TaskRouter().queue, prepare_files.feed_identifier, file_locations
+    )
+    await task_publisher.publish(PREPARE_FILES, kwargs, queue, task_id=group_id)
+    return {"group_id": group_id}
+
+
+@app.get("/prepare/batch/{group_id}", response_model=schema.BatchStatus)
+def batch_status(group_id: str):
+    statuses = BatchStatusStore().get(group_id)
+    if statuses is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {"group_id": group_id, "files": statuses}
 
 
 if __name__ == "__main__":
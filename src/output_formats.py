@@ -0,0 +1,167 @@
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from io import TextIOWrapper
+from typing import BinaryIO
+import csv
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+DataFrameWriter = Callable[[pd.DataFrame], None]
+
+
+class OutputFormat(ABC):
+    """Abstract OutputFormat class that all output formats should inherit from."""
+
+    name: str
+    extension: str
+
+    @abstractmethod
+    @contextmanager
+    def writer(self, f: BinaryIO) -> Generator[DataFrameWriter, None, None]:
+        """Open a writer that appends dataframes to a single output file. All dataframes are expected to have the
+        same columns.
+
+        Args:
+            f (BinaryIO): Binary file object to write to
+
+        Yields:
+            Generator[DataFrameWriter, None, None]: Function that appends a dataframe to the file
+        """
+
+    def write(self, df: pd.DataFrame, f: BinaryIO):
+        """Write a single dataframe to a file.
+
+        Args:
+            df (pd.DataFrame): Dataframe to write
+            f (BinaryIO): Binary file object to write to
+        """
+        with self.writer(f) as write:
+            write(df)
+
+
+class CSVOutputFormat(OutputFormat):
+    """Writes utf8 encoded CSV files with no index. The header is only written for the first dataframe."""
+
+    name = "csv"
+    extension = "csv"
+
+    @contextmanager
+    def writer(self, f: BinaryIO) -> Generator[DataFrameWriter, None, None]:
+        text = TextIOWrapper(f, encoding="utf8")
+        header = True
+
+        def write(df: pd.DataFrame):
+            nonlocal header
+            df.to_csv(text, index=False, header=header, quoting=csv.QUOTE_MINIMAL)
+            header = False
+
+        try:
+            yield write
+        finally:
+            text.flush()
+            text.detach()
+
+
+class _ArrowOutputFormat(OutputFormat):
+    """Base class for output formats that write Arrow tables, keeping the dtypes of the dataframes.
+
+    Each dataframe given to a writer is written straight to the file as it comes, so only one dataframe is held at a
+    time. The schema of a file is fixed once it is opened, so it is taken from the first dataframe, and later
+    dataframes are cast to it, e.g. a float64 column of whole numbers and missing values to int64. Columns of the
+    first dataframe that only contain nulls are written as strings."""
+
+    @contextmanager
+    def writer(self, f: BinaryIO) -> Generator[DataFrameWriter, None, None]:
+        table_writer = None
+        schema = None
+
+        def write(df: pd.DataFrame):
+            nonlocal table_writer, schema
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if table_writer is None:
+                schema = self._schema(table.schema)
+                table_writer = self._open_table_writer(f, schema)
+            try:
+                table = table.cast(schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise ValueError(
+                    f"Dataframe can't be cast to the schema of the first dataframe in the file: {e}"
+                ) from e
+            self._write_table(table_writer, table)
+
+        try:
+            yield write
+        finally:
+            if table_writer is not None:
+                table_writer.close()
+
+    @staticmethod
+    def _schema(schema: pa.Schema) -> pa.Schema:
+        fields = [
+            field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+            for field in schema
+        ]
+        return pa.schema(fields, metadata=schema.metadata)
+
+    @abstractmethod
+    def _open_table_writer(self, f: BinaryIO, schema: pa.Schema):
+        pass
+
+    @abstractmethod
+    def _write_table(self, table_writer, table: pa.Table):
+        pass
+
+
+class ParquetOutputFormat(_ArrowOutputFormat):
+    """Writes Parquet files, with each dataframe written as one or more row groups.
+
+    Args:
+        compression (str, optional): Compression codec. Defaults to "snappy".
+        row_group_size (int | None, optional): Maximum number of rows in each row group. Defaults to pyarrow's default.
+    """
+
+    name = "parquet"
+    extension = "parquet"
+
+    def __init__(self, compression: str = "snappy", row_group_size: int | None = None):
+        self.compression = compression
+        self.row_group_size = row_group_size
+
+    def _open_table_writer(self, f: BinaryIO, schema: pa.Schema) -> pq.ParquetWriter:
+        return pq.ParquetWriter(f, schema, compression=self.compression)
+
+    def _write_table(self, table_writer: pq.ParquetWriter, table: pa.Table):
+        table_writer.write_table(table, row_group_size=self.row_group_size)
+
+
+class ArrowIPCOutputFormat(_ArrowOutputFormat):
+    """Writes Arrow IPC files, which can also be read as Feather V2 files.
+
+    Args:
+        compression (str | None, optional): Buffer compression codec, either "lz4" or "zstd". Defaults to None.
+    """
+
+    name = "arrow"
+    extension = "arrow"
+
+    def __init__(self, compression: str | None = None):
+        self.compression = compression
+
+    def _open_table_writer(
+        self, f: BinaryIO, schema: pa.Schema
+    ) -> pa.ipc.RecordBatchFileWriter:
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(f, schema, options=options)
+
+    def _write_table(self, table_writer: pa.ipc.RecordBatchFileWriter, table: pa.Table):
+        table_writer.write_table(table)
+
+
+OUTPUT_FORMATS: dict[str, type[OutputFormat]] = {
+    output_format.name: output_format
+    for output_format in (CSVOutputFormat, ParquetOutputFormat, ArrowIPCOutputFormat)
+}
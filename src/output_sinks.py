@@ -0,0 +1,226 @@
+from collections.abc import Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BufferedIOBase
+from typing import BinaryIO
+import logging
+import posixpath
+import uuid
+
+import fsspec
+from fsspec import AbstractFileSystem
+
+from .settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class MultipartUpload(BufferedIOBase):
+    """Writable binary file that streams to an S3 key through a multipart upload. Bytes are cut into parts as they are
+    written, and up to max_concurrency parts are uploaded at once while the writer keeps producing the next one. Files
+    that never fill a part are uploaded with a single PUT.
+
+    The upload is only completed when the file is closed, and abort discards the parts uploaded so far.
+
+    Args:
+        fs (AbstractFileSystem): S3 filesystem, from s3fs
+        path (str): Path to upload to, without the protocol
+        part_size (int, optional): Size of each part, at least the 5MB S3 minimum. Defaults to 8MB.
+        max_concurrency (int, optional): Maximum number of parts uploaded at once. Defaults to 8.
+    """
+
+    def __init__(
+        self,
+        fs: AbstractFileSystem,
+        path: str,
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        self.fs = fs
+        self.path = path
+        self.bucket, self.key, _ = fs.split_path(path)
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.buffer = bytearray()
+        self.position = 0
+        self.upload_id = None
+        self.parts: list[Future] = []
+        self.pool = ThreadPoolExecutor(max_concurrency)
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        self.buffer += data
+        size = len(data) if isinstance(data, bytes) else memoryview(data).nbytes
+        self.position += size
+        while len(self.buffer) >= self.part_size:
+            part = bytes(self.buffer[: self.part_size])
+            del self.buffer[: self.part_size]
+            self._upload_part(part)
+        return size
+
+    def close(self):
+        """Upload the rest of the buffer and complete the upload."""
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                self.fs.pipe_file(self.path, bytes(self.buffer))
+            else:
+                if self.buffer:
+                    self._upload_part(bytes(self.buffer))
+                parts = [part.result() for part in self.parts]
+                self.fs.call_s3(
+                    "complete_multipart_upload",
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self.buffer = bytearray()
+            self.pool.shutdown()
+            super().close()
+
+    def abort(self):
+        """Abort the upload, discarding any uploaded parts."""
+        for part in self.parts:
+            part.cancel()
+        self.pool.shutdown()
+        if self.upload_id is not None:
+            try:
+                self.fs.call_s3(
+                    "abort_multipart_upload",
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                )
+            except Exception as e:
+                logger.warning("Could not abort upload of %s: %s", self.path, e)
+            self.upload_id = None
+        self.buffer = bytearray()
+        super().close()
+
+    def _upload_part(self, data: bytes):
+        """Submit a part for upload, waiting for the oldest part still in flight if max_concurrency parts are
+        already being uploaded, so that at most max_concurrency parts are held in memory.
+        """
+        if self.upload_id is None:
+            upload = self.fs.call_s3(
+                "create_multipart_upload", Bucket=self.bucket, Key=self.key
+            )
+            self.upload_id = upload["UploadId"]
+        in_flight = [part for part in self.parts if not part.done()]
+        if len(in_flight) >= self.max_concurrency:
+            in_flight[0].result()
+        for part in self.parts:
+            if part.done() and part.exception() is not None:
+                raise part.exception()
+        part_number = len(self.parts) + 1
+        self.parts.append(self.pool.submit(self._send_part, part_number, data))
+
+    def _send_part(self, part_number: int, data: bytes) -> dict:
+        response = self.fs.call_s3(
+            "upload_part",
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+
+class OutputSink:
+    """Opens output files for writing and commits them atomically. Each file is written to a temporary path next to
+    its final path, and only moved into place once it has been written completely, so the catalogue never points to
+    a half written file. The temporary file is removed if writing fails.
+
+    S3 outputs are streamed through a concurrent MultipartUpload as they are written. Other filesystems are written
+    through fsspec.
+
+    Args:
+        part_size (int, optional): Size of each part of S3 multipart uploads. Defaults to 8MB.
+        max_concurrency (int | None, optional): Maximum number of parts uploaded at once for each file. Defaults to
+            settings.output_upload_concurrency.
+    """
+
+    def __init__(
+        self, part_size: int = 8 * 1024 * 1024, max_concurrency: int | None = None
+    ):
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency or settings.output_upload_concurrency
+
+    @contextmanager
+    def open(self, output_path: str) -> Generator[BinaryIO, None, None]:
+        """Open an output file for writing, committing it when the context exits without an error.
+
+        Args:
+            output_path (str): Final location of the file
+
+        Yields:
+            Generator[BinaryIO, None, None]: Binary file object to write to
+        """
+        fs, path = fsspec.core.url_to_fs(output_path)
+        parent = posixpath.dirname(path)
+        temp_path = self._temp_path(path, uuid.uuid4().hex)
+        try:
+            fs.makedirs(parent, exist_ok=True)
+        except PermissionError:
+            pass
+
+        f = self._open_temp(fs, temp_path)
+        try:
+            yield f
+        except BaseException:
+            if isinstance(f, MultipartUpload):
+                f.abort()
+            else:
+                f.close()
+            self._remove(fs, temp_path)
+            raise
+        try:
+            f.close()
+            fs.mv(temp_path, path)
+        except BaseException:
+            self._remove(fs, temp_path)
+            raise
+
+    def discard(self, output_path: str):
+        """Remove the temporary files left behind by writes of an output file that never finished, e.g. because the
+        process writing it was killed. Incomplete S3 multipart uploads are left to the bucket's lifecycle rules.
+
+        Args:
+            output_path (str): Final location of the file
+        """
+        fs, path = fsspec.core.url_to_fs(output_path)
+        for temp_path in fs.glob(self._temp_path(path, "*")):
+            self._remove(fs, temp_path)
+
+    @staticmethod
+    def _temp_path(path: str, suffix: str) -> str:
+        parent, name = posixpath.split(path)
+        return posixpath.join(parent, f".{name}.{suffix}.tmp")
+
+    def _open_temp(self, fs: AbstractFileSystem, temp_path: str) -> BinaryIO:
+        protocols = fs.protocol if isinstance(fs.protocol, tuple) else (fs.protocol,)
+        if "s3" in protocols:
+            return MultipartUpload(fs, temp_path, self.part_size, self.max_concurrency)
+        return fs.open(temp_path, "wb")
+
+    @staticmethod
+    def _remove(fs: AbstractFileSystem, path: str):
+        try:
+            fs.rm_file(path)
+        except FileNotFoundError:
+            pass
@@ -1,6 +1,10 @@
 import os
-import csv
 import datetime
+import itertools
+from collections import deque
+from collections.abc import Container, Generator, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 from typing import Type
 
 import pandas as pd
@@ -10,8 +14,18 @@ from m2m_base_client.models import CatalogueFileRecord
 
 from .scripts.base import BaseScript
 from .settings import settings
-from .file_handlers import FileHandler
+from .file_handlers import (
+    FileHandler,
+    InstrumentedFileHandler,
+    SkippingFileHandler,
+)
+from .executors import SectionExecutor, SerialExecutor
+from .staging import StagingCache, get_staging_cache
+from .output_formats import OutputFormat, CSVOutputFormat, ParquetOutputFormat
+from .output_sinks import OutputSink
+from .instrumentation import Instrumentation, StageStats
 from .data_catalogue import request_file_catalogue
+from .checkpoints import Checkpoint
 
 
 class FilePreparer:
@@ -25,9 +39,17 @@ class FilePreparer:
         start_date: datetime.date,
         end_date: datetime.date,
         source_creation_timestamp: datetime.datetime,
+        executor: SectionExecutor | None = None,
+        output_format: OutputFormat | None = None,
+        staging_cache: StagingCache | None = None,
+        output_sink: OutputSink | None = None,
     ):
         self.file_handler = file_handler
         self.script = script_cls(start_date, end_date)
+        self.executor = executor or SerialExecutor()
+        self.output_format = output_format or CSVOutputFormat()
+        self.staging_cache = staging_cache or get_staging_cache()
+        self.output_sink = output_sink or OutputSink()
 
         self.feed_identifier = feed_identifier
         self.feed_version = feed_version
@@ -35,6 +57,9 @@ class FilePreparer:
         self.start_date = start_date
         self.end_date = end_date
         self.source_creation_timestamp = source_creation_timestamp
+        self.instrumentation = Instrumentation(
+            feed_identifier, feed_version, data_supplier
+        )
 
         self.files_counter = 0
         self.output_file_paths = []
@@ -48,24 +73,196 @@ class FilePreparer:
         Returns:
             list[pd.DataFrame]: List of dataframes
         """
-        return [self.script.run(f) for f in self.file_handler.open(file_path)]
+        return list(self.iter_script(file_path))
+
+    def iter_script(
+        self, file_path: str, skip: Container[int] = ()
+    ) -> Iterator[pd.DataFrame]:
+        """Lazily calls the script's run method on each file object yielded by the file handler, so that only one
+        chunk of the input is held in memory at a time. The executor decides where the script is run, and always
+        yields the dataframes in the same order as the file objects. Detected encodings are remembered per data
+        supplier and feed. Remote files are staged on local disk first, so the file handler reads the local copy.
+        Staging, opening and running the script are measured as separate stages by the instrumentation.
+
+        Args:
+            file_path (str): Path to the file that needs to be prepared
+            skip (Container[int], optional): Indexes of sections not to run the script on. Defaults to none.
+
+        Yields:
+            Iterator[pd.DataFrame]: Dataframe for each file object yielded by the file handler
+        """
+        with self.stage(file_path) as staged_path:
+            with self.instrumentation.stage("open") as stats:
+                fs, path = fsspec.core.url_to_fs(staged_path)
+                stats.bytes_in += fs.size(path)
+            file_handler = self.file_handler
+            if skip:
+                file_handler = SkippingFileHandler(file_handler, skip)
+            dataframes = self.executor.map_file(
+                self.script,
+                InstrumentedFileHandler(file_handler, self.instrumentation),
+                staged_path,
+                (self.data_supplier, self.feed_identifier),
+            )
+            yield from self.instrumentation.iterate(
+                "run_script", dataframes, count_rows=True
+            )
+
+    @contextmanager
+    def stage(self, file_path: str) -> Generator[str, None, None]:
+        """Stage a remote file on local disk, unless the file handler reads it with its own range requests. The
+        staged file isn't evicted until the context is exited.
+
+        Args:
+            file_path (str): Path to the file that needs to be prepared
+
+        Yields:
+            str: Path for the file handler to read the file from
+        """
+        if self.file_handler.ranged_reads:
+            yield file_path
+            return
+        with ExitStack() as stack:
+            with self.instrumentation.stage("stage"):
+                staged_path = stack.enter_context(self.staging_cache.stage(file_path))
+            yield staged_path
 
     def write_outputs_to_file(
         self, dataframes: list[pd.DataFrame], concat: bool = True
     ) -> list[str]:
-        """Writes a list of dataframes to a file and returns the file location. All files are encoded in utf8, with
-        no index. If concat is True, then concatenate all dataframes into a single dataframe before writing to file.
+        """Writes a list of dataframes to a file in the output format and returns the file location. If concat is
+        True, then concatenate all dataframes into a single dataframe before writing to file.
         """
-        if concat:
-            df = pd.concat(dataframes)
-            self.output_file_paths.append(self._write_dataframe_to_file(df))
-        else:
-            for df in dataframes:
+        with self._measure_writes() as stats:
+            dataframes = list(self._count_rows(dataframes, stats))
+            if concat:
+                df = pd.concat(dataframes)
                 self.output_file_paths.append(self._write_dataframe_to_file(df))
+            else:
+                self._write_dataframes_to_files(dataframes)
+        return self.output_file_paths
+
+    def stream_outputs_to_file(
+        self, dataframes: Iterable[pd.DataFrame], concat: bool = True
+    ) -> list[str]:
+        """Writes dataframes to file as they are produced, so that each dataframe can be dropped once it has been
+        written. If concat is True, then every dataframe is appended to a single output file through the output
+        format's writer, which gives the same file as write_outputs_to_file. All dataframes are expected to share the
+        same columns in that case.
+
+        Args:
+            dataframes (Iterable[pd.DataFrame]): Dataframes to write, typically from iter_script
+            concat (bool, optional): Whether to append all dataframes to a single file. Defaults to True.
+
+        Returns:
+            list[str]: File locations
+        """
+        with self._measure_writes() as stats:
+            dataframes = self._count_rows(dataframes, stats)
+            if not concat:
+                self._write_dataframes_to_files(dataframes)
+                return self.output_file_paths
+
+            first_df = next(dataframes, None)
+            if first_df is None:
+                return self.output_file_paths
+
+            output_path = self._generate_file_path()
+            with self.output_sink.open(output_path) as f:
+                with self.output_format.writer(f) as write:
+                    write(first_df)
+                    del first_df
+                    for df in dataframes:
+                        write(df)
+            self.output_file_paths.append(output_path)
+        return self.output_file_paths
+
+    def checkpoint_outputs_to_file(
+        self, file_path: str, checkpoint: Checkpoint, concat: bool = True
+    ) -> list[str]:
+        """Writes the output of each section of a file as soon as it is produced, recording it in a checkpoint, so
+        that a retry after the task died part way through the file only prepares the sections that weren't done.
+        Sections the checkpoint already has are skipped, and their outputs reused.
+
+        If concat is False, each section is written to its own output file, as with stream_outputs_to_file.
+        Otherwise each section is written to a parquet file next to the checkpoint's manifest, and these are
+        appended to the single output file once every section is done.
+
+        Args:
+            file_path (str): Path to the file that needs to be prepared
+            checkpoint (Checkpoint): Checkpoint of the file
+            concat (bool, optional): Whether to append all dataframes to a single file. Defaults to True.
+
+        Returns:
+            list[str]: File locations
+        """
+        skip = set(checkpoint.sections)
+        indexes = (index for index in itertools.count() if index not in skip)
+        sections = zip(indexes, self.iter_script(file_path, skip))
+        if concat:
+            section_format = ParquetOutputFormat()
+            for index, df in sections:
+                self._checkpoint_section(
+                    checkpoint,
+                    index,
+                    df,
+                    checkpoint.section_path(index),
+                    section_format,
+                )
+            return self.stream_outputs_to_file(
+                (pd.read_parquet(path) for path in checkpoint.output_paths()), True
+            )
+
+        with self._measure_writes() as stats:
+            for index, df in sections:
+                stats.rows_in += len(df)
+                stats.rows_out += len(df)
+                self.files_counter = index
+                self._checkpoint_section(
+                    checkpoint,
+                    index,
+                    df,
+                    self._generate_file_path(),
+                    self.output_format,
+                )
+            self.output_file_paths.extend(checkpoint.output_paths())
         return self.output_file_paths
 
+    def _checkpoint_section(
+        self,
+        checkpoint: Checkpoint,
+        index: int,
+        df: pd.DataFrame,
+        output_path: str,
+        output_format: OutputFormat,
+    ):
+        """Write the output of a section, recording it in the checkpoint before and after."""
+        checkpoint.start(index, output_path)
+        with self.output_sink.open(output_path) as f:
+            output_format.write(df, f)
+        checkpoint.finish(index)
+
+    @contextmanager
+    def _measure_writes(self) -> Generator[StageStats, None, None]:
+        """Measure writing outputs as the "write_outputs" stage, counting the size of the files written."""
+        written = len(self.output_file_paths)
+        with self.instrumentation.stage("write_outputs") as stats:
+            yield stats
+            for output_path in self.output_file_paths[written:]:
+                fs, path = fsspec.core.url_to_fs(output_path)
+                stats.bytes_out += fs.size(path)
+
+    @staticmethod
+    def _count_rows(
+        dataframes: Iterable[pd.DataFrame], stats: StageStats
+    ) -> Iterator[pd.DataFrame]:
+        for df in dataframes:
+            stats.rows_in += len(df)
+            stats.rows_out += len(df)
+            yield df
+
     def _write_dataframe_to_file(self, output_df: pd.DataFrame) -> str:
-        """Writes a dataframe to a file and returns the file location. All files are encoded in utf8, with no index
+        """Writes a dataframe to a file in the output format and returns the file location.
 
         Args:
             output_df (pd.DataFrame): Dataframe to write to file
@@ -74,21 +271,59 @@ class FilePreparer:
             str: File location
         """
         output_path = self._generate_file_path()
-        with fsspec.open(output_path, "w") as f:
-            output_df.to_csv(f, index=False, quoting=csv.QUOTE_MINIMAL, encoding="utf8")
+        self._write_dataframe_to_path(output_df, output_path)
+        return output_path
+
+    def _write_dataframes_to_files(self, dataframes: Iterable[pd.DataFrame]):
+        """Writes each dataframe to its own file, with up to settings.output_parallel_files files written at once.
+        Paths are generated in the order of the dataframes, and no more dataframes are taken from the iterable than
+        are being written.
+
+        Args:
+            dataframes (Iterable[pd.DataFrame]): Dataframes to write
+        """
+        with ThreadPoolExecutor(settings.output_parallel_files) as pool:
+            pending = deque()
+            for df in dataframes:
+                if len(pending) >= settings.output_parallel_files:
+                    self.output_file_paths.append(pending.popleft().result())
+                output_path = self._generate_file_path()
+                pending.append(
+                    pool.submit(self._write_dataframe_to_path, df, output_path)
+                )
+                del df
+            while pending:
+                self.output_file_paths.append(pending.popleft().result())
+
+    def _write_dataframe_to_path(
+        self, output_df: pd.DataFrame, output_path: str
+    ) -> str:
+        """Writes a dataframe to a file in the output format through the output sink, which only commits the file
+        once it has been written completely.
+
+        Args:
+            output_df (pd.DataFrame): Dataframe to write to file
+            output_path (str): File location
+
+        Returns:
+            str: File location
+        """
+        with self.output_sink.open(output_path) as f:
+            self.output_format.write(output_df, f)
         return output_path
 
     def _generate_file_path(self) -> str:
         """Generates a file path for the output file. The file path is generated based on the output path and the
         files counter, which is incremented each time a file is generated. This helps to facilitate generating multiple
-        output files from a single input file."""
+        output files from a single input file. The extension is taken from the output format.
+        """
         output_path = os.path.join(
             settings.output_dir,
             self.data_supplier,
             datetime.datetime.utcnow().strftime("%Y-%m-%d %H-%M-%S-%f"),
             self.feed_identifier,
         )
-        file_path = f"{output_path}.{self.files_counter}.csv"
+        file_path = f"{output_path}.{self.files_counter}.{self.output_format.extension}"
         self.files_counter += 1
         return file_path
 
@@ -98,21 +333,30 @@ class FilePreparer:
         Args:
             client (DataCatalogueClient): Data catalogue client
         """
-        request_file_catalogue(
-            client=client,
-            file_records=[
-                CatalogueFileRecord(
-                    feed_identifier=self.feed_identifier,
-                    feed_version=self.feed_version,
-                    file_location=file_path,
-                    organisation="atheon",
-                    file_meta={
-                        "start_date": self.start_date.isoformat(),
-                        "end_date": self.end_date.isoformat(),
-                        "data_provider": self.data_supplier,
-                        "source_creation_timestamp": self.source_creation_timestamp.isoformat(),
-                    },
-                )
-                for file_path in self.output_file_paths
-            ],
-        )
+        file_records = self.file_records()
+        with self.instrumentation.stage("catalogue") as stats:
+            stats.rows_in += len(file_records)
+            request_file_catalogue(client=client, file_records=file_records)
+
+    def file_records(self) -> list[CatalogueFileRecord]:
+        """Generates a catalogue record for each output file.
+
+        Returns:
+            list[CatalogueFileRecord]: Catalogue records
+        """
+        return [
+            CatalogueFileRecord(
+                feed_identifier=self.feed_identifier,
+                feed_version=self.feed_version,
+                file_location=file_path,
+                organisation="atheon",
+                file_meta={
+                    "start_date": self.start_date.isoformat(),
+                    "end_date": self.end_date.isoformat(),
+                    "data_provider": self.data_supplier,
+                    "source_creation_timestamp": self.source_creation_timestamp.isoformat(),
+                    "file_format": self.output_format.name,
+                },
+            )
+            for file_path in self.output_file_paths
+        ]
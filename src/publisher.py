@@ -0,0 +1,142 @@
+from collections.abc import Iterable
+import asyncio
+import logging
+import uuid
+
+import aio_pika
+from celery import Celery
+from faststream.rabbit import RabbitBroker, RabbitQueue
+from kombu.serialization import dumps
+
+from .settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class TaskPublisher:
+    """Publishes Celery tasks from asyncio code, over the connection and channel the faststream broker already holds,
+    rather than blocking the event loop on a publish through Celery's own connection for every task.
+
+    Messages are built by Celery itself, so workers can't tell them apart from tasks sent with send_task. They are
+    published in batches, once batch_size messages are pending or flush_interval seconds after the first pending
+    message, whichever comes first. Every message of a batch is published at once and their publisher confirms are
+    awaited together, so the time spent waiting on the broker is paid once per batch rather than once per task.
+
+    Args:
+        broker (RabbitBroker): Broker to publish through, which must be connected before publishing
+        celery_app (Celery): Celery app the tasks belong to
+        batch_size (int | None, optional): Number of pending messages that triggers a flush. Defaults to
+            settings.publish_batch_size.
+        flush_interval (float | None, optional): Maximum number of seconds a message waits to be published. Defaults
+            to settings.publish_flush_interval.
+    """
+
+    def __init__(
+        self,
+        broker: RabbitBroker,
+        celery_app: Celery,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+    ):
+        self.broker = broker
+        self.celery_app = celery_app
+        self.batch_size = batch_size or settings.publish_batch_size
+        self.flush_interval = flush_interval or settings.publish_flush_interval
+
+        self._pending: list[tuple[aio_pika.Message, str, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flushing: set[asyncio.Task] = set()
+        self._declared: set[str] = set()
+
+    async def publish(
+        self, name: str, kwargs: dict, queue: str, task_id: str | None = None
+    ) -> str:
+        """Publish a task, returning once the broker has confirmed it.
+
+        Args:
+            name (str): Name of the task
+            kwargs (dict): Keyword arguments of the task
+            queue (str): Queue to publish the task to
+            task_id (str | None, optional): ID of the task. Defaults to a new UUID.
+
+        Returns:
+            str: ID of the task
+        """
+        task_id = task_id or str(uuid.uuid4())
+        waiter = asyncio.get_running_loop().create_future()
+        self._pending.append((self._message(name, kwargs, task_id), queue, waiter))
+        if len(self._pending) >= self.batch_size:
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._start_flush
+            )
+        await waiter
+        return task_id
+
+    async def flush(self):
+        """Publish every pending message, returning once they have all been confirmed."""
+        self._start_flush()
+        await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def _message(self, name: str, kwargs: dict, task_id: str) -> aio_pika.Message:
+        """Build a message in the Celery task protocol for the task."""
+        task_message = self.celery_app.amqp.as_task_v2(task_id, name, kwargs=kwargs)
+        content_type, content_encoding, body = dumps(
+            task_message.body, serializer=self.celery_app.conf.task_serializer
+        )
+        return aio_pika.Message(
+            body.encode(content_encoding) if isinstance(body, str) else body,
+            headers=task_message.headers,
+            content_type=content_type,
+            content_encoding=content_encoding,
+            correlation_id=task_id,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+
+    def _start_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        # Batches are published independently, so a slow batch doesn't hold up the next one
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, batch: list[tuple[aio_pika.Message, str, asyncio.Future]]):
+        """Publish a batch of messages at once. A message that fails to publish raises its error in the publish call
+        that added it, without failing the rest of the batch."""
+        try:
+            await self._declare(queue for _, queue, _ in batch)
+        except Exception as e:
+            logger.exception("Failed to declare the queues of %d tasks", len(batch))
+            for _, _, waiter in batch:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        results = await asyncio.gather(
+            *(
+                self.broker.publish(message, routing_key=queue)
+                for message, queue, _ in batch
+            ),
+            return_exceptions=True,
+        )
+        for (_, queue, waiter), result in zip(batch, results):
+            if waiter.done():
+                continue
+            if isinstance(result, BaseException):
+                logger.error("Failed to publish a task to %s: %s", queue, result)
+                waiter.set_exception(result)
+            else:
+                waiter.set_result(None)
+
+    async def _declare(self, queues: Iterable[str]):
+        """Declare each queue the first time it is published to, as Celery would, so that tasks published before a
+        worker has declared the queue aren't dropped."""
+        for queue in set(queues) - self._declared:
+            await self.broker.declare_queue(RabbitQueue(queue, durable=True))
+            self._declared.add(queue)
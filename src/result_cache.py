@@ -0,0 +1,176 @@
+from functools import cache
+from typing import Type
+import hashlib
+import inspect
+
+import fsspec
+
+from .scripts.base import BaseScript
+from .file_handlers import FileHandler
+from .cache import MemcachedCache, MemoryCache, get_cache
+from .settings import settings
+
+
+# Keys of fsspec file info that identify the contents of a file, in order of preference
+CHECKSUM_KEYS = ["ETag", "etag", "md5Hash", "md5", "crc32c", "checksum"]
+
+# Version of the code shared by every feed, e.g. the file handlers, executors and output formats. Bump it whenever a
+# change to that code changes what a file is prepared into, so that results prepared before the change are missed.
+ENGINE_VERSION = 1
+
+# Keys of fsspec file info that change whenever a file is rewritten, for filesystems without checksums
+MODIFIED_KEYS = ["mtime", "LastModified", "last_modified", "updated", "created"]
+
+
+def file_fingerprint(file_location: str, block_size: int = 8 * 2**20) -> str:
+    """Fingerprint the contents of a file. The checksum reported by the filesystem, e.g. the ETag of an S3 object,
+    is used if there is one, so that the file doesn't have to be read. Filesystems without checksums, e.g. local
+    files, are fingerprinted by the path, modification time and size of the file instead. Only files with none of
+    these are hashed.
+
+    Args:
+        file_location (str): Location of the file
+        block_size (int, optional): Number of bytes to read at a time when hashing. Defaults to 8MB.
+
+    Returns:
+        str: Fingerprint of the file
+    """
+    fs, path = fsspec.core.url_to_fs(file_location)
+    info = fs.info(path)
+    for key in CHECKSUM_KEYS:
+        if info.get(key):
+            return f"{key}:{str(info[key]).strip(chr(34))}:{info.get('size')}"
+    for key in MODIFIED_KEYS:
+        if info.get(key):
+            return f"{key}:{path}:{info[key]}:{info.get('size')}"
+
+    digest = hashlib.sha256()
+    with fs.open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return f"sha256:{digest.hexdigest()}"
+
+
+@cache
+def script_fingerprint(script_cls: Type[BaseScript]) -> str:
+    """Hash the source code of the modules a script and the classes it inherits from are defined in, including
+    BaseScript, so that changing a script or its base classes invalidates its cached results.
+
+    Args:
+        script_cls (Type[BaseScript]): Script class
+
+    Returns:
+        str: Hash of the source of the script's modules
+    """
+    digest = hashlib.sha256()
+    modules = []
+    for cls in script_cls.__mro__:
+        module = inspect.getmodule(cls)
+        if module is not None and module.__name__ not in {"builtins", "abc"}:
+            if module not in modules:
+                modules.append(module)
+    for module in modules:
+        try:
+            source = inspect.getsource(module)
+        except (OSError, TypeError):
+            source = module.__name__
+        digest.update(source.encode("utf8"))
+    digest.update(script_cls.__qualname__.encode("utf8"))
+    return digest.hexdigest()
+
+
+def handler_fingerprint(file_handler: FileHandler | None) -> str:
+    """Describe the type and options of a file handler, e.g. its encoding, so that re-registering a feed with
+    different options invalidates its cached results.
+
+    Args:
+        file_handler (FileHandler | None): File handler
+
+    Returns:
+        str: Type and options of the file handler
+    """
+    if file_handler is None:
+        return ""
+    options = sorted(vars(file_handler).items())
+    return f"{type(file_handler).__qualname__}:{options!r}"
+
+
+class ResultCache:
+    """Index from the contents of a source file, and how it was prepared, to the output files it was prepared into.
+    This lets a re-delivered file return its existing outputs rather than being prepared and catalogued again.
+
+    Args:
+        cache (MemcachedCache | MemoryCache | None, optional): Cache to hold the index in. Defaults to the process
+            wide memcached cache.
+        timeout (int | None, optional): Number of seconds to keep results for. Defaults to
+            settings.result_cache_timeout.
+    """
+
+    prefix = "prepared"
+
+    def __init__(
+        self,
+        cache: MemcachedCache | MemoryCache | None = None,
+        timeout: int | None = None,
+    ):
+        self.cache = cache or get_cache()
+        self.timeout = timeout or settings.result_cache_timeout
+
+    def key(
+        self,
+        file_location: str,
+        feed_identifier: str,
+        feed_version: int,
+        script_cls: Type[BaseScript],
+        output_format: str,
+        concat: bool,
+        file_handler: FileHandler | None = None,
+    ) -> str:
+        """Build the cache key for preparing a file.
+
+        Args:
+            file_location (str): Location of the source file
+            feed_identifier (str): Identifier of feed
+            feed_version (int): Version of feed
+            script_cls (Type[BaseScript]): Script used to prepare the file
+            output_format (str): Name of the output format
+            concat (bool): Whether the outputs are concatenated into a single file
+            file_handler (FileHandler | None, optional): File handler used to open the file. Defaults to None.
+
+        Returns:
+            str: Cache key, short enough and free of whitespace so that it is a valid memcached key
+        """
+        parts = [
+            file_fingerprint(file_location),
+            feed_identifier,
+            str(feed_version),
+            script_fingerprint(script_cls),
+            output_format,
+            str(concat),
+            handler_fingerprint(file_handler),
+            str(ENGINE_VERSION),
+        ]
+        digest = hashlib.sha256("\0".join(parts).encode("utf8")).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def get(self, key: str) -> list[str] | None:
+        """Get the output file paths for a key. Results whose output files no longer all exist are treated as misses.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            list[str] | None: Output file paths, or None if there is no usable result
+        """
+        output_file_paths = self.cache.get(key)
+        if not output_file_paths:
+            return None
+        for file_path in output_file_paths:
+            fs, path = fsspec.core.url_to_fs(file_path)
+            if not fs.exists(path):
+                self.cache.delete(key)
+                return None
+        return list(output_file_paths)
+
+    def set(self, key: str, output_file_paths: list[str]):
+        self.cache.set(key, list(output_file_paths), self.timeout)
@@ -0,0 +1,134 @@
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+import logging
+
+import fsspec
+
+from .settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# How much more work a feed does per input byte than a plain delimited file. Kept here rather than on the scripts,
+# so that the processes publishing tasks can estimate costs without importing them.
+FEED_COST_FACTORS: dict[str, float] = {
+    "horizon_daily_performance_sales": 2.0,
+}
+
+# Approximate ratio of uncompressed to compressed size for compressed inputs
+COMPRESSION_FACTORS: dict[str, float] = {
+    ".zip": 5.0,
+    ".gz": 5.0,
+}
+
+
+class TaskRouter:
+    """Routes preparation tasks to the queue for small or for large inputs, by an estimate of how much work they are,
+    so that a large backfill doesn't hold up small daily files behind it. Each queue is consumed by its own workers,
+    with the concurrency and memory limits suited to its inputs.
+
+    The cost of a file is its size, as reported by the filesystem, scaled by the cost factor of its feed and, if it
+    is compressed, by its compression factor. The sizes of the files of a batch are fetched concurrently, and only
+    until the batch is known to belong on the large queue.
+
+    Args:
+        small_queue (str | None, optional): Queue for tasks costing less than large_cost. Defaults to
+            settings.small_queue.
+        large_queue (str | None, optional): Queue for tasks costing at least large_cost. Defaults to
+            settings.large_queue.
+        large_cost (int | None, optional): Estimated cost, in bytes, from which tasks are routed to the large queue.
+            Defaults to settings.large_file_cost.
+        cost_factors (dict[str, float] | None, optional): Cost factor of each feed. Defaults to FEED_COST_FACTORS.
+        max_concurrency (int, optional): Maximum number of file sizes fetched at once. Defaults to 16.
+    """
+
+    def __init__(
+        self,
+        small_queue: str | None = None,
+        large_queue: str | None = None,
+        large_cost: int | None = None,
+        cost_factors: dict[str, float] | None = None,
+        max_concurrency: int = 16,
+    ):
+        self.small_queue = small_queue or settings.small_queue
+        self.large_queue = large_queue or settings.large_queue
+        self.large_cost = large_cost or settings.large_file_cost
+        self.cost_factors = FEED_COST_FACTORS if cost_factors is None else cost_factors
+        self.max_concurrency = max_concurrency
+
+    def cost(self, feed_identifier: str, file_location: str) -> float:
+        """Estimate the cost of preparing a file.
+
+        Args:
+            feed_identifier (str): Feed of the file
+            file_location (str): Location of the file
+
+        Returns:
+            float: Estimated cost in bytes, or 0 if the size of the file can't be found
+        """
+        try:
+            fs, path = fsspec.core.url_to_fs(file_location)
+            size = fs.info(path)["size"] or 0
+        except Exception:
+            # The task fails quickly on a file it can't read, so it is no reason to hold up a large worker
+            logger.warning("Could not get the size of %s", file_location, exc_info=True)
+            return 0
+        suffix = PurePosixPath(path).suffix.lower()
+        return (
+            size
+            * self.cost_factors.get(feed_identifier, 1.0)
+            * COMPRESSION_FACTORS.get(suffix, 1.0)
+        )
+
+    def queue(self, feed_identifier: str, file_locations: str | Iterable[str]) -> str:
+        """Choose the queue for a task preparing one file, or a batch of files of the same feed.
+
+        Args:
+            feed_identifier (str): Feed of the files
+            file_locations (str | Iterable[str]): Location of the file, or of each file in the batch
+
+        Returns:
+            str: Name of the queue
+        """
+        if isinstance(file_locations, str):
+            file_locations = [file_locations]
+        file_locations = list(file_locations)
+        if len(file_locations) == 1:
+            cost = self.cost(feed_identifier, file_locations[0])
+        else:
+            cost = self._batch_cost(feed_identifier, file_locations)
+        queue = self.queue_for(cost)
+        logger.debug(
+            "Routing %s task costing %d bytes to %s", feed_identifier, cost, queue
+        )
+        return queue
+
+    def _batch_cost(self, feed_identifier: str, file_locations: list[str]) -> float:
+        """Sum the costs of a batch of files, fetching their sizes concurrently. Sizes that haven't been fetched yet
+        are cancelled once the total reaches large_cost, as it can only choose the large queue from then on.
+        """
+        cost = 0.0
+        with ThreadPoolExecutor(
+            min(self.max_concurrency, len(file_locations)),
+            thread_name_prefix="routing",
+        ) as pool:
+            for file_cost in pool.map(
+                lambda location: self.cost(feed_identifier, location), file_locations
+            ):
+                cost += file_cost
+                if cost >= self.large_cost:
+                    pool.shutdown(cancel_futures=True)
+                    break
+        return cost
+
+    def queue_for(self, cost: float) -> str:
+        """Choose the queue for a task of a given cost.
+
+        Args:
+            cost (float): Estimated cost of the task in bytes
+
+        Returns:
+            str: Name of the queue
+        """
+        return self.large_queue if cost >= self.large_cost else self.small_queue
@@ -1,9 +1,10 @@
 import datetime
+from typing import Literal
 
 from pydantic import BaseModel, Field, AnyUrl, field_serializer
 
 
-class PrepareFile(BaseModel):
+class Feed(BaseModel):
     feed_identifier: str = Field(
         ..., description="What type of file this is. E.g. retaillink_daily_sales"
     )
@@ -11,15 +12,18 @@ class PrepareFile(BaseModel):
         1,
         description="What preparation script version to use when processing the file",
     )
+    data_supplier: str = Field(
+        ...,
+        description="Name of the data supplier.",
+    )
+
+
+class FileToPrepare(BaseModel):
     file_location: AnyUrl = Field(
         ...,
         description="Location of the file. Should be in the URI format",
         examples=["s3://bucket-name/path/to/file.csv", "file:///path/to/file.csv"],
     )
-    data_supplier: str = Field(
-        ...,
-        description="Name of the data supplier.",
-    )
     start_date: datetime.date = Field(
         ...,
         description="Start date of the data contained in the file (inclusive)",
@@ -32,10 +36,6 @@ class PrepareFile(BaseModel):
         ...,
         description="Timestamp of when the file was created by the data supplier",
     )
-    concat: bool = Field(
-        True,
-        description="Whether to concatenate the preparation results into a single output file",
-    )
 
     @field_serializer("file_location")
     def serialize_file_location(self, location: AnyUrl) -> str:
@@ -43,5 +43,72 @@ class PrepareFile(BaseModel):
         return str(location)
 
 
+class PrepareOptions(BaseModel):
+    concat: bool = Field(
+        True,
+        description="Whether to concatenate the preparation results into a single output file",
+    )
+    streaming: bool = Field(
+        True,
+        description="Whether to write each prepared chunk to file as soon as it is produced, keeping memory usage flat",
+    )
+    parallel: bool = Field(
+        False,
+        description="Whether to prepare the sections of the file in parallel, using the worker's process pool",
+    )
+    output_format: Literal["csv", "parquet", "arrow"] | None = Field(
+        None,
+        description="Format to write the prepared file in. Defaults to the format registered for the feed",
+    )
+    force: bool = Field(
+        False,
+        description="Whether to prepare the file even if it has already been prepared, rather than returning the existing output files",
+    )
+    resumable: bool = Field(
+        False,
+        description="Whether to checkpoint each prepared section, so that a retry after the task dies resumes from the first unfinished section",
+    )
+
+
+class PrepareFile(PrepareOptions, FileToPrepare, Feed):
+    distributed: bool = Field(
+        False,
+        description="Whether to split the file into parts that are prepared by many workers at once, then merged",
+    )
+
+
+class PrepareFiles(PrepareOptions, Feed):
+    files: list[FileToPrepare] = Field(
+        ...,
+        min_length=1,
+        description="Files of the feed to prepare, each with the dates of the data it contains",
+    )
+
+
 class TaskResult(BaseModel):
     task_id: str = Field(..., description="ID of the Celery task")
+
+
+class BatchResult(BaseModel):
+    group_id: str = Field(
+        ..., description="ID of the batch, used to look up the status of each file"
+    )
+
+
+class FileStatus(BaseModel):
+    status: Literal["pending", "written", "prepared", "cached", "failed"] = Field(
+        ...,
+        description="pending until the file has been prepared, written once its outputs have been written, then "
+        "prepared once they have been catalogued. cached if the outputs of an earlier preparation were reused",
+    )
+    output_file_paths: list[str] = Field(
+        [], description="Locations of the prepared files"
+    )
+    error: str | None = Field(None, description="Why the file could not be prepared")
+
+
+class BatchStatus(BaseModel):
+    group_id: str = Field(..., description="ID of the batch")
+    files: dict[str, FileStatus] = Field(
+        ..., description="Status of each file, by file location"
+    )
@@ -1,11 +1,130 @@
 from abc import ABC, abstractmethod
-from typing import TextIO, BinaryIO
+from typing import Any, NamedTuple, TextIO, BinaryIO
+import codecs
+import csv
 import datetime
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from src.file_handlers import buffer_of
+
+
+# Same strings that pandas.read_csv treats as missing by default
+NA_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
+
+
+def _types_mapper(arrow_type: pa.DataType) -> pd.api.extensions.ExtensionDtype | None:
+    """Keep strings in Arrow memory, rather than converting them to Python objects."""
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+class Column(NamedTuple):
+    """Declarative definition of a column of the prepared output, which is built by BaseScript.build_output.
+
+    Attributes:
+        source (str | None): Name of the source column to take the values from. Defaults to the name of the output
+            column. If the source column doesn't exist, the output column is filled with None.
+        dtype (type | None): Type to convert the values to. Missing values are kept as missing when converting to str.
+        lstrip (str | None): Characters to strip from the start of each value.
+        extract (str | None): Regex with a single group, which is extracted from each value.
+        to_datetime (bool): Whether to parse the values as datetimes.
+        attribute (str | None): Name of a script attribute to fill the column with, e.g. start_date.
+        row_number (bool): Whether to fill the column with the row number.
+    """
+
+    source: str | None = None
+    dtype: type | None = None
+    lstrip: str | None = None
+    extract: str | None = None
+    to_datetime: bool = False
+    attribute: str | None = None
+    row_number: bool = False
+
+    def build(self, name: str, script: "BaseScript", source: pd.DataFrame) -> Any:
+        """Build the values of the column from the source dataframe.
+
+        Args:
+            name (str): Name of the output column
+            script (BaseScript): Script that is being run
+            source (pd.DataFrame): Source dataframe
+
+        Returns:
+            Any: Array of values, or a scalar that is broadcast to every row
+        """
+        if self.row_number:
+            values = np.arange(len(source))
+            return values if self.dtype is None else values.astype(self.dtype)
+        if self.attribute is not None:
+            return getattr(script, self.attribute)
+
+        source_name = self.source or name
+        if source_name not in source:
+            return None
+        values = source[source_name]
+        if self.lstrip is not None:
+            values = values.str.lstrip(self.lstrip)
+        if self.extract is not None:
+            values = values.str.extract(self.extract, expand=False)
+        if self.to_datetime:
+            values = pd.to_datetime(values)
+        if self.dtype is str:
+            values = values.astype(str).where(values.notna(), np.nan)
+        elif self.dtype is not None:
+            values = values.astype(self.dtype)
+        return values
 
 
 class BaseScript(ABC):
+    """Base class for all preparation scripts.
+
+    Scripts declare the schema of their source file and of their output with the class attributes below. The source
+    file is read with read_source, and the output is built from it with build_output.
+
+    Attributes:
+        source_schema (dict[str, pa.DataType | None]): Columns of the source file, in order, mapped to the Arrow type
+            to parse them as. Columns mapped to None, or missing from the schema when the file has a header, have
+            their type inferred.
+        source_header (bool): Whether the first row of the source file is a header. If it isn't, the columns are
+            named from source_schema.
+        source_delimiter (str): Field delimiter of the source file.
+        output_schema (dict[str, Column]): Columns of the prepared output, in order.
+        splittable (bool): Whether running the script on consecutive runs of whole records of a section, and
+            offsetting their row numbers, gives the same rows as running it on the whole section. True for scripts
+            that transform each record on its own and whose source columns are all typed, so that no type is
+            inferred from only some of the records.
+    """
+
+    source_schema: dict[str, pa.DataType | None] = {}
+    source_header: bool = True
+    source_delimiter: str = ","
+    output_schema: dict[str, Column] = {}
+    splittable: bool = False
+
     def __init__(self, start_date: datetime.date, end_date: datetime.date):
         self.start_date = start_date
         self.end_date = end_date
@@ -15,3 +134,95 @@ class BaseScript(ABC):
     @abstractmethod
     def run(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
         pass
+
+    def read_source(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
+        """Read the source file with the multithreaded pyarrow CSV reader. Strings are kept as Arrow backed strings and
+        never go through object dtype, while numbers are converted to numpy dtypes. The same values are treated as
+        missing as in pandas.read_csv.
+
+        Args:
+            file_obj (TextIO | BinaryIO): File object yielded by a FileHandler
+
+        Returns:
+            pd.DataFrame: Dataframe of the source file
+        """
+        source, encoding = self._source_buffer(file_obj)
+        column_names = None if self.source_header else list(self.source_schema)
+        names = column_names or self._header_names(source, encoding)
+        try:
+            table = pa_csv.read_csv(
+                pa.BufferReader(source),
+                read_options=pa_csv.ReadOptions(
+                    column_names=column_names, encoding=encoding, use_threads=True
+                ),
+                parse_options=pa_csv.ParseOptions(delimiter=self.source_delimiter),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={
+                        name: self.source_schema[name]
+                        for name in names
+                        if self.source_schema.get(name) is not None
+                    },
+                    null_values=NA_VALUES,
+                    strings_can_be_null=True,
+                ),
+            )
+        except pa.ArrowInvalid as e:
+            # pyarrow raises ArrowInvalid rather than UnicodeDecodeError for columns typed as strings that aren't
+            # valid utf8
+            if "invalid UTF8" not in str(e):
+                raise
+            raise UnicodeDecodeError(encoding, b"", 0, 0, str(e)) from e
+        undecoded = [
+            field.name
+            for field in table.schema
+            if pa.types.is_binary(field.type)
+            and self.source_schema.get(field.name) is None
+        ]
+        if undecoded:
+            # pyarrow infers binary rather than string for columns that aren't valid utf8
+            raise UnicodeDecodeError(
+                encoding, b"", 0, 0, f"columns {undecoded} aren't valid {encoding}"
+            )
+        return table.to_pandas(types_mapper=_types_mapper)
+
+    def build_output(self, source: pd.DataFrame) -> pd.DataFrame:
+        """Build the prepared output from the source dataframe in a single pass over output_schema. Each column is
+        built from the source columns and the output dataframe is created once, without copying the columns, rather
+        than converting, adding and reordering the columns of the source dataframe one at a time.
+
+        Args:
+            source (pd.DataFrame): Source dataframe
+
+        Returns:
+            pd.DataFrame: Prepared output, with the same index as the source dataframe
+        """
+        return pd.DataFrame(
+            {
+                name: column.build(name, self, source)
+                for name, column in self.output_schema.items()
+            },
+            index=source.index,
+            copy=False,
+        )
+
+    @staticmethod
+    def _source_buffer(file_obj: TextIO | BinaryIO) -> tuple[pa.Buffer, str]:
+        """Get the encoded contents of a file object as an Arrow buffer, without copying them if possible. The
+        encoding is normalised so that pyarrow only transcodes files that aren't utf8.
+        """
+        contents = buffer_of(file_obj)
+        if contents is not None:
+            buffer, encoding = contents
+            if encoding is None or codecs.lookup(encoding).name == "utf-8":
+                encoding = "utf8"
+            return pa.py_buffer(buffer), encoding
+        content = file_obj.read()
+        if isinstance(content, str):
+            return pa.py_buffer(content.encode("utf8")), "utf8"
+        return pa.py_buffer(content), "utf8"
+
+    def _header_names(self, source: pa.Buffer, encoding: str) -> list[str]:
+        """Parse the column names from the first line of the source file."""
+        first_line = memoryview(source)[:65536].tobytes().split(b"\n", 1)[0]
+        first_line = first_line.decode(encoding, errors="ignore").lstrip("\ufeff")
+        return next(csv.reader([first_line], delimiter=self.source_delimiter), [])
@@ -1,8 +1 @@
-from .case_size import CaseSize
 from .daily_performance_sales import DailySales
-from .daily_performance_subcat import DailySubcat
-from .daily_stock_depot import DailyDepotStock
-from .daily_stock_product import DailyProductStock
-from .weekly_performance_ranged import WeeklyStoresRanged
-from .weekly_performance_sales import WeeklySales
-from .weekly_performance_subcat import WeeklySubcat
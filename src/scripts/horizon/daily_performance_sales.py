@@ -1,20 +1,64 @@
-from collections import OrderedDict
 from typing import TextIO, BinaryIO
 
-import pandas as pd
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 
-from src.scripts.base import BaseScript
+from src.scripts.base import BaseScript, Column
 from src.factories import preparer_factory
 from src.file_handlers import SeparatedFileHandler
 
 
+# Row kind codes, given to each row of the report by DailySales.classify_rows
+LABEL_ROW, DATE_ROW, SKU_ROW, CATEGORY_ROW = range(4)
+LABELS = ["Sub-Cat Subtotal", "Overall Sub-Cat Total"]
+DATE_PATTERN = r"^\d{2}/\d{2}/\d{4}$"
+SKU_PATTERN = r"^\d+$"
+
+
 @preparer_factory.register(
     feed="horizon_daily_performance_sales",
     version=1,
     opener=SeparatedFileHandler(encoding="latin1"),
 )
 class DailySales(BaseScript):
+    output_schema = {
+        "ID": Column(row_number=True, dtype=float),
+        "SOURCEFILENAME": Column(attribute="filename"),
+        "PROCESSED": Column(attribute="now"),
+        "RETAILER": Column(),
+        "DAILY": Column(dtype=str),
+        "CATEGORY": Column(dtype=str),
+        "SKU": Column(dtype=float),
+        "DEPTCOMM": Column(dtype=str),
+        "DESCRIPTION": Column(dtype=str),
+        "LOSTOPP": Column(),
+        "SALESCASH": Column(dtype=float),
+        "SALESVOL": Column(dtype=float),
+        "LOSTSALESVAL": Column(dtype=float),
+        "LOSTSALESVOL": Column(dtype=float),
+        "WASTAGETOTALVAL": Column(dtype=float),
+        "WASTAGETOTALVOL": Column(dtype=float),
+        "WASTAGETOTALPCT": Column(dtype=float),
+        "AVAILINSTPCT": Column(dtype=float),
+        "AVAILVOLPCT": Column(dtype=float),
+        "STORESTOCK": Column(dtype=float),
+        "MAINSTOCKAVAILABLE": Column(dtype=float),
+        "MAINSTOCKHELD": Column(dtype=float),
+        "PCCSTOCK": Column(dtype=float),
+        "LYINGOUT": Column(dtype=float),
+        "BONDSTOCK": Column(dtype=float),
+        "DEPOTISSUES": Column(dtype=float),
+        "DEPOTSERVICEPCT": Column(dtype=float),
+        "SUPPSERVNUMBER": Column(dtype=float),
+        "SUPPSERVPCT": Column(dtype=float),
+        "STORESRANGED": Column(),
+        "NOREPLEN": Column(dtype=float),
+        "VICTIMIND": Column(dtype=str),
+        "PROMOIND": Column(dtype=str),
+    }
+
     def run(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
         column_headers = [
             "SKU",
@@ -45,97 +89,71 @@ class DailySales(BaseScript):
         ]
 
         data_frame = pd.read_csv(file_obj, dtype=str, names=column_headers)
-
-        dest_header = OrderedDict(
-            [
-                ("ID", float),
-                ("SOURCEFILENAME", str),
-                (
-                    "PROCESSED",
-                    None,
-                ),
-                ("RETAILER", str),
-                ("DAILY", str),
-                (
-                    "CATEGORY",
-                    str,
-                ),
-                ("SKU", float),
-                (
-                    "DEPTCOMM",
-                    str,
-                ),
-                (
-                    "DESCRIPTION",
-                    str,
-                ),
-                ("LOSTOPP", float),
-                ("SALESCASH", float),
-                ("SALESVOL", float),
-                ("LOSTSALESVAL", float),
-                ("LOSTSALESVOL", float),
-                ("WASTAGETOTALVAL", float),
-                ("WASTAGETOTALVOL", float),
-                ("WASTAGETOTALPCT", float),
-                ("AVAILINSTPCT", float),
-                ("AVAILVOLPCT", float),
-                ("STORESTOCK", float),
-                ("MAINSTOCKAVAILABLE", float),
-                ("MAINSTOCKHELD", float),
-                ("PCCSTOCK", float),
-                ("LYINGOUT", float),
-                ("BONDSTOCK", float),
-                ("DEPOTISSUES", float),
-                ("DEPOTSERVICEPCT", float),
-                ("SUPPSERVNUMBER", float),
-                ("SUPPSERVPCT", float),
-                ("STORESRANGED", float),
-                ("NOREPLEN", float),
-                (
-                    "VICTIMIND",
-                    str,
-                ),
-                ("PROMOIND", str),
-            ]
-        )
-
-        data_frame = data_frame.loc[~data_frame["SKU"].isnull(), :].iloc[1:, :]
-
-        date_rows = data_frame.SKU.str.contains(r"^\d{2}\/\d{2}\/\d{4}$").fillna(False)
-        sku_rows = data_frame.SKU.str.contains(r"^\d+$").fillna(False)
-        label_rows = data_frame.SKU.isin(
-            ["Sub-Cat Subtotal", "Overall Sub-Cat Total"]
-        ).fillna(False)
-        category_rows = ~label_rows & ~sku_rows & ~date_rows
-
-        data_frame["DAILY"] = 0
-        data_frame.loc[date_rows, "DAILY"] = data_frame.loc[date_rows, "SKU"]
-        data_frame["DAILY"] = data_frame["DAILY"].replace(to_replace=0, method="ffill")
-        data_frame["DAILY"] = data_frame.DAILY.str.replace(
-            r"(\d{2})\/(\d{2})\/(\d{4})", r"\3\2\1"
+        return self.build_output(self.sku_rows(data_frame))
+
+    def sku_rows(self, data_frame: pd.DataFrame) -> pd.DataFrame:
+        """Select the SKU rows of the report, with the DAILY and CATEGORY of the date and category header rows they
+        fall under. The headers are found by integer index arithmetic on the classified rows, rather than by forward
+        filling object columns. SKU rows before the first date get no DAILY, and before the first category get a
+        CATEGORY of "0".
+
+        Args:
+            data_frame (pd.DataFrame): Rows of the report
+
+        Returns:
+            pd.DataFrame: SKU rows
+        """
+        # The first row with a SKU is the header row
+        rows = np.flatnonzero(data_frame["SKU"].notna().to_numpy())[1:]
+        skus = data_frame["SKU"].take(rows)
+        row_kinds = self.classify_rows(skus)
+
+        sku_rows = np.flatnonzero(row_kinds == SKU_ROW)
+        values = skus.to_numpy(dtype=object)
+        last_date = self.last_row_of_kind(row_kinds, DATE_ROW)[sku_rows]
+        last_category = self.last_row_of_kind(row_kinds, CATEGORY_ROW)[sku_rows]
+
+        data_frame = data_frame.take(rows[sku_rows])
+        data_frame["DAILY"] = np.where(last_date >= 0, values[last_date], np.nan)
+        data_frame["CATEGORY"] = np.where(
+            last_category >= 0, values[last_category], "0"
         )
-
-        data_frame["CATEGORY"] = 0
-        data_frame.loc[category_rows, "CATEGORY"] = data_frame.loc[category_rows, "SKU"]
-        data_frame["CATEGORY"] = data_frame["CATEGORY"].replace(
-            to_replace=0, method="ffill"
-        )
-        data_frame = data_frame.loc[sku_rows]
-
-        data_frame["SOURCEFILENAME"] = self.filename
-        data_frame["PROCESSED"] = self.now
-
-        data_frame["ID"] = list(range(len(data_frame)))
-
-        for col in dest_header:
-            if col not in data_frame:
-                data_frame[col] = None
-            elif dest_header[col] is not None:
-                data_frame[col] = data_frame[col].astype(dest_header[col])
-
-        for c in data_frame.select_dtypes(include=["object"]).columns:
-            data_frame[c] = data_frame[c].replace("nan", np.nan)
-
-        data_frame = data_frame[list(dest_header.keys())]
-
         return data_frame
+
+    @staticmethod
+    def classify_rows(skus: pd.Series) -> np.ndarray:
+        """Classify each row by its SKU column. The column is converted to Arrow once, and matched with pyarrow's
+        compute kernels rather than a Python level regex call per row. Rows that aren't dates, SKUs or subtotal labels
+        are category headers.
+
+        Args:
+            skus (pd.Series): SKU column
+
+        Returns:
+            np.ndarray: Row kind code of each row
+        """
+        skus = pa.array(skus.to_numpy(), type=pa.string(), from_pandas=True)
+        row_kinds = np.full(len(skus), CATEGORY_ROW, dtype=np.int8)
+        for kind, matches in [
+            (DATE_ROW, pc.match_substring_regex(skus, DATE_PATTERN)),
+            (SKU_ROW, pc.match_substring_regex(skus, SKU_PATTERN)),
+            (LABEL_ROW, pc.is_in(skus, pa.array(LABELS))),
+        ]:
+            row_kinds[matches.fill_null(False).to_numpy(zero_copy_only=False)] = kind
+        return row_kinds
+
+    @staticmethod
+    def last_row_of_kind(row_kinds: np.ndarray, kind: int) -> np.ndarray:
+        """Find the position of the last row of a kind at or before each row, e.g. the date header that a SKU row
+        falls under, with a cumulative max over the positions of those rows. Rows before the first row of the kind
+        get -1.
+
+        Args:
+            row_kinds (np.ndarray): Row kind code of each row
+            kind (int): Row kind code to find
+
+        Returns:
+            np.ndarray: Position of the last row of the kind for each row
+        """
+        positions = np.where(row_kinds == kind, np.arange(len(row_kinds)), -1)
+        return np.maximum.accumulate(positions) if len(positions) else positions
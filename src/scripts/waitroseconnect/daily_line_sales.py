@@ -1,6 +1,7 @@
 from typing import TextIO, BinaryIO
 
 import pandas as pd
+import pyarrow as pa
 
 from src.scripts.base import BaseScript
 from src.factories import preparer_factory
@@ -9,6 +10,19 @@ from src.file_handlers import BasicFileHandler
 
 @preparer_factory.register("waitroseconnect_daily_line_sales", 1, BasicFileHandler())
 class DailyLineSales(BaseScript):
+    source_schema = {
+        "Day": pa.string(),
+        "Date": pa.string(),
+        "Line": None,
+        "Line_Description": pa.string(),
+        "Registered_Sales": pa.string(),
+        "Sales_SUs": None,
+        "Reduced": pa.string(),
+        "Explained_Wastage": pa.string(),
+        "Explained_Wastage_Quality": pa.string(),
+        "Reductions_pct_Registered_Sales": None,
+    }
+
     def run(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
         columns = [
             "Day",
@@ -23,7 +37,7 @@ class DailyLineSales(BaseScript):
             "Reductions_pct_Registered_Sales",
         ]
 
-        df = pd.read_csv(file_obj)
+        df = self.read_source(file_obj)
         df = self._deduplicate_single_daily_line_sales(df)
 
         pound_columns = [
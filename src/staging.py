@@ -0,0 +1,206 @@
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+import fcntl
+import hashlib
+import logging
+import os
+
+import fsspec
+
+from .file_handlers import local_path
+from .result_cache import CHECKSUM_KEYS
+from .settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class StagingCache:
+    """Local disk cache for remote input files, shared by all of the worker's processes. Files are downloaded with
+    concurrent range requests, checked against their size and, where the filesystem reports a plain MD5 ETag, their
+    checksum, then moved into place so readers never see a partial file. The least recently used files are evicted
+    once the cache holds more than max_bytes.
+
+    A staged file is locked for reading, shared with other readers, until its caller exits the stage context, so the
+    file can't be evicted by another process between being staged and being opened. Files that are being read are
+    skipped by eviction. Local files aren't staged, so file handlers can memory map whatever path stage yields.
+
+    Args:
+        directory (str | None, optional): Directory to keep staged files in. Defaults to settings.staging_dir.
+        max_bytes (int | None, optional): Maximum total size of the staged files. Defaults to
+            settings.staging_max_bytes.
+        part_size (int, optional): Number of bytes fetched by each range request. Defaults to 8MB.
+        max_concurrency (int, optional): Maximum number of concurrent range requests. Defaults to 8.
+    """
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_bytes: int | None = None,
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        self.directory = Path(directory or settings.staging_dir)
+        self.max_bytes = max_bytes or settings.staging_max_bytes
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        # Kept for the life of the process, so each download reuses the same threads. They are started on the first
+        # download, so a cache created before a worker forks doesn't hand threads to its children.
+        self._pool = ThreadPoolExecutor(max_concurrency, thread_name_prefix="staging")
+
+    @contextmanager
+    def stage(self, file_path: str) -> Generator[str, None, None]:
+        """Get a local copy of a file, downloading it unless an up to date copy has already been staged. The copy
+        isn't evicted until the context is exited, so it should be read within the context.
+
+        Args:
+            file_path (str): Path to the file
+
+        Raises:
+            ValueError: If the downloaded file doesn't match the size or checksum of the remote file.
+
+        Yields:
+            str: Local path to read the file from
+        """
+        path = local_path(file_path)
+        if path is not None:
+            yield path
+            return
+
+        fs, remote_path = fsspec.core.url_to_fs(file_path)
+        info = fs.info(remote_path)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        staged = self.directory / f"{self._key(file_path, info)}.data"
+        while True:
+            with self._lock(staged, fcntl.LOCK_SH):
+                if staged.exists() and staged.stat().st_size == info["size"]:
+                    # The modification time orders staged files for eviction
+                    os.utime(staged)
+                    yield str(staged)
+                    return
+            with self._lock(staged, fcntl.LOCK_EX):
+                if not (staged.exists() and staged.stat().st_size == info["size"]):
+                    self._download(fs, remote_path, info, staged)
+            # The file is read under the shared lock on the next pass, unless it has been evicted again in between
+            self._evict(keep=staged)
+
+    def _download(self, fs, remote_path: str, info: dict, staged: Path):
+        """Download a file with concurrent range requests into a partial file, then move it into place once it has
+        been checked."""
+        size = info["size"]
+        partial = staged.with_suffix(".part")
+        try:
+            with open(partial, "wb") as f:
+                f.truncate(size)
+                fd = f.fileno()
+
+                def download_part(start: int):
+                    end = min(start + self.part_size, size)
+                    data = fs.cat_file(remote_path, start=start, end=end)
+                    if len(data) != end - start:
+                        raise ValueError(
+                            f"Expected {end - start} bytes of {remote_path} from {start}, got {len(data)}"
+                        )
+                    os.pwrite(fd, data, start)
+
+                list(self._pool.map(download_part, range(0, size, self.part_size)))
+            self._check(partial, info)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        os.replace(partial, staged)
+        logger.info("Staged %s bytes of %s at %s", size, remote_path, staged)
+
+    @staticmethod
+    def _check(partial: Path, info: dict):
+        """Check a downloaded file against the size of the remote file, and against its MD5 if its ETag is one.
+        Multipart ETags aren't MD5s of the whole file, so only the size is checked for those.
+        """
+        if partial.stat().st_size != info["size"]:
+            raise ValueError(f"Downloaded size of {partial} does not match")
+        etag = str(info.get("ETag") or info.get("etag") or "").strip('"')
+        if len(etag) == 32 and "-" not in etag:
+            with open(partial, "rb") as f:
+                md5 = hashlib.file_digest(f, "md5").hexdigest()
+            if md5 != etag:
+                raise ValueError(f"Checksum of {partial} does not match its ETag")
+
+    def _evict(self, keep: Path):
+        """Delete the least recently used staged files, along with their lock files, until the cache fits in
+        max_bytes. Files that are locked by a reader are skipped."""
+        staged_files = []
+        for f in self.directory.glob("*.data"):
+            try:
+                stat = f.stat()
+            except FileNotFoundError:
+                # Evicted by another process since the directory was listed
+                continue
+            staged_files.append((stat.st_mtime, stat.st_size, f))
+        staged_files.sort()
+        total = sum(size for _, size, _ in staged_files)
+        for _, size, f in staged_files:
+            if total <= self.max_bytes:
+                break
+            if f == keep:
+                continue
+            try:
+                with self._lock(f, fcntl.LOCK_EX | fcntl.LOCK_NB):
+                    f.unlink(missing_ok=True)
+                    f.with_suffix(".lock").unlink(missing_ok=True)
+            except BlockingIOError:
+                # Being read
+                continue
+            total -= size
+
+    @contextmanager
+    def _lock(self, staged: Path, operation: int) -> Generator[None, None, None]:
+        """Lock a staged file across processes, exclusively to download or evict it, or shared to read it. If the lock
+        file is deleted by an eviction while waiting for the lock, the lock is taken again on the new lock file.
+
+        Raises:
+            BlockingIOError: If operation includes LOCK_NB and the file is already locked.
+        """
+        lock_path = staged.with_suffix(".lock")
+        while True:
+            lock_file = open(lock_path, "a")
+            try:
+                fcntl.flock(lock_file, operation)
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                lock_file.close()
+                raise
+            lock_file.close()
+        # Closing the lock file releases the lock
+        with lock_file:
+            yield
+
+    @staticmethod
+    def _key(file_path: str, info: dict) -> str:
+        """Key a staged file by its path and version, so a file that changes remotely is downloaded again."""
+        version = next(
+            (str(info[key]) for key in CHECKSUM_KEYS if info.get(key)),
+            str(info.get("LastModified") or info.get("mtime") or info.get("created")),
+        )
+        parts = [file_path, version, str(info["size"])]
+        return hashlib.sha256("\0".join(parts).encode("utf8")).hexdigest()
+
+
+_staging_cache: StagingCache | None = None
+
+
+def get_staging_cache() -> StagingCache:
+    """Get the staging cache for the current process, creating it on first use. Every process of a worker uses the
+    same directory, so they share staged files.
+
+    Returns:
+        StagingCache: Staging cache in settings.staging_dir
+    """
+    global _staging_cache
+    if _staging_cache is None:
+        _staging_cache = StagingCache()
+    return _staging_cache
@@ -1,13 +1,24 @@
+import asyncio
+
 from faststream.rabbit.fastapi import RabbitRouter
 from faststream.rabbit import ExchangeType, RabbitExchange, RabbitQueue
 
-from . import tasks, schema
+from . import schema
+from .celery import PREPARE_FILE, app as celery_app
+from .publisher import TaskPublisher
+from .routing import TaskRouter
 from .settings import settings
 
-router = RabbitRouter(settings.broker_url.unicode_string())
+# Prefetch is limited so that a burst of messages is spread over the API's instances rather than taken by one
+router = RabbitRouter(
+    settings.broker_url.unicode_string(), max_consumers=settings.subscriber_prefetch
+)
 exch = RabbitExchange("exchange", auto_delete=True, type=ExchangeType.TOPIC)
 queue_1 = RabbitQueue("file-prep", auto_delete=True, routing_key="adc.data_collected")
 
+# Publishes tasks over the router's connection, so it can only publish once the router has started
+task_publisher = TaskPublisher(router.broker, celery_app)
+
 
 @router.subscriber(
     queue_1,
@@ -16,4 +27,8 @@ queue_1 = RabbitQueue("file-prep", auto_delete=True, routing_key="adc.data_colle
     description="Running file preparation Celery task",
 )
 async def prepare_file(data: schema.PrepareFile):
-    tasks.prepare_file.delay(**data.model_dump())
+    # Getting the size of the file is blocking I/O, so it is kept off the event loop
+    queue = await asyncio.to_thread(
+        TaskRouter().queue, data.feed_identifier, str(data.file_location)
+    )
+    await task_publisher.publish(PREPARE_FILE, data.model_dump(), queue)
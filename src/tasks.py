@@ -1,13 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import logging
+import os
 
-from .celery import app
+import fsspec
+from celery import Task
+from celery.exceptions import Reject
 
+from .celery import MERGE_PARTS, PREPARE_FILE, PREPARE_FILES, PREPARE_PART, app
+
+from .batches import BatchStatusStore
 from .factories import preparer_factory
-from .data_catalogue import data_catalogue_client
+from .catalogue_submitter import get_catalogue_submitter
+from .checkpoints import Checkpoint
+from .deliveries import DeliveryCounter
+from .executors import ProcessPoolSectionExecutor, run_script
+from .file_parts import (
+    FilePart,
+    PartResultStore,
+    merged_dataframes,
+    open_part,
+    part_path,
+    plan_parts,
+)
+from .output_formats import ParquetOutputFormat
+from .preparer import FilePreparer
+from .result_cache import ResultCache
+from .routing import TaskRouter
+from .settings import settings
+
+
+logger = logging.getLogger(__name__)
 
 
-@app.task
+@app.task(name=PREPARE_FILE, bind=True, acks_late=True, reject_on_worker_lost=True)
 def prepare_file(
+    self,
     feed_identifier: str,
     feed_version: int,
     file_location: str,
@@ -16,9 +44,19 @@ def prepare_file(
     end_date: datetime.date,
     source_creation_timestamp: datetime.datetime,
     concat: bool = True,
-):
+    streaming: bool = True,
+    parallel: bool = False,
+    output_format: str | None = None,
+    force: bool = False,
+    distributed: bool = False,
+    resumable: bool = False,
+) -> dict:
     """Prepare a file for ingestion into the desire platform.
 
+    The task is only acknowledged once it has finished, and is requeued if its worker process dies, e.g. when it runs
+    out of memory, so a file whose worker is lost is prepared again rather than dropped. A task that has been
+    delivered more than settings.task_max_deliveries times is rejected without being requeued.
+
     Args:
         feed_identifier (str): What type of file this is. E.g. retaillink_daily_sales
         feed_version (int): What version of the preparation script is required to process the file
@@ -28,7 +66,27 @@ def prepare_file(
         end_date (datetime.date): End date of the data in the file
         source_creation_timestamp (datetime.datetime): When was the file created
         concat (bool, optional): Should the resulting dataframes be concatenated into one. Defaults to True.
+        streaming (bool, optional): Should each dataframe be written to file as soon as it is produced, rather than
+            holding every dataframe in memory before writing. Defaults to True.
+        parallel (bool, optional): Should the sections of the file be prepared in this worker's process pool.
+            Defaults to False.
+        output_format (str | None, optional): Format to write the prepared file in, e.g. csv, parquet or arrow.
+            Defaults to the format registered for the feed.
+        force (bool, optional): Should the file be prepared even if it has already been prepared the same way, rather
+            than returning the existing output files. The outputs of forced tasks aren't cached. Defaults to False.
+        distributed (bool, optional): Should the file be split into parts that are prepared by separate prepare_part
+            tasks, then merged by a merge_parts task, rather than prepared by this task. Files that can't be split
+            into more than one part are still prepared by this task, as are all files while memcached, which counts
+            the finished parts, can't be reached. Defaults to False.
+        resumable (bool, optional): Should each section's output be recorded in a checkpoint as it is written, so
+            that a requeued task whose worker died part way through the file only prepares the unfinished sections.
+            Defaults to False.
+
+    Returns:
+        dict: Output file paths, whether they were taken from the result cache, and the measurements of each stage.
+            The number of parts instead, if the file has been split.
     """
+    reject_if_redelivered_too_often(self)
     file_preparer = preparer_factory.create(
         feed_identifier,
         feed_version,
@@ -36,7 +94,485 @@ def prepare_file(
         start_date,
         end_date,
         source_creation_timestamp,
+        ProcessPoolSectionExecutor() if parallel else None,
+        output_format,
     )
-    dataframes = file_preparer.run_script(file_location)
-    file_preparer.write_outputs_to_file(dataframes, concat)
-    file_preparer.catalogue_outputs(data_catalogue_client())
+    result_cache = ResultCache()
+    cache_key = None
+    # Forced tasks neither read nor update the result cache, so they don't pay for fingerprinting the file, unless
+    # the key is needed to name the file's checkpoint
+    if not force or resumable:
+        cache_key = result_cache.key(
+            file_location,
+            feed_identifier,
+            feed_version,
+            type(file_preparer.script),
+            file_preparer.output_format.name,
+            concat,
+            file_preparer.file_handler,
+        )
+    if not force:
+        output_file_paths = result_cache.get(cache_key)
+        if output_file_paths is not None:
+            return {
+                "output_file_paths": output_file_paths,
+                "cached": True,
+                "metrics": file_preparer.instrumentation.summary(),
+            }
+
+    if distributed:
+        job = {
+            "feed_identifier": feed_identifier,
+            "feed_version": feed_version,
+            "file_location": file_location,
+            "data_supplier": data_supplier,
+            "start_date": start_date,
+            "end_date": end_date,
+            "source_creation_timestamp": source_creation_timestamp,
+            "group_id": self.request.id,
+            "concat": concat,
+            "output_format": output_format,
+            "cache_key": cache_key,
+        }
+        parts = split_file(file_preparer, job)
+        if parts:
+            return {"group_id": self.request.id, "parts": parts}
+
+    checkpoint = Checkpoint(cache_key, data_supplier) if resumable else None
+    write_outputs(file_preparer, file_location, concat, streaming, checkpoint)
+    result = catalogue_outputs(file_preparer, result_cache, cache_key)
+    if checkpoint is not None:
+        checkpoint.clear()
+    return result
+
+
+@app.task(name=PREPARE_PART, bind=True, max_retries=settings.part_max_retries)
+def prepare_part(
+    self,
+    feed_identifier: str,
+    feed_version: int,
+    file_location: str,
+    data_supplier: str,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    source_creation_timestamp: datetime.datetime,
+    group_id: str,
+    part: dict,
+    parts: int,
+    encoding: str | None,
+    merge_queue: str,
+    concat: bool = True,
+    output_format: str | None = None,
+    cache_key: str | None = None,
+) -> dict:
+    """Prepare a part of a file that prepare_file has split, writing its dataframe to a parquet file under the
+    output directory. The task preparing the last part to finish publishes the merge_parts task.
+
+    A part that fails is retried up to settings.part_max_retries times. After that it is recorded as finished with
+    the error under "failed", so the last part still publishes merge_parts, which cleans up instead of merging.
+
+    Args:
+        feed_identifier (str): What type of file this is. E.g. retaillink_daily_sales
+        feed_version (int): What version of the preparation script is required to process the file
+        file_location (str): Where is the file located
+        data_supplier (str): Who supplied the file
+        start_date (datetime.date): Start date of the data in the file
+        end_date (datetime.date): End date of the data in the file
+        source_creation_timestamp (datetime.datetime): When was the file created
+        group_id (str): ID of the prepare_file task that split the file
+        part (dict): Fields of the FilePart to prepare
+        parts (int): Number of parts the file was split into
+        encoding (str | None): Encoding of the file, found when it was split
+        merge_queue (str): Queue to publish the merge_parts task to
+        concat (bool, optional): Should the dataframes of every part be concatenated into one. Defaults to True.
+        output_format (str | None, optional): Format to write the prepared file in. Defaults to the format
+            registered for the feed.
+        cache_key (str | None, optional): Key to cache the output file paths under once the parts are merged
+
+    Returns:
+        dict: Index, section and number of rows of the part, and where its dataframe was written, or the error under
+            "failed" if the part couldn't be prepared
+    """
+    part = FilePart(**part)
+    path = part_path(data_supplier, group_id, part.index)
+    try:
+        file_preparer = preparer_factory.create(
+            feed_identifier,
+            feed_version,
+            data_supplier,
+            start_date,
+            end_date,
+            source_creation_timestamp,
+        )
+        with file_preparer.instrumentation.stage("run_script") as stats:
+            with open_part(
+                file_preparer.file_handler,
+                file_location,
+                part,
+                encoding,
+                (data_supplier, feed_identifier),
+            ) as f:
+                df = run_script(file_preparer.script, f)
+            stats.rows_out += len(df)
+        with file_preparer.instrumentation.stage("write_outputs") as stats:
+            stats.rows_in += len(df)
+            with file_preparer.output_sink.open(path) as f:
+                ParquetOutputFormat().write(df, f)
+        file_preparer.instrumentation.publish()
+        result = {"index": part.index, "section": part.section, "rows": len(df)}
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2**self.request.retries)
+        logger.exception("Failed to prepare part %d of %s", part.index, file_location)
+        result = {"index": part.index, "section": part.section, "failed": repr(e)}
+    result["path"] = path
+
+    # Nothing has been counted if recording the result fails, so the whole part can be retried
+    try:
+        results = PartResultStore().add(group_id, result, parts)
+    except RuntimeError as e:
+        raise self.retry(exc=e, countdown=2**self.request.retries)
+    if results is not None:
+        app.send_task(
+            MERGE_PARTS,
+            kwargs={
+                "feed_identifier": feed_identifier,
+                "feed_version": feed_version,
+                "data_supplier": data_supplier,
+                "start_date": start_date,
+                "end_date": end_date,
+                "source_creation_timestamp": source_creation_timestamp,
+                "group_id": group_id,
+                "results": results,
+                "concat": concat,
+                "output_format": output_format,
+                "cache_key": cache_key,
+            },
+            queue=merge_queue,
+        )
+    return result
+
+
+@app.task(name=MERGE_PARTS)
+def merge_parts(
+    feed_identifier: str,
+    feed_version: int,
+    data_supplier: str,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    source_creation_timestamp: datetime.datetime,
+    group_id: str,
+    results: list[dict],
+    concat: bool = True,
+    output_format: str | None = None,
+    cache_key: str | None = None,
+) -> dict:
+    """Merge the prepared parts of a file into the output files a single prepare_file task would have written, with
+    row numbers continuing across the parts of each section, then catalogue them together and delete the parts. If
+    any part failed, nothing is written or catalogued, the parts are deleted and the task fails with their errors.
+
+    Args:
+        feed_identifier (str): What type of file this is. E.g. retaillink_daily_sales
+        feed_version (int): What version of the preparation script is required to process the file
+        data_supplier (str): Who supplied the file
+        start_date (datetime.date): Start date of the data in the file
+        end_date (datetime.date): End date of the data in the file
+        source_creation_timestamp (datetime.datetime): When was the file created
+        group_id (str): ID of the prepare_file task that split the file
+        results (list[dict]): Result of each prepare_part task, in order
+        concat (bool, optional): Should the dataframes of every part be concatenated into one. Defaults to True.
+        output_format (str | None, optional): Format to write the prepared file in. Defaults to the format
+            registered for the feed.
+        cache_key (str | None, optional): Key to cache the output file paths under
+
+    Raises:
+        RuntimeError: If any part couldn't be prepared.
+
+    Returns:
+        dict: Output file paths, whether they were taken from the result cache, and the measurements of each stage
+    """
+    try:
+        failed = {
+            result["index"]: result["failed"]
+            for result in results
+            if "failed" in result
+        }
+        if failed:
+            raise RuntimeError(f"{len(failed)} parts of {group_id} failed: {failed}")
+        file_preparer = preparer_factory.create(
+            feed_identifier,
+            feed_version,
+            data_supplier,
+            start_date,
+            end_date,
+            source_creation_timestamp,
+            output_format=output_format,
+        )
+        file_preparer.stream_outputs_to_file(
+            merged_dataframes(file_preparer.script, results, concat), concat
+        )
+        return catalogue_outputs(file_preparer, ResultCache(), cache_key)
+    finally:
+        fs, path = fsspec.core.url_to_fs(os.path.dirname(results[0]["path"]))
+        if fs.exists(path):
+            fs.rm(path, recursive=True)
+        PartResultStore().delete(group_id, len(results))
+
+
+@app.task(name=PREPARE_FILES, bind=True, acks_late=True, reject_on_worker_lost=True)
+def prepare_files(
+    self,
+    feed_identifier: str,
+    feed_version: int,
+    data_supplier: str,
+    files: list[dict],
+    concat: bool = True,
+    streaming: bool = True,
+    parallel: bool = False,
+    output_format: str | None = None,
+    force: bool = False,
+    resumable: bool = False,
+) -> dict:
+    """Prepare a batch of files of the same feed. Up to settings.batch_concurrency files are prepared at once,
+    sharing the worker's process pool, staging cache and result cache, so that downloads and uploads of different
+    files overlap. The outputs of every file are catalogued together once all files have been prepared, and the
+    status of each file is kept in a BatchStatusStore under the task's ID.
+
+    A file that can't be prepared is marked as failed without failing the rest of the batch. As with prepare_file,
+    the task is only acknowledged once it has finished, is requeued if its worker process dies, and is rejected once
+    it has been delivered more than settings.task_max_deliveries times.
+
+    Args:
+        feed_identifier (str): What type of files these are. E.g. retaillink_daily_sales
+        feed_version (int): What version of the preparation script is required to process the files
+        data_supplier (str): Who supplied the files
+        files (list[dict]): Each file's file_location, start_date, end_date and source_creation_timestamp
+        concat (bool, optional): Should the resulting dataframes of each file be concatenated into one. Defaults to
+            True.
+        streaming (bool, optional): Should each dataframe be written to file as soon as it is produced. Defaults to
+            True.
+        parallel (bool, optional): Should the sections of each file be prepared in this worker's process pool.
+            Defaults to False.
+        output_format (str | None, optional): Format to write the prepared files in. Defaults to the format
+            registered for the feed.
+        force (bool, optional): Should files be prepared even if they have already been prepared the same way.
+            The outputs of forced files aren't cached. Defaults to False.
+        resumable (bool, optional): Should the sections of each file be checkpointed, so that a requeued batch whose
+            worker died only prepares the sections that weren't finished. Defaults to False.
+
+    Returns:
+        dict: ID of the batch, and the status of each file by file location
+    """
+    reject_if_redelivered_too_often(self)
+    group_id = self.request.id
+    executor = ProcessPoolSectionExecutor() if parallel else None
+    result_cache = ResultCache()
+    statuses = BatchStatusStore()
+    statuses.start(group_id, [file["file_location"] for file in files])
+
+    def prepare(index: int, file: dict) -> tuple[FilePreparer, str, dict]:
+        file_location = file["file_location"]
+        file_preparer = preparer_factory.create(
+            feed_identifier,
+            feed_version,
+            data_supplier,
+            file["start_date"],
+            file["end_date"],
+            file["source_creation_timestamp"],
+            executor,
+            output_format,
+        )
+        try:
+            cache_key = None
+            if not force or resumable:
+                cache_key = result_cache.key(
+                    file_location,
+                    feed_identifier,
+                    feed_version,
+                    type(file_preparer.script),
+                    file_preparer.output_format.name,
+                    concat,
+                    file_preparer.file_handler,
+                )
+            output_file_paths = None if force else result_cache.get(cache_key)
+            if output_file_paths is not None:
+                status = {"status": "cached", "output_file_paths": output_file_paths}
+            else:
+                checkpoint = Checkpoint(cache_key, data_supplier) if resumable else None
+                write_outputs(
+                    file_preparer, file_location, concat, streaming, checkpoint
+                )
+                status = {
+                    "status": "written",
+                    "output_file_paths": file_preparer.output_file_paths,
+                }
+        except Exception as e:
+            logger.exception("Failed to prepare %s", file_location)
+            cache_key, status = None, {"status": "failed", "error": repr(e)}
+        statuses.update(group_id, index, status)
+        return file_preparer, cache_key, status
+
+    with ThreadPoolExecutor(settings.batch_concurrency) as pool:
+        results = list(pool.map(prepare, range(len(files)), files))
+
+    written = [result for result in results if result[2]["status"] == "written"]
+    file_records = [
+        record
+        for file_preparer, _, _ in written
+        for record in file_preparer.file_records()
+    ]
+    try:
+        get_catalogue_submitter().submit(file_records)
+    except Exception as e:
+        for index, (_, _, status) in enumerate(results):
+            if status["status"] == "written":
+                status.update(status="failed", error=f"Cataloguing failed: {e!r}")
+                statuses.update(group_id, index, status)
+        raise
+
+    for index, (file_preparer, cache_key, status) in enumerate(results):
+        if status["status"] == "written":
+            if cache_key is not None:
+                result_cache.set(cache_key, file_preparer.output_file_paths)
+            if resumable:
+                Checkpoint(cache_key, data_supplier).clear()
+            status["status"] = "prepared"
+            statuses.update(group_id, index, status)
+            file_preparer.instrumentation.publish()
+    return {
+        "group_id": group_id,
+        "files": {
+            file["file_location"]: status
+            for file, (_, _, status) in zip(files, results)
+        },
+    }
+
+
+def reject_if_redelivered_too_often(task: Task):
+    """Count the delivery of a task that is requeued when its worker dies, and reject it without requeueing it once it
+    has been delivered more than settings.task_max_deliveries times, so that a task that always kills its worker
+    isn't redelivered forever.
+
+    Args:
+        task (Task): The running task
+
+    Raises:
+        Reject: If the task has been delivered too many times.
+    """
+    redelivered = bool((task.request.delivery_info or {}).get("redelivered"))
+    deliveries = DeliveryCounter().count(task.request.id, redelivered)
+    if deliveries > settings.task_max_deliveries:
+        logger.error(
+            "Rejecting %s task %s, which has been delivered %d times",
+            task.name,
+            task.request.id,
+            deliveries,
+        )
+        raise Reject(f"Delivered {deliveries} times", requeue=False)
+
+
+def split_file(file_preparer: FilePreparer, job: dict) -> int:
+    """Split a file into parts and publish a prepare_part task for each. Parts are routed by an even share of the
+    cost of the file, and the merge by the cost of the whole file.
+
+    Args:
+        file_preparer (FilePreparer): Preparer for the file
+        job (dict): Arguments shared by the prepare_part tasks, including the file_location and group_id
+
+    Returns:
+        int: Number of parts, or 0 if the file can't be split into more than one part
+    """
+    file_location = job["file_location"]
+    with file_preparer.stage(file_location) as staged_path:
+        plan = plan_parts(
+            type(file_preparer.script),
+            file_preparer.file_handler,
+            staged_path,
+            encoding_key=(job["data_supplier"], job["feed_identifier"]),
+        )
+    if plan is None or len(plan[0]) < 2:
+        return 0
+
+    store = PartResultStore()
+    if not store.available():
+        logger.warning(
+            "Preparing %s in one task, as finished parts can't be counted",
+            file_location,
+        )
+        return 0
+    parts, encoding = plan
+    router = TaskRouter()
+    cost = router.cost(job["feed_identifier"], file_location)
+    store.start(job["group_id"])
+    for part in parts:
+        app.send_task(
+            PREPARE_PART,
+            kwargs={
+                **job,
+                "part": part._asdict(),
+                "parts": len(parts),
+                "encoding": encoding,
+                "merge_queue": router.queue_for(cost),
+            },
+            queue=router.queue_for(cost / len(parts)),
+        )
+    logger.info("Split %s into %d parts", file_location, len(parts))
+    return len(parts)
+
+
+def catalogue_outputs(
+    file_preparer: FilePreparer, result_cache: ResultCache, cache_key: str | None
+) -> dict:
+    """Catalogue the outputs a preparer has written and cache their paths.
+
+    Args:
+        file_preparer (FilePreparer): Preparer that has written its outputs
+        result_cache (ResultCache): Cache of output file paths
+        cache_key (str | None): Key to cache the output file paths under, if any
+
+    Returns:
+        dict: Output file paths, whether they were taken from the result cache, and the measurements of each stage
+    """
+    file_records = file_preparer.file_records()
+    with file_preparer.instrumentation.stage("catalogue") as stats:
+        stats.rows_in += len(file_records)
+        get_catalogue_submitter().submit(file_records)
+    if cache_key is not None:
+        result_cache.set(cache_key, file_preparer.output_file_paths)
+    file_preparer.instrumentation.publish()
+    return {
+        "output_file_paths": file_preparer.output_file_paths,
+        "cached": False,
+        "metrics": file_preparer.instrumentation.summary(),
+    }
+
+
+def write_outputs(
+    file_preparer: FilePreparer,
+    file_location: str,
+    concat: bool,
+    streaming: bool,
+    checkpoint: Checkpoint | None = None,
+):
+    """Run the preparer's script on a file and write its outputs.
+
+    Args:
+        file_preparer (FilePreparer): Preparer for the file
+        file_location (str): Location of the file
+        concat (bool): Should the resulting dataframes be concatenated into one
+        streaming (bool): Should each dataframe be written to file as soon as it is produced
+        checkpoint (Checkpoint | None, optional): Checkpoint to resume from and record each section in. Sections are
+            always streamed when checkpointed. Defaults to None.
+    """
+    if checkpoint is not None:
+        done = checkpoint.load()
+        if done:
+            logger.info("Resuming %s after %d sections", file_location, done)
+        file_preparer.checkpoint_outputs_to_file(file_location, checkpoint, concat)
+    elif streaming:
+        file_preparer.stream_outputs_to_file(
+            file_preparer.iter_script(file_location), concat
+        )
+    else:
+        dataframes = file_preparer.run_script(file_location)
+        file_preparer.write_outputs_to_file(dataframes, concat)
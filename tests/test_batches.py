@@ -0,0 +1,61 @@
+import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from src import tasks
+from src.batches import BatchStatusStore
+from src.cache import MemoryCache
+
+
+def test_batch_status_store():
+    store = BatchStatusStore(MemoryCache())
+    store.start("group", ["file://a.csv", "file://b.csv"])
+    store.update("group", 0, {"status": "prepared"})
+    assert store.get("group") == {
+        "file://a.csv": {"status": "prepared"},
+        "file://b.csv": {"status": "pending"},
+    }
+    assert store.get("unknown") is None
+
+
+@pytest.fixture
+def catalogue_submitter(monkeypatch):
+    monkeypatch.setattr("src.cache._cache", MemoryCache())
+    submitter = MagicMock()
+    monkeypatch.setattr(tasks, "get_catalogue_submitter", lambda: submitter)
+    return submitter
+
+
+def test_prepare_files(get_file, catalogue_submitter, tmp_path):
+    day = datetime.date(2023, 1, 1)
+    files = [
+        {
+            "file_location": f"file://{file_path}",
+            "start_date": day,
+            "end_date": day,
+            "source_creation_timestamp": datetime.datetime(2023, 1, 2),
+        }
+        for file_path in [
+            get_file("retaillink_daily_sales.txt"),
+            tmp_path / "missing.txt",
+        ]
+    ]
+    result = tasks.prepare_files.apply(
+        kwargs={
+            "feed_identifier": "retaillink_daily_sales",
+            "feed_version": 1,
+            "data_supplier": "test_supplier",
+            "files": files,
+        },
+        task_id="group",
+    ).get()
+
+    prepared, missing = (result["files"][file["file_location"]] for file in files)
+    assert prepared["status"] == "prepared"
+    assert len(prepared["output_file_paths"]) == 1
+    assert missing["status"] == "failed"
+    catalogue_submitter.submit.assert_called_once()
+    (file_records,) = catalogue_submitter.submit.call_args.args
+    assert [r.file_location for r in file_records] == prepared["output_file_paths"]
+    assert BatchStatusStore().get("group") == result["files"]
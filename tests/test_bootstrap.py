@@ -0,0 +1,35 @@
+import gc
+from unittest.mock import MagicMock, patch
+
+from src import bootstrap
+
+
+def test_preload_parent_freezes_heap():
+    with patch("src.factories.preparer_factory.preload") as mock_preload:
+        try:
+            bootstrap.preload_parent()
+            assert gc.get_freeze_count() > 0
+            assert gc.isenabled()
+        finally:
+            gc.unfreeze()
+    mock_preload.assert_called_once()
+
+
+def test_init_child_sets_up_process_resources():
+    with patch("src.cache.get_cache") as mock_get_cache, patch(
+        "src.staging.get_staging_cache"
+    ) as mock_get_staging_cache, patch(
+        "src.catalogue_submitter.get_catalogue_submitter"
+    ) as mock_get_submitter:
+        bootstrap.init_child()
+    mock_get_cache.assert_called_once()
+    mock_get_staging_cache.assert_called_once()
+    mock_get_submitter.assert_called_once()
+
+
+def test_init_child_survives_catalogue_errors():
+    with patch("src.cache.get_cache"), patch("src.staging.get_staging_cache"), patch(
+        "src.catalogue_submitter.get_catalogue_submitter",
+        MagicMock(side_effect=RuntimeError("no credentials")),
+    ):
+        bootstrap.init_child()
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+from unittest.mock import patch
+import socketserver
+import time
+
+from src.cache import MemoryCache, MemcachedCache
+
+
+def test_memory_cache_expires_entries():
+    cache = MemoryCache()
+    with patch("src.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1, timeout=10)
+        cache.set("b", 2)
+    with patch("src.cache.time.monotonic", return_value=110.0):
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_memcached_cache_falls_back_to_memory():
+    cache = MemcachedCache("127.0.0.1:1", timeout=0.1)
+    cache.set("a", ["x"], timeout=10)
+    assert cache.get("a") == ["x"]
+    cache.delete("a")
+    assert cache.get("a") is None
+
+
+def test_memcached_cache_falls_back_to_memory_for_many_keys():
+    cache = MemcachedCache("127.0.0.1:1", timeout=0.1)
+    cache.set_many({"a": 1, "b": 2}, timeout=10)
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+
+
+def test_memcached_cache_gives_concurrent_threads_their_own_connections():
+    connections = []
+
+    class VersionHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            connections.append(self.request)
+            while self.rfile.readline():
+                time.sleep(0.1)
+                self.wfile.write(b"VERSION 1.6.0\r\n")
+
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), VersionHandler) as server:
+        server.daemon_threads = True
+        Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        cache = MemcachedCache(f"{host}:{port}", timeout=1)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            assert list(pool.map(lambda _: cache.available(), range(2))) == [True] * 2
+        server.shutdown()
+    assert len(connections) == 2
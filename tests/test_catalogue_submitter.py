@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+from m2m_base_client.clients import DataCatalogueClient
+from m2m_base_client.models import CatalogueFileRecord
+
+from src.catalogue_submitter import CatalogueSubmitter
+
+
+def record(i: int) -> CatalogueFileRecord:
+    return CatalogueFileRecord(
+        feed_identifier="test_identifier",
+        feed_version=0,
+        file_location=f"file://output/test_identifier.{i}.csv",
+        organisation="atheon",
+        file_meta={"file_format": "csv"},
+    )
+
+
+def posted_records(client) -> list[CatalogueFileRecord]:
+    return [
+        r for call in client.post.call_args_list for r in call.kwargs["file_records"][0]
+    ]
+
+
+def test_submit_batches_records_submitted_while_posting_in_ack_mode(
+    mock_catalogue_client,
+):
+    posting, release = Event(), Event()
+
+    async def post(*args, **kwargs):
+        if mock_catalogue_client.post.call_count == 1:
+            posting.set()
+            await asyncio.to_thread(release.wait)
+
+    mock_catalogue_client.post.side_effect = post
+    submitter = CatalogueSubmitter(
+        lambda: mock_catalogue_client, batch_size=100, flush_interval=60, delivery="ack"
+    )
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        first = pool.submit(submitter.submit, [record(0)])
+        posting.wait()
+        later = [pool.submit(submitter.submit, [record(i)]) for i in (1, 2)]
+        while len(submitter._pending) < 2:
+            time.sleep(0.001)
+        release.set()
+        for future in [first, *later]:
+            future.result(timeout=5)
+    submitter.close()
+
+    batches = [
+        sorted(r.file_location for r in call.kwargs["file_records"][0])
+        for call in mock_catalogue_client.post.call_args_list
+    ]
+    assert batches == [
+        [record(0).file_location],
+        [record(1).file_location, record(2).file_location],
+    ]
+
+
+def test_submit_batches_records_across_tasks_in_spool_mode(
+    mock_catalogue_client, tmp_path
+):
+    submitter = CatalogueSubmitter(
+        lambda: mock_catalogue_client, 4, 5, "spool", str(tmp_path)
+    )
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        list(
+            pool.map(submitter.submit, [[record(0), record(1)], [record(2), record(3)]])
+        )
+    submitter.close()
+
+    mock_catalogue_client.post.assert_called_once()
+    assert sorted(r.file_location for r in posted_records(mock_catalogue_client)) == [
+        record(i).file_location for i in range(4)
+    ]
+
+
+def test_submit_flushes_after_interval_in_spool_mode(mock_catalogue_client, tmp_path):
+    submitter = CatalogueSubmitter(
+        lambda: mock_catalogue_client, 100, 0.01, "spool", str(tmp_path)
+    )
+    submitter.submit([record(0)])
+    time.sleep(0.1)
+    mock_catalogue_client.post.assert_called_once_with(
+        "catalogue/", file_records=[[record(0)]], flush=False
+    )
+    submitter.close()
+
+
+def test_submit_raises_when_post_fails_in_ack_mode(mock_catalogue_client):
+    mock_catalogue_client.post.side_effect = RuntimeError("catalogue is down")
+    submitter = CatalogueSubmitter(
+        lambda: mock_catalogue_client, batch_size=1, delivery="ack"
+    )
+    with pytest.raises(RuntimeError):
+        submitter.submit([record(0)])
+    submitter.close()
+
+
+def test_spooled_records_are_posted_by_the_next_submitter(tmp_path):
+    failing_client = AsyncMock(spec=DataCatalogueClient)
+    failing_client.post.side_effect = RuntimeError("catalogue is down")
+    submitter = CatalogueSubmitter(
+        lambda: failing_client, 100, 60, "spool", str(tmp_path)
+    )
+    submitter.submit([record(0), record(1)])
+    submitter.close()
+    assert len(list(tmp_path.glob("*.jsonl"))) == 1
+
+    client = AsyncMock(spec=DataCatalogueClient)
+    submitter = CatalogueSubmitter(lambda: client, 100, 60, "spool", str(tmp_path))
+    submitter.submit([record(2)])
+    submitter.close()
+
+    assert posted_records(client) == [record(0), record(1), record(2)]
+    assert list(tmp_path.glob("*.jsonl")) == []
+
+
+class RejectedError(Exception):
+    status_code = 422
+
+
+def test_failed_posts_are_retried_with_backoff_then_dead_lettered(tmp_path):
+    client = AsyncMock(spec=DataCatalogueClient)
+    client.post.side_effect = RuntimeError("catalogue is down")
+    submitter = CatalogueSubmitter(
+        lambda: client, 1, 0.01, "spool", str(tmp_path), max_retries=2
+    )
+    submitter.submit([record(0)])
+    deadline = time.monotonic() + 5
+    while not list(tmp_path.glob("dead-letter/*.jsonl")):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    submitter.close()
+
+    assert client.post.call_count == 3
+    assert list(tmp_path.glob("*.jsonl")) == []
+
+
+def test_rejected_records_are_dead_lettered_without_retrying(tmp_path):
+    client = AsyncMock(spec=DataCatalogueClient)
+    client.post.side_effect = RejectedError("invalid record")
+    submitter = CatalogueSubmitter(lambda: client, 1, 60, "spool", str(tmp_path))
+    submitter.submit([record(0)])
+    submitter.flush()
+    submitter.close()
+
+    client.post.assert_called_once()
+    assert list(tmp_path.glob("*.jsonl")) == []
+    assert len(list(tmp_path.glob("dead-letter/*.jsonl"))) == 1
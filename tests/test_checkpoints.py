@@ -0,0 +1,160 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import datetime
+
+import pytest
+from celery.exceptions import Reject
+
+from src import tasks
+from src.cache import MemoryCache
+from src.checkpoints import Checkpoint
+from src.factories import preparer_factory
+from src.output_sinks import OutputSink
+from src.settings import settings
+
+DAY = datetime.date(2023, 1, 1)
+
+
+def create_preparer(feed_identifier: str):
+    return preparer_factory.create(
+        feed_identifier, 1, "test_supplier", DAY, DAY, datetime.datetime(2023, 1, 2)
+    )
+
+
+def read(paths: list[str]) -> list[bytes]:
+    contents = []
+    for path in paths:
+        with open(path.removeprefix("file://"), "rb") as f:
+            contents.append(f.read())
+    return contents
+
+
+def test_load_adopts_committed_and_discards_unfinished_outputs(
+    tmp_path, tmp_output_dir
+):
+    checkpoint = Checkpoint("prepared:key", "test_supplier")
+    committed, unfinished = (f"{tmp_output_dir}/{name}.csv" for name in "ab")
+    checkpoint.start(0, committed)
+    checkpoint.start(1, unfinished)
+    with OutputSink().open(committed) as f:
+        f.write(b"a\n")
+    (tmp_path / ".b.csv.1234.tmp").write_bytes(b"b")
+
+    resumed = Checkpoint("prepared:key", "test_supplier")
+
+    assert resumed.load() == 1
+    assert resumed.output_paths() == [committed]
+    assert not (tmp_path / ".b.csv.1234.tmp").exists()
+    resumed.clear()
+    assert Checkpoint("prepared:key", "test_supplier").load() == 0
+
+
+@pytest.mark.parametrize("concat", [True, False])
+def test_resume_skips_finished_sections(get_file, concat):
+    file_location = f"file://{get_file('horizon_daily_performance_sales.csv')}"
+    expected = create_preparer("horizon_daily_performance_sales")
+    expected.stream_outputs_to_file(expected.iter_script(file_location), concat)
+
+    failing = create_preparer("horizon_daily_performance_sales")
+    run = failing.script.run
+    runs = []
+
+    def fail_on_third_section(f):
+        runs.append(f)
+        if len(runs) == 3:
+            raise MemoryError
+        return run(f)
+
+    failing.script.run = fail_on_third_section
+    checkpoint = Checkpoint("prepared:horizon", "test_supplier")
+    with pytest.raises(MemoryError):
+        failing.checkpoint_outputs_to_file(file_location, checkpoint, concat)
+
+    resumed = create_preparer("horizon_daily_performance_sales")
+    resumed.script.run = MagicMock(side_effect=resumed.script.run)
+    checkpoint = Checkpoint("prepared:horizon", "test_supplier")
+    assert checkpoint.load() == 2
+    resumed.checkpoint_outputs_to_file(file_location, checkpoint, concat)
+
+    assert resumed.script.run.call_count == 2
+    assert read(resumed.output_file_paths) == read(expected.output_file_paths)
+
+
+@pytest.mark.parametrize(
+    "feed_identifier,file_name",
+    [
+        ("retaillink_daily_sales", "retaillink_daily_sales.txt"),
+        ("horizon_daily_performance_sales", "horizon_daily_performance_sales.csv"),
+        ("waitroseconnect_daily_line_sales", "waitroseconnect_daily_line_sales.csv"),
+    ],
+)
+def test_resumable_prepare_file(
+    get_file, monkeypatch, tmp_path, feed_identifier, file_name
+):
+    monkeypatch.setattr("src.cache._cache", MemoryCache())
+    monkeypatch.setattr(tasks, "get_catalogue_submitter", MagicMock)
+    kwargs = {
+        "feed_identifier": feed_identifier,
+        "feed_version": 1,
+        "file_location": f"file://{get_file(file_name)}",
+        "data_supplier": "test_supplier",
+        "start_date": DAY,
+        "end_date": DAY,
+        "source_creation_timestamp": datetime.datetime(2023, 1, 2),
+        "force": True,
+    }
+
+    single = tasks.prepare_file.apply(kwargs=kwargs).get()
+    resumable = tasks.prepare_file.apply(kwargs={**kwargs, "resumable": True}).get()
+
+    assert read(resumable["output_file_paths"]) == read(single["output_file_paths"])
+    assert not any((tmp_path / "test_supplier" / "checkpoints").iterdir())
+
+
+@pytest.mark.parametrize("task", [tasks.prepare_file, tasks.prepare_files])
+def test_tasks_are_requeued_when_their_worker_dies(task):
+    assert task.acks_late
+    assert task.reject_on_worker_lost
+
+
+def test_redelivered_tasks_are_rejected_after_max_deliveries(monkeypatch):
+    monkeypatch.setattr("src.cache._cache", MemoryCache())
+    request = SimpleNamespace(id="poison", delivery_info={"redelivered": False})
+    task = SimpleNamespace(name=tasks.PREPARE_FILE, request=request)
+    tasks.reject_if_redelivered_too_often(task)
+    request.delivery_info["redelivered"] = True
+    for _ in range(settings.task_max_deliveries - 1):
+        tasks.reject_if_redelivered_too_often(task)
+    with pytest.raises(Reject) as e:
+        tasks.reject_if_redelivered_too_often(task)
+    assert not e.value.requeue
+
+
+@pytest.mark.parametrize("task", [tasks.prepare_file, tasks.prepare_files])
+def test_tasks_delivered_too_often_are_not_run(task, monkeypatch):
+    monkeypatch.setattr(
+        tasks.DeliveryCounter,
+        "count",
+        lambda self, task_id, redelivered: settings.task_max_deliveries + 1,
+    )
+    create = MagicMock()
+    monkeypatch.setattr(tasks.preparer_factory, "create", create)
+    kwargs = {
+        "feed_identifier": "retaillink_daily_sales",
+        "feed_version": 1,
+        "data_supplier": "test_supplier",
+    }
+    if task is tasks.prepare_file:
+        kwargs.update(
+            file_location="memory:///poison.txt",
+            start_date=DAY,
+            end_date=DAY,
+            source_creation_timestamp=datetime.datetime(2023, 1, 2),
+        )
+    else:
+        kwargs["files"] = []
+
+    result = task.apply(kwargs=kwargs)
+
+    assert isinstance(result.result, Reject)
+    create.assert_not_called()
@@ -1,6 +1,25 @@
+from unittest.mock import patch
+
 from m2m_base_client.clients import DataCatalogueClient
+from prometheus_client import REGISTRY
+
+from src.cache import MemoryCache
+from src.data_catalogue import (
+    TokenCache,
+    data_catalogue_client,
+    request_file_catalogue,
+)
+
+EVENTS = ["hits", "misses", "refreshes"]
 
-from src.data_catalogue import data_catalogue_client, request_file_catalogue
+
+def token_cache_events(event: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "catalogue_token_cache_events_total", {"event": event}
+        )
+        or 0
+    )
 
 
 def test_data_catalogue_client():
@@ -20,3 +39,23 @@ def test_request_file_catalogue(mock_catalogue_client):
         file_records=[[]],
         flush=False,
     )
+
+
+def test_data_catalogue_client_is_reused():
+    assert data_catalogue_client() is data_catalogue_client()
+    assert isinstance(data_catalogue_client().cache, TokenCache)
+
+
+def test_token_cache():
+    before = {event: token_cache_events(event) for event in EVENTS}
+    cache = MemoryCache()
+    token_cache = TokenCache(cache, expiry_margin=60)
+    assert token_cache.get("client id") is None
+    with patch("src.cache.time.monotonic", return_value=0.0):
+        token_cache.set("client id", "token", timeout=3600)
+    with patch("src.cache.time.monotonic", return_value=3500.0):
+        assert token_cache.get("client id") == "token"
+    with patch("src.cache.time.monotonic", return_value=3550.0):
+        assert token_cache.get("client id") is None
+    counts = {event: token_cache_events(event) - before[event] for event in EVENTS}
+    assert counts == {"hits": 1, "misses": 2, "refreshes": 1}
@@ -0,0 +1,142 @@
+from io import BytesIO
+from typing import BinaryIO, TextIO
+from unittest.mock import MagicMock, patch
+import datetime
+import zipfile
+
+import pandas as pd
+
+from src import tasks
+from src.cache import MemoryCache
+from src.encoding_detection import EncodingDetector
+from src.executors import SerialExecutor
+from src.file_handlers import BasicFileHandler, ChunkedFileHandler, ZipFileHandler
+from src.scripts.base import BaseScript
+
+CP1252_TEXT = "SKU,DESCRIPTION\n1,Crème fraîche £2\n" * 100
+
+
+def test_resolve_keeps_encoding_that_decodes():
+    detector = EncodingDetector(cache=MemoryCache())
+    sample = detector.sample_buffer(CP1252_TEXT.encode("utf8"))
+    with patch.object(detector, "detect") as detect:
+        assert detector.resolve(sample, "utf8") == "utf8"
+    detect.assert_not_called()
+
+
+def test_resolve_detects_and_remembers_encoding():
+    detector = EncodingDetector(cache=MemoryCache())
+    sample = detector.sample_buffer(CP1252_TEXT.encode("cp1252"))
+    key = ("supplier", "feed")
+    assert detector.resolve(sample, "utf8", key) == "cp1252"
+    with patch.object(detector, "detect") as detect:
+        assert detector.resolve(sample, "utf8", key) == "cp1252"
+    detect.assert_not_called()
+
+
+def test_resolve_prefers_given_encoding_to_remembered_encoding():
+    detector = EncodingDetector(cache=MemoryCache())
+    key = ("supplier", "feed")
+    detector.cache.set(detector._cache_key(key), "cp1252")
+    sample = detector.sample_buffer(CP1252_TEXT.encode("utf8"))
+    assert detector.resolve(sample, "utf8", key) == "utf8"
+
+
+def test_sample_file_reads_both_ends():
+    detector = EncodingDetector(sample_size=4)
+    f = BytesIO(b"0123456789")
+    f.seek(1)
+    assert detector.sample_file(f) == (b"1234", b"6789")
+    assert f.tell() == 1
+
+
+def test_decodes_sample_cut_inside_characters():
+    text = ("£" * 10).encode("utf8")
+    assert EncodingDetector.decodes((text[:5], text[-5:]), "utf8")
+    assert not EncodingDetector.decodes((text[:5], text[-5:]), "ascii")
+
+
+def test_file_handlers_detect_encoding(tmp_path):
+    file_path = tmp_path / "test.csv"
+    file_path.write_text(CP1252_TEXT, encoding="cp1252")
+    with patch(
+        "src.file_handlers.encoding_detector", EncodingDetector(cache=MemoryCache())
+    ):
+        chunks = [f.read() for f in ChunkedFileHandler().open(f"file://{file_path}")]
+    assert "".join(chunks) == CP1252_TEXT
+
+
+# The only non ASCII character is far from both ends of the file, so it is missed by the sample
+LATE_LATIN1_TEXT = (
+    "SKU,DESCRIPTION\n" + "1,cream\n" * 50000 + "2,crème\n" + "3,milk\n" * 50000
+)
+
+
+class ReadScript(BaseScript):
+    def run(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
+        return pd.DataFrame({"text": [file_obj.read()]})
+
+
+class ReadSourceScript(BaseScript):
+    def run(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
+        return self.read_source(file_obj)
+
+
+def test_zip_member_that_fails_to_decode_after_the_sample_is_detected_again(
+    tmp_path,
+):
+    zip_path = tmp_path / "test.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("test.csv", LATE_LATIN1_TEXT.encode("latin1"))
+
+    (df,) = SerialExecutor().map_file(
+        ReadScript(None, None), ZipFileHandler(), f"file://{zip_path}"
+    )
+
+    assert df["text"][0] == LATE_LATIN1_TEXT
+
+
+def test_read_source_of_file_that_fails_to_decode_after_the_sample_is_detected_again(
+    tmp_path,
+):
+    file_path = tmp_path / "test.csv"
+    file_path.write_bytes(LATE_LATIN1_TEXT.encode("latin1"))
+
+    (df,) = SerialExecutor().map_file(
+        ReadSourceScript(None, None), BasicFileHandler(), f"file://{file_path}"
+    )
+
+    assert df["DESCRIPTION"][50000] == "crème"
+
+
+def test_typed_string_column_that_fails_to_decode_after_the_sample_is_detected_again(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr("src.cache._cache", MemoryCache())
+    monkeypatch.setattr(tasks, "get_catalogue_submitter", MagicMock)
+    # PRIMEITEMNBR is typed as a string, so pyarrow raises ArrowInvalid rather than inferring binary
+    row = "0045\t74607\t2090.0\t2023-01-16\t1e3\t45\t20\n"
+    file_path = tmp_path / "retaillink_daily_sales.txt"
+    file_path.write_bytes(
+        (row * 5000 + row.replace("74607", "Crème fraîche") + row * 5000).encode(
+            "latin1"
+        )
+    )
+
+    result = tasks.prepare_file.apply(
+        kwargs={
+            "feed_identifier": "retaillink_daily_sales",
+            "feed_version": 1,
+            "file_location": f"file://{file_path}",
+            "data_supplier": "test_supplier",
+            "start_date": datetime.date(2023, 1, 1),
+            "end_date": datetime.date(2023, 1, 31),
+            "source_creation_timestamp": datetime.datetime(2023, 1, 2),
+            "force": True,
+        }
+    ).get()
+
+    (output_file_path,) = result["output_file_paths"]
+    output = pd.read_csv(output_file_path.removeprefix("file://"), dtype=str)
+    assert len(output) == 10001
+    assert output["PRIMEITEMNBR"][5000] == "Crème fraîche"
@@ -0,0 +1,79 @@
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO, StringIO
+from typing import TextIO, BinaryIO
+import datetime
+import os
+import zipfile
+
+import pytest
+import pandas as pd
+
+from src.scripts.base import BaseScript
+from src import executors
+from src.executors import ProcessPoolSectionExecutor, SerialExecutor
+from src.file_handlers import ZipFileHandler, text_view
+
+
+class PidScript(BaseScript):
+    def run(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
+        df = pd.read_csv(file_obj)
+        df["pid"] = os.getpid()
+        return df
+
+
+@pytest.fixture(scope="module")
+def process_pool():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def sections():
+    yield text_view("a\n1\n".encode("latin1"), "latin1")
+    yield StringIO("a\n2\n")
+    yield BytesIO(b"a\n3\n")
+    for i in range(4, 10):
+        yield text_view(f"a\n{i}\n".encode())
+
+
+def test_serial_executor():
+    script = PidScript(datetime.date(2021, 1, 1), datetime.date(2021, 1, 1))
+    dataframes = list(SerialExecutor().map(script, sections()))
+    assert [df.a[0] for df in dataframes] == list(range(1, 10))
+    assert {df.pid[0] for df in dataframes} == {os.getpid()}
+
+
+def test_process_pool_section_executor_keeps_order(process_pool):
+    script = PidScript(datetime.date(2021, 1, 1), datetime.date(2021, 1, 1))
+    executor = ProcessPoolSectionExecutor(process_pool, max_workers=2)
+    assert executor.max_pending == 4
+    dataframes = list(executor.map(script, sections()))
+    assert [df.a[0] for df in dataframes] == list(range(1, 10))
+    assert os.getpid() not in {df.pid[0] for df in dataframes}
+
+
+def test_process_pool_section_executor_opens_sections_in_workers(
+    process_pool, tmp_path
+):
+    zip_path = tmp_path / "test.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        for i in range(5):
+            zf.writestr(f"{i}.csv", f"a\n{i}\n")
+    script = PidScript(datetime.date(2021, 1, 1), datetime.date(2021, 1, 1))
+    executor = ProcessPoolSectionExecutor(process_pool, max_pending=2)
+    dataframes = list(executor.map_file(script, ZipFileHandler(), f"file://{zip_path}"))
+    assert [df.a[0] for df in dataframes] == list(range(5))
+    assert os.getpid() not in {df.pid[0] for df in dataframes}
+
+
+def test_process_pool_shares_cpus_between_worker_processes(monkeypatch):
+    monkeypatch.setattr(executors.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(executors.settings, "preparer_processes", None)
+    executors.set_worker_concurrency(4)
+    try:
+        assert executors.process_pool_size() == 2
+        pool = executors.get_process_pool()
+        assert pool._mp_context.get_start_method() == "forkserver"
+        assert pool.submit(os.getpid).result() != os.getpid()
+    finally:
+        executors.shutdown_process_pool()
+        executors.set_worker_concurrency(1)
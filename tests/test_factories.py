@@ -2,19 +2,22 @@ from typing import TextIO, BinaryIO
 import datetime
 
 import pandas as pd
+import pytest
 
 from src.factories import PreparerFactory
 from src.scripts.base import BaseScript
 from src.file_handlers import BasicFileHandler
 from src.preparer import FilePreparer
+from src.output_formats import CSVOutputFormat, ParquetOutputFormat
 
 
 def test_register_method():
     factory = PreparerFactory()
     factory._register("test", 1, BaseScript, BasicFileHandler())
-    script, handler = factory._registry.get(("test", 1))
+    script, handler, output_format = factory._registry.get(("test", 1))
     assert script == BaseScript
     assert isinstance(handler, BasicFileHandler)
+    assert isinstance(output_format, CSVOutputFormat)
 
 
 def test_register_decorator():
@@ -25,9 +28,10 @@ def test_register_decorator():
         def run(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
             pass
 
-    script, handler = factory._registry.get(("test", 1))
+    script, handler, output_format = factory._registry.get(("test", 1))
     assert script == TestScript
     assert isinstance(handler, BasicFileHandler)
+    assert isinstance(output_format, CSVOutputFormat)
 
 
 def test_create_method(mock_base_script):
@@ -52,3 +56,53 @@ def test_create_method(mock_base_script):
     assert preparer.source_creation_timestamp == datetime.datetime(2021, 1, 1, 0, 0, 0)
     assert preparer.files_counter == 0
     assert preparer.output_file_paths == []
+
+
+def test_create_method_output_format(mock_base_script):
+    factory = PreparerFactory()
+    factory._register(
+        "test", 1, mock_base_script, BasicFileHandler(), ParquetOutputFormat("zstd")
+    )
+    kwargs = dict(
+        identifier="test",
+        version=1,
+        data_supplier="test",
+        start_date=datetime.date(2021, 1, 1),
+        end_date=datetime.date(2021, 1, 1),
+        source_creation_timestamp=datetime.datetime(2021, 1, 1, 0, 0, 0),
+    )
+    assert factory.create(**kwargs).output_format.compression == "zstd"
+    assert (
+        factory.create(**kwargs, output_format="parquet").output_format.compression
+        == "zstd"
+    )
+    assert isinstance(
+        factory.create(**kwargs, output_format="csv").output_format, CSVOutputFormat
+    )
+
+
+def test_create_imports_manifest_module(mock_base_script, tmp_path, monkeypatch):
+    (tmp_path / "lazy_feed_script.py").write_text(
+        "from src.factories import preparer_factory\n"
+        "from src.file_handlers import BasicFileHandler\n"
+        "from src.scripts.base import BaseScript\n"
+        "preparer_factory.register('lazy_feed', 1, BasicFileHandler())(BaseScript)\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    factory = PreparerFactory({("lazy_feed", 1): "lazy_feed_script"})
+    assert ("lazy_feed", 1) in factory.feeds()
+    assert ("lazy_feed", 1) not in factory._registry
+    script, _, _ = factory.resolve("lazy_feed", 1)
+    assert script is BaseScript
+    monkeypatch.delitem(factory._registry, ("lazy_feed", 1))
+
+
+def test_resolve_unknown_feed():
+    with pytest.raises(KeyError):
+        PreparerFactory({}).resolve("unknown", 1)
+
+
+def test_manifest_modules_register_their_feeds():
+    factory = PreparerFactory()
+    factory.preload()
+    assert set(factory.manifest) <= set(factory._registry)
@@ -0,0 +1,148 @@
+import mmap
+import zipfile
+
+import pytest
+
+from src import file_handlers
+from src.file_handlers import (
+    BasicFileHandler,
+    ChunkedFileHandler,
+    MemoryReader,
+    SeparatedFileHandler,
+    ZipFileHandler,
+    buffer_of,
+    mapped_file,
+    text_view,
+)
+
+
+def test_memory_reader_does_not_copy():
+    buffer = bytearray(b"a,b\n1,2\n")
+    reader = MemoryReader(memoryview(buffer)[4:])
+    assert reader.read(2) == b"1,"
+    buffer[6] = ord("3")
+    assert reader.read() == b"3\n"
+    assert reader.getbuffer().obj is buffer
+
+
+def test_text_view_decodes_incrementally():
+    file_obj = text_view("é,ü\r\n".encode("latin1"), "latin1")
+    assert file_obj.read() == "é,ü\r\n"
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+@pytest.mark.parametrize("chunk_size", [4, 16, 1024])
+def test_chunked_file_handler_yields_complete_records(tmp_path, chunk_size, use_mmap):
+    content = 'a,"multi\nline ""quoted"""\nb,café\nc,€\nd,end'
+    file_path = tmp_path / "test_file.csv"
+    file_path.write_bytes(content.encode("utf8"))
+
+    handler = ChunkedFileHandler(chunk_size, use_mmap=use_mmap)
+    chunks = [f.read() for f in handler.open(str(file_path))]
+
+    assert "".join(chunks) == content
+    for chunk in chunks[:-1]:
+        assert chunk.endswith("\n")
+        assert chunk.count('"') % 2 == 0
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_chunked_file_handler_splits_on_newlines_after_a_stray_quote(
+    tmp_path, use_mmap
+):
+    content = "a\tb\n" + 'tv\t55" screen\n' + "".join(f"{i}\tx\n" for i in range(100))
+    file_path = tmp_path / "test_file.tsv"
+    file_path.write_bytes(content.encode("utf8"))
+
+    handler = ChunkedFileHandler(16, use_mmap=use_mmap, max_record_size=64)
+    chunks = [f.read() for f in handler.open(str(file_path))]
+
+    assert "".join(chunks) == content
+    assert all(chunk.endswith("\n") for chunk in chunks)
+    assert max(len(chunk) for chunk in chunks) <= 80
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_chunked_file_handler_empty_file(tmp_path, use_mmap):
+    file_path = tmp_path / "test_file.csv"
+    file_path.write_bytes(b"")
+    handler = ChunkedFileHandler(use_mmap=use_mmap)
+    assert list(handler.open(str(file_path))) == []
+
+
+def test_chunked_file_handler_rejects_non_ascii_compatible_encoding():
+    with pytest.raises(ValueError):
+        ChunkedFileHandler(encoding="utf16")
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+@pytest.mark.parametrize("block_size", [1, 10, 1024])
+def test_separated_file_handler_yields_each_section(tmp_path, block_size, use_mmap):
+    separator = "#CHUNK#\n"
+    content = f"{separator}a,b\n1,£\n{separator}\n{separator}c,d\n3,4\n"
+    file_path = tmp_path / "test_file.csv"
+    file_path.write_bytes(content.encode("latin1"))
+
+    handler = SeparatedFileHandler(separator, "latin1", block_size, use_mmap)
+    sections = [f.read() for f in handler.open(str(file_path))]
+
+    assert sections == ["a,b\n1,£", "c,d\n3,4"]
+
+
+def test_separated_file_handler_without_separator(tmp_path):
+    file_path = tmp_path / "test_file.csv"
+    file_path.write_bytes(b"a,b\n1,2\n")
+    sections = [f.read() for f in SeparatedFileHandler().open(str(file_path))]
+    assert sections == ["a,b\n1,2"]
+
+
+def test_basic_file_handler_maps_local_files(tmp_path):
+    file_path = tmp_path / "test_file.csv"
+    file_path.write_bytes(b"a,b\n1,2\n")
+    file_obj = next(BasicFileHandler().open(str(file_path)))
+    view, encoding = buffer_of(file_obj)
+    assert isinstance(view.obj, mmap.mmap)
+    assert bytes(view) == b"a,b\n1,2\n"
+    assert encoding == "utf8"
+
+
+def test_mapped_file_skips_remote_files():
+    with mapped_file("memory://test_file.csv") as mapped:
+        assert mapped is None
+
+
+@pytest.fixture
+def zip_path(tmp_path):
+    zip_path = tmp_path / "test.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("data/", "")
+        zf.writestr("data/a.csv", "a,b\n1,£2\n".encode("utf8"))
+        zf.writestr("data/b.csv", "a,b\n3,£4\n".encode("cp1252"))
+        zf.writestr("readme.txt", "not data")
+    return zip_path
+
+
+def test_zip_file_handler_streams_matching_members(zip_path):
+    handler = ZipFileHandler(r"data/.*\.csv")
+    contents = [(f.name, f.read()) for f in handler.open(f"file://{zip_path}")]
+    assert contents == [("data/a.csv", "a,b\n1,£2\n"), ("data/b.csv", "a,b\n3,£4\n")]
+
+
+def test_zip_file_handler_opens_sections(zip_path):
+    handler = ZipFileHandler(r"data/.*\.csv")
+    refs = handler.section_refs(f"file://{zip_path}")
+    assert refs == ["data/a.csv", "data/b.csv"]
+    with handler.open_section(f"file://{zip_path}", refs[1]) as f:
+        assert f.read() == "a,b\n3,£4\n"
+
+
+def test_zip_file_handler_binary_members(zip_path):
+    handler = ZipFileHandler(r"readme", is_binary_file=True)
+    assert [f.read() for f in handler.open(f"file://{zip_path}")] == [b"not data"]
+
+
+def test_record_boundary_carries_quote_parity_across_blocks(monkeypatch):
+    monkeypatch.setattr(file_handlers, "_BLOCK_SIZE", 4)
+    buffer = b'a,"x\ny\nz",b\nc,d\ne,"f\n'
+
+    assert ChunkedFileHandler._record_boundary(buffer, 0, len(buffer), b'"') == 16
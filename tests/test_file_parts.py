@@ -0,0 +1,200 @@
+import datetime
+import zipfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from src import tasks
+from src.cache import MemcachedCache, MemoryCache
+from src.celery import app
+from src.file_handlers import BasicFileHandler, SeparatedFileHandler, ZipFileHandler
+from src.file_parts import PartResultStore, open_part, plan_parts
+from src.scripts.base import BaseScript
+
+
+class SplittableScript(BaseScript):
+    splittable = True
+
+
+def test_plan_parts_splits_whole_records(tmp_path):
+    file_path = tmp_path / "file.csv"
+    file_path.write_bytes(b'a,b\n1,"x\ny"\n2,z\n3,w\n4,v\n')
+
+    parts, encoding = plan_parts(
+        SplittableScript, BasicFileHandler(), str(file_path), part_size=4
+    )
+
+    handler = BasicFileHandler()
+    contents = []
+    for part in parts:
+        with open_part(handler, str(file_path), part, encoding) as f:
+            contents.append(f.read())
+    assert contents == [
+        'a,b\n1,"x\ny"\n',
+        "a,b\n2,z\n",
+        "a,b\n3,w\n",
+        "a,b\n4,v\n",
+    ]
+    assert {part.section for part in parts} == {0}
+
+
+def test_plan_parts_keeps_sections_of_unsplittable_scripts(tmp_path):
+    file_path = tmp_path / "file.csv"
+    file_path.write_bytes(b"a\n1\n2\n\nSEP\n\nb\n3\n")
+
+    parts, _ = plan_parts(
+        BaseScript, SeparatedFileHandler("SEP"), str(file_path), part_size=1
+    )
+
+    assert [(part.section, part.header) for part in parts] == [(0, None), (1, None)]
+
+
+def test_plan_parts_of_zip_members(tmp_path):
+    file_path = tmp_path / "file.zip"
+    with zipfile.ZipFile(file_path, "w") as archive:
+        archive.writestr("a.csv", "a\n1\n")
+        archive.writestr("b.csv", "b\n2\n")
+
+    parts, encoding = plan_parts(BaseScript, ZipFileHandler(), str(file_path))
+
+    assert [part.member for part in parts] == ["a.csv", "b.csv"]
+    assert encoding is None
+
+
+def test_part_result_store():
+    store = PartResultStore(MemoryCache())
+    store.start("group")
+    assert store.add("group", {"index": 1}, 2) is None
+    assert store.add("group", {"index": 0}, 2) == [{"index": 0}, {"index": 1}]
+    store.delete("group", 2)
+    assert store.cache.get("parts:group:done") is None
+
+
+def test_part_result_store_raises_when_count_is_lost():
+    store = PartResultStore(MemoryCache())
+    with pytest.raises(RuntimeError):
+        store.add("unknown", {"index": 0}, 2)
+
+
+@pytest.fixture
+def run_sent_tasks(monkeypatch):
+    """Run tasks sent by other tasks in this process, as a worker would."""
+    monkeypatch.setattr("src.cache._cache", MemoryCache())
+    monkeypatch.setattr(tasks, "get_catalogue_submitter", MagicMock)
+    monkeypatch.setattr(
+        tasks.app,
+        "send_task",
+        lambda name, kwargs, **options: app.tasks[name].apply(kwargs=kwargs),
+    )
+    monkeypatch.setattr(tasks.settings, "part_size", 256)
+
+
+@pytest.mark.parametrize(
+    "feed_identifier,file_name",
+    [
+        ("retaillink_daily_sales", "retaillink_daily_sales.txt"),
+        ("retaillink_current_store_stock", "retaillink_current_store_stock.txt"),
+        ("horizon_daily_performance_sales", "horizon_daily_performance_sales.csv"),
+    ],
+)
+@pytest.mark.parametrize("concat", [True, False])
+def test_distributed_matches_single_task(
+    get_file, run_sent_tasks, feed_identifier, file_name, concat
+):
+    kwargs = {
+        "feed_identifier": feed_identifier,
+        "feed_version": 1,
+        "file_location": f"file://{get_file(file_name)}",
+        "data_supplier": "test_supplier",
+        "start_date": datetime.date(2023, 1, 1),
+        "end_date": datetime.date(2023, 1, 1),
+        "source_creation_timestamp": datetime.datetime(2023, 1, 2),
+        "concat": concat,
+        "force": True,
+    }
+    single = tasks.prepare_file.apply(kwargs=kwargs).get()
+    merges = []
+    merge_parts = tasks.merge_parts.run
+
+    def record_merge(**kwargs):
+        merges.append(merge_parts(**kwargs))
+        return merges[-1]
+
+    app.tasks[tasks.MERGE_PARTS].run = record_merge
+    try:
+        split = tasks.prepare_file.apply(kwargs={**kwargs, "distributed": True}).get()
+    finally:
+        app.tasks[tasks.MERGE_PARTS].run = merge_parts
+
+    assert split["parts"] > 1
+    (merged,) = merges
+    assert len(merged["output_file_paths"]) == len(single["output_file_paths"])
+    for single_path, merged_path in zip(
+        single["output_file_paths"], merged["output_file_paths"]
+    ):
+        with open(single_path.removeprefix("file://"), "rb") as expected:
+            with open(merged_path.removeprefix("file://"), "rb") as f:
+                assert f.read() == expected.read()
+
+
+def distributed_kwargs(get_file) -> dict:
+    return {
+        "feed_identifier": "retaillink_daily_sales",
+        "feed_version": 1,
+        "file_location": f"file://{get_file('retaillink_daily_sales.txt')}",
+        "data_supplier": "test_supplier",
+        "start_date": datetime.date(2023, 1, 1),
+        "end_date": datetime.date(2023, 1, 1),
+        "source_creation_timestamp": datetime.datetime(2023, 1, 2),
+        "force": True,
+        "distributed": True,
+    }
+
+
+def test_failed_part_is_retried_then_reported_by_the_merge(
+    get_file, run_sent_tasks, monkeypatch, tmp_path
+):
+    attempts = []
+    open_part_ = tasks.open_part
+
+    def fail_on_second_part(file_handler, file_path, part, *args):
+        if part.index == 1:
+            attempts.append(part.index)
+            raise OSError("disk full")
+        return open_part_(file_handler, file_path, part, *args)
+
+    monkeypatch.setattr(tasks, "open_part", fail_on_second_part)
+    merges = []
+    merge_parts = tasks.merge_parts.run
+
+    def record_merge(**kwargs):
+        try:
+            return merge_parts(**kwargs)
+        except RuntimeError as e:
+            merges.append(e)
+            raise
+
+    app.tasks[tasks.MERGE_PARTS].run = record_merge
+    try:
+        split = tasks.prepare_file.apply(kwargs=distributed_kwargs(get_file)).get()
+    finally:
+        app.tasks[tasks.MERGE_PARTS].run = merge_parts
+
+    assert split["parts"] > 1
+    assert len(attempts) == 1 + tasks.prepare_part.max_retries
+    (error,) = merges
+    assert "disk full" in str(error)
+    assert not list(tmp_path.glob("test_supplier/parts/*/*"))
+    store = PartResultStore()
+    assert store.cache.get(f"parts:{split['group_id']}:done") is None
+
+
+def test_distributed_prepares_in_one_task_without_memcached(
+    get_file, run_sent_tasks, monkeypatch
+):
+    monkeypatch.setattr("src.cache._cache", MemcachedCache("127.0.0.1:1", timeout=0.1))
+
+    result = tasks.prepare_file.apply(kwargs=distributed_kwargs(get_file)).get()
+
+    assert "parts" not in result
+    assert len(result["output_file_paths"]) == 1
@@ -0,0 +1,78 @@
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from prometheus_client import REGISTRY
+
+from src.file_handlers import BasicFileHandler, InstrumentedFileHandler
+from src.instrumentation import Instrumentation
+
+
+def test_stage_excludes_nested_stages():
+    instrumentation = Instrumentation("test_identifier", 0, "test_supplier")
+    with instrumentation.stage("outer"):
+        with instrumentation.stage("inner"):
+            time.sleep(0.05)
+    stages = instrumentation.stages
+    assert stages["inner"].wall_time >= 0.05
+    assert stages["outer"].wall_time < 0.05
+
+
+@pytest.mark.skipif(
+    not os.access("/proc/self/clear_refs", os.W_OK),
+    reason="The high-water mark can only be reset on Linux",
+)
+def test_peak_rss_is_measured_from_the_start_of_each_stage():
+    instrumentation = Instrumentation("test_identifier", 0, "test_supplier")
+    with instrumentation.stage("first"):
+        np.ones(2**23).sum()
+    with instrumentation.stage("outer"):
+        with instrumentation.stage("inner"):
+            np.ones(2**22).sum()
+        with instrumentation.stage("after"):
+            pass
+    stages = instrumentation.stages
+    assert stages["first"].peak_rss_increase >= 2**25
+    assert stages["inner"].peak_rss_increase >= 2**24
+    assert stages["outer"].peak_rss_increase >= 2**24
+    assert stages["after"].peak_rss_increase < 2**24
+
+
+def test_iterate_counts_rows():
+    instrumentation = Instrumentation("test_identifier", 0, "test_supplier")
+    dataframes = [pd.DataFrame({"a": range(3)}), pd.DataFrame({"a": range(2)})]
+    assert len(list(instrumentation.iterate("run", dataframes, count_rows=True))) == 2
+    assert instrumentation.summary()["stages"]["run"]["rows_out"] == 5
+
+
+def test_publish_records_metrics():
+    instrumentation = Instrumentation("publish_identifier", 3, "test_supplier")
+    with instrumentation.stage("write_outputs") as stats:
+        stats.bytes_out += 100
+    instrumentation.publish()
+    labels = {
+        "stage": "write_outputs",
+        "feed_identifier": "publish_identifier",
+        "feed_version": "3",
+        "data_supplier": "test_supplier",
+    }
+    assert REGISTRY.get_sample_value("prepare_stage_seconds_count", labels) == 1
+    assert (
+        REGISTRY.get_sample_value(
+            "prepare_stage_bytes_total", {**labels, "direction": "out"}
+        )
+        == 100
+    )
+
+
+def test_instrumented_file_handler_pickles_as_wrapped_handler(tmp_path):
+    file_path = tmp_path / "test_file.csv"
+    file_path.write_bytes(b"a,b\n1,2\n")
+    instrumentation = Instrumentation("test_identifier", 0, "test_supplier")
+    handler = InstrumentedFileHandler(BasicFileHandler(), instrumentation)
+    assert [f.read() for f in handler.open(str(file_path))] == ["a,b\n1,2\n"]
+    assert "open" in instrumentation.stages
+    assert isinstance(pickle.loads(pickle.dumps(handler)), BasicFileHandler)
@@ -0,0 +1,116 @@
+from io import BytesIO
+import datetime
+
+import pytest
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.output_formats import (
+    CSVOutputFormat,
+    ParquetOutputFormat,
+    ArrowIPCOutputFormat,
+    OUTPUT_FORMATS,
+)
+
+
+@pytest.fixture
+def dataframes():
+    return [
+        pd.DataFrame(
+            {
+                "ID": [0, 1],
+                "SKU": [1.5, None],
+                "DESCRIPTION": ["a", None],
+                "DAILY": [datetime.date(2021, 1, 1)] * 2,
+                "RETAILER": [None, None],
+            }
+        ),
+        pd.DataFrame(
+            {
+                "ID": [0],
+                "SKU": [2.0],
+                "DESCRIPTION": ["b,c"],
+                "DAILY": [datetime.date(2021, 1, 2)],
+                "RETAILER": ["x"],
+            }
+        ),
+    ]
+
+
+def write(output_format, dataframes):
+    f = BytesIO()
+    with output_format.writer(f) as write:
+        for df in dataframes:
+            write(df)
+    f.seek(0)
+    return f
+
+
+def test_output_formats_registry():
+    assert OUTPUT_FORMATS == {
+        "csv": CSVOutputFormat,
+        "parquet": ParquetOutputFormat,
+        "arrow": ArrowIPCOutputFormat,
+    }
+
+
+def test_csv_output_format_writes_header_once(dataframes):
+    f = write(CSVOutputFormat(), dataframes)
+    assert f.read().decode("utf8").splitlines() == [
+        "ID,SKU,DESCRIPTION,DAILY,RETAILER",
+        "0,1.5,a,2021-01-01,",
+        "1,,,2021-01-01,",
+        '0,2.0,"b,c",2021-01-02,x',
+    ]
+
+
+def test_parquet_output_format_keeps_dtypes(dataframes):
+    f = write(ParquetOutputFormat(compression="zstd", row_group_size=1), dataframes)
+    table = pq.read_table(f)
+    assert table.num_rows == 3
+    assert table.schema.field("ID").type == pa.int64()
+    assert table.schema.field("SKU").type == pa.float64()
+    assert table.schema.field("DAILY").type == pa.date32()
+    assert table.column("RETAILER").to_pylist() == [None, None, "x"]
+
+
+def test_arrow_output_format_keeps_dtypes(dataframes):
+    f = write(ArrowIPCOutputFormat(compression="lz4"), dataframes)
+    df = pd.read_feather(f)
+    expected = pd.concat(dataframes, ignore_index=True)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+@pytest.mark.parametrize(
+    "output_format", [ParquetOutputFormat(), ArrowIPCOutputFormat()]
+)
+def test_arrow_output_formats_cast_later_dataframes_to_the_first(output_format):
+    dataframes = [
+        pd.DataFrame({"LOSTOPP": [1, 2], "RETAILER": [None, None]}),
+        pd.DataFrame({"LOSTOPP": [3.0, None], "RETAILER": ["a", None]}),
+    ]
+    f = write(output_format, dataframes)
+    table = (
+        pq.read_table(f)
+        if output_format.name == "parquet"
+        else pa.ipc.open_file(f).read_all()
+    )
+    assert table.schema.field("LOSTOPP").type == pa.int64()
+    assert table.column("LOSTOPP").to_pylist() == [1, 2, 3, None]
+    assert table.schema.field("RETAILER").type == pa.string()
+    assert table.column("RETAILER").to_pylist() == [None, None, "a", None]
+
+
+@pytest.mark.parametrize(
+    "output_format", [ParquetOutputFormat(), ArrowIPCOutputFormat()]
+)
+def test_arrow_output_formats_reject_later_dataframes_that_lose_values(
+    output_format,
+):
+    dataframes = [
+        pd.DataFrame({"LOSTOPP": [1, 2]}),
+        pd.DataFrame({"LOSTOPP": [1.5]}),
+    ]
+    with pytest.raises(ValueError):
+        write(output_format, dataframes)
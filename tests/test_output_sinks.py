@@ -0,0 +1,92 @@
+import threading
+
+import fsspec
+import pytest
+
+from src.output_sinks import MultipartUpload, OutputSink
+
+
+class FakeS3FileSystem:
+    """Records the S3 calls made by a MultipartUpload, standing in for s3fs."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def split_path(self, path):
+        bucket, _, key = path.partition("/")
+        return bucket, key, None
+
+    def pipe_file(self, path, data):
+        self.objects[path] = data
+
+    def call_s3(self, method, **kwargs):
+        with self.lock:
+            self.calls.append(method)
+        path = f"{kwargs['Bucket']}/{kwargs['Key']}"
+        if method == "create_multipart_upload":
+            self.uploads["upload-1"] = {}
+            return {"UploadId": "upload-1"}
+        if method == "upload_part":
+            self.uploads[kwargs["UploadId"]][kwargs["PartNumber"]] = kwargs["Body"]
+            return {"ETag": f"etag-{kwargs['PartNumber']}"}
+        if method == "complete_multipart_upload":
+            parts = self.uploads.pop(kwargs["UploadId"])
+            numbers = [p["PartNumber"] for p in kwargs["MultipartUpload"]["Parts"]]
+            self.objects[path] = b"".join(parts[n] for n in numbers)
+        if method == "abort_multipart_upload":
+            self.uploads.pop(kwargs["UploadId"])
+
+
+def test_multipart_upload_streams_parts():
+    fs = FakeS3FileSystem()
+    content = bytes(range(256)) * 40
+    upload = MultipartUpload(fs, "bucket/key.csv", part_size=1000, max_concurrency=3)
+    for start in range(0, len(content), 333):
+        upload.write(content[start : start + 333])
+    assert upload.tell() == len(content)
+    upload.close()
+
+    assert fs.objects["bucket/key.csv"] == content
+    assert fs.calls.count("upload_part") == 11
+    assert fs.calls[-1] == "complete_multipart_upload"
+
+
+def test_multipart_upload_puts_small_files():
+    fs = FakeS3FileSystem()
+    with MultipartUpload(fs, "bucket/key.csv", part_size=1000) as upload:
+        upload.write(b"a,b\n")
+    assert fs.objects["bucket/key.csv"] == b"a,b\n"
+    assert fs.calls == []
+
+
+def test_multipart_upload_abort():
+    fs = FakeS3FileSystem()
+    upload = MultipartUpload(fs, "bucket/key.csv", part_size=10)
+    upload.write(b"x" * 25)
+    upload.abort()
+    assert fs.calls[-1] == "abort_multipart_upload"
+    assert fs.uploads == {}
+    assert fs.objects == {}
+
+
+def test_output_sink_commits_on_close():
+    fs = fsspec.filesystem("memory")
+    with OutputSink().open("memory://outputs/file.csv") as f:
+        f.write(b"a,b\n")
+        assert not fs.exists("/outputs/file.csv")
+    assert fs.cat_file("/outputs/file.csv") == b"a,b\n"
+    assert fs.ls("/outputs", detail=False) == ["/outputs/file.csv"]
+    fs.rm("/outputs", recursive=True)
+
+
+def test_output_sink_discards_failed_files():
+    fs = fsspec.filesystem("memory")
+    with pytest.raises(RuntimeError):
+        with OutputSink().open("memory://failed/file.csv") as f:
+            f.write(b"a,b\n")
+            raise RuntimeError
+    assert fs.ls("/failed", detail=False) == []
+    fs.rm("/failed", recursive=True)
@@ -1,9 +1,15 @@
 import datetime
+import zipfile
+from unittest.mock import MagicMock
 
 from m2m_base_client.models import CatalogueFileRecord
 import pandas as pd
 import fsspec
 
+from src.file_handlers import ZipFileHandler
+from src.output_formats import ParquetOutputFormat
+from src.settings import settings
+
 
 def test_preparer_run_script(mock_base_script, file_preparer, tmp_path):
     file_path = tmp_path / "test_file.txt"
@@ -35,6 +41,100 @@ def test_preparer_write_outputs_to_file_no_concat(file_preparer, tmp_output_dir)
     ]
 
 
+def test_preparer_iter_script(mock_base_script, file_preparer, tmp_path):
+    file_path = tmp_path / "test_file.txt"
+    file_path.write_text("test")
+    dataframes = file_preparer.iter_script(file_path=str(file_path))
+    mock_base_script.return_value.run.assert_not_called()
+    assert len(list(dataframes)) == 1
+    mock_base_script.return_value.run.assert_called_once()
+
+
+def test_preparer_iter_script_reads_remote_zip_files_without_staging(
+    mock_base_script, file_preparer
+):
+    fs = fsspec.filesystem("memory")
+    with fs.open("/remote/test.zip", "wb") as f:
+        with zipfile.ZipFile(f, "w") as zf:
+            zf.writestr("a.csv", "a\n1\n")
+            zf.writestr("b.csv", "b\n2\n")
+    file_preparer.file_handler = ZipFileHandler()
+    file_preparer.staging_cache = MagicMock()
+
+    dataframes = list(file_preparer.iter_script("memory://remote/test.zip"))
+
+    assert len(dataframes) == 2
+    file_preparer.staging_cache.stage.assert_not_called()
+    fs.rm("/remote", recursive=True)
+
+
+def test_preparer_stream_outputs_to_file_concat(file_preparer, tmp_output_dir):
+    df1 = pd.DataFrame([(1, 2, 3)], columns=["a", "b", "c"])
+    df2 = pd.DataFrame([(4, 5, 6)], columns=["a", "b", "c"])
+    file_preparer.stream_outputs_to_file(iter([df1, df2]))
+    assert file_preparer.output_file_paths == [
+        f"{tmp_output_dir}/test_supplier/2023-12-14 14-24-00-000000/test_identifier.0.csv"
+    ]
+    with fsspec.open(file_preparer.output_file_paths[0], "r", encoding="utf-8") as f:
+        assert f.read().splitlines() == ["a,b,c", "1,2,3", "4,5,6"]
+
+
+def test_preparer_stream_outputs_to_file_no_concat(file_preparer, tmp_output_dir):
+    df1 = pd.DataFrame([(1, 2, 3)], columns=["a", "b", "c"])
+    df2 = pd.DataFrame([(4, 5, 6)], columns=["a", "b", "c"])
+    file_preparer.stream_outputs_to_file(iter([df1, df2]), concat=False)
+    assert file_preparer.output_file_paths == [
+        f"{tmp_output_dir}/test_supplier/2023-12-14 14-24-00-000000/test_identifier.0.csv",
+        f"{tmp_output_dir}/test_supplier/2023-12-14 14-24-00-000000/test_identifier.1.csv",
+    ]
+    with fsspec.open(file_preparer.output_file_paths[1], "r", encoding="utf-8") as f:
+        assert f.read().splitlines() == ["a,b,c", "4,5,6"]
+
+
+def test_preparer_measures_stages(mock_base_script, file_preparer, tmp_path):
+    mock_base_script.return_value.run.return_value = pd.DataFrame({"a": [1, 2]})
+    file_path = tmp_path / "test_file.txt"
+    file_path.write_text("test")
+    file_preparer.stream_outputs_to_file(file_preparer.iter_script(str(file_path)))
+    stages = file_preparer.instrumentation.summary()["stages"]
+    assert set(stages) == {"stage", "open", "run_script", "write_outputs"}
+    assert stages["open"]["bytes_in"] == 4
+    assert stages["run_script"]["rows_out"] == 2
+    assert stages["write_outputs"]["rows_in"] == 2
+    assert stages["write_outputs"]["bytes_out"] > 0
+
+
+def test_preparer_stream_outputs_to_file_no_concat_in_parallel(
+    file_preparer, monkeypatch
+):
+    monkeypatch.setattr(settings, "output_parallel_files", 2)
+    dataframes = [pd.DataFrame([(i, i)], columns=["a", "b"]) for i in range(5)]
+    file_preparer.stream_outputs_to_file(iter(dataframes), concat=False)
+    assert len(file_preparer.output_file_paths) == 5
+    for i, output_path in enumerate(file_preparer.output_file_paths):
+        assert output_path.endswith(f"test_identifier.{i}.csv")
+        with fsspec.open(output_path, "r", encoding="utf-8") as f:
+            assert f.read().splitlines() == ["a,b", f"{i},{i}"]
+
+
+def test_preparer_stream_outputs_to_file_parquet(file_preparer, tmp_output_dir):
+    file_preparer.output_format = ParquetOutputFormat()
+    df1 = pd.DataFrame([(1, 2.5, "x")], columns=["a", "b", "c"])
+    df2 = pd.DataFrame([(4, 5.5, "y")], columns=["a", "b", "c"])
+    file_preparer.stream_outputs_to_file(iter([df1, df2]))
+    assert file_preparer.output_file_paths == [
+        f"{tmp_output_dir}/test_supplier/2023-12-14 14-24-00-000000/test_identifier.0.parquet"
+    ]
+    with fsspec.open(file_preparer.output_file_paths[0], "rb") as f:
+        pd.testing.assert_frame_equal(
+            pd.read_parquet(f), pd.concat([df1, df2], ignore_index=True)
+        )
+
+
+def test_preparer_stream_outputs_to_file_empty(file_preparer):
+    assert file_preparer.stream_outputs_to_file(iter([])) == []
+
+
 def test_write_dataframe_to_file(file_preparer, tmp_output_dir):
     df = pd.DataFrame([(1, 2, 3)], columns=["a", "b", "c"])
     output_path = file_preparer._write_dataframe_to_file(df)
@@ -78,6 +178,7 @@ def test_preparer_catalogue_outputs(file_preparer, mock_catalogue_client):
                         "end_date": "2021-01-01",
                         "data_provider": "test_supplier",
                         "source_creation_timestamp": "2021-01-01T00:00:00",
+                        "file_format": "csv",
                     },
                 ),
                 CatalogueFileRecord(
@@ -90,6 +191,7 @@ def test_preparer_catalogue_outputs(file_preparer, mock_catalogue_client):
                         "end_date": "2021-01-01",
                         "data_provider": "test_supplier",
                         "source_creation_timestamp": "2021-01-01T00:00:00",
+                        "file_format": "csv",
                     },
                 ),
             ]
@@ -0,0 +1,95 @@
+import asyncio
+import datetime
+
+import pytest
+from faststream.rabbit import RabbitBroker, TestRabbitBroker
+from faststream.rabbit.annotations import RabbitMessage
+from kombu import Message
+
+from src.celery import PREPARE_FILE, app as celery_app
+from src.publisher import TaskPublisher
+
+
+@pytest.fixture
+def broker():
+    return RabbitBroker()
+
+
+@pytest.fixture
+def received(broker):
+    messages = []
+
+    @broker.subscriber("prepare.small")
+    async def handler(body, message: RabbitMessage):
+        messages.append(message.raw_message)
+
+    return messages
+
+
+def decode(message) -> Message:
+    return Message(
+        body=message.body,
+        headers=message.headers,
+        content_type=message.content_type,
+        content_encoding="utf-8",
+    )
+
+
+def test_publish_celery_task(broker, received):
+    kwargs = {"feed_identifier": "test", "start_date": datetime.date(2023, 1, 1)}
+
+    async def publish():
+        async with TestRabbitBroker(broker):
+            publisher = TaskPublisher(broker, celery_app, flush_interval=0.001)
+            return await publisher.publish(PREPARE_FILE, kwargs, "prepare.small")
+
+    task_id = asyncio.run(publish())
+
+    assert len(received) == 1
+    message = decode(received[0])
+    assert message.headers["task"] == PREPARE_FILE
+    assert message.headers["id"] == task_id
+    args, decoded_kwargs, _ = message.decode()
+    assert args == [] and decoded_kwargs == kwargs
+
+
+def test_publish_in_batches(broker, received, monkeypatch):
+    publisher = TaskPublisher(broker, celery_app, batch_size=3, flush_interval=60)
+    flushes = []
+    flush = publisher._flush
+
+    async def record_flush(batch):
+        flushes.append(len(batch))
+        await flush(batch)
+
+    monkeypatch.setattr(publisher, "_flush", record_flush)
+
+    async def publish():
+        async with TestRabbitBroker(broker):
+            return await asyncio.gather(
+                *(
+                    publisher.publish(PREPARE_FILE, {}, "prepare.small")
+                    for _ in range(6)
+                )
+            )
+
+    task_ids = asyncio.run(publish())
+
+    assert flushes == [3, 3]
+    assert len(set(task_ids)) == 6
+    assert len(received) == 6
+
+
+def test_publish_raises_publish_errors(broker, monkeypatch):
+    publisher = TaskPublisher(broker, celery_app, flush_interval=0.001)
+
+    async def fail(*args, **kwargs):
+        raise ConnectionError("Broker unavailable")
+
+    async def publish():
+        async with TestRabbitBroker(broker):
+            monkeypatch.setattr(broker, "publish", fail)
+            await publisher.publish(PREPARE_FILE, {}, "prepare.small")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(publish())
@@ -0,0 +1,90 @@
+import inspect
+
+import fsspec
+import fsspec.implementations.memory
+
+from src import result_cache as result_cache_module
+from src.cache import MemoryCache
+from src.file_handlers import BasicFileHandler
+from src.result_cache import ResultCache, file_fingerprint, script_fingerprint
+from src.scripts import base
+from src.scripts.retaillink import CurrentStoreStock, DailySales
+
+
+def test_file_fingerprint_of_local_files_does_not_read_them(tmp_path, monkeypatch):
+    a = tmp_path / "a.txt"
+    a.write_text("1,2\n")
+    monkeypatch.setattr("fsspec.implementations.local.LocalFileSystem.open", None)
+    fingerprint = file_fingerprint(f"file://{a}")
+    assert fingerprint == file_fingerprint(f"file://{a}")
+    a.write_text("1,23\n")
+    assert file_fingerprint(f"file://{a}") != fingerprint
+
+
+def test_file_fingerprint_hashes_contents_without_file_info(monkeypatch):
+    fs = fsspec.filesystem("memory")
+    fs.pipe_file("/a.txt", b"1,2\n")
+    fs.pipe_file("/b.txt", b"1,2\n")
+    monkeypatch.setattr(
+        fsspec.implementations.memory.MemoryFileSystem,
+        "info",
+        lambda self, path, **kwargs: {"size": 4},
+    )
+    assert file_fingerprint("memory:///a.txt") == file_fingerprint("memory:///b.txt")
+    fs.pipe_file("/b.txt", b"1,3\n")
+    assert file_fingerprint("memory:///a.txt") != file_fingerprint("memory:///b.txt")
+
+
+def test_result_cache_key(tmp_path):
+    source = tmp_path / "source.txt"
+    source.write_text("1,2\n")
+    result_cache = ResultCache(MemoryCache())
+    args = (f"file://{source}", "retaillink_daily_sales", 1, DailySales, "csv", True)
+    key = result_cache.key(*args)
+    assert key == result_cache.key(*args)
+    assert key.startswith("prepared:") and len(key) < 250
+    assert key != result_cache.key(*args[:1], "other_feed", *args[2:])
+    assert key != result_cache.key(*args[:2], 2, *args[3:])
+    assert key != result_cache.key(*args[:3], CurrentStoreStock, *args[4:])
+    assert key != result_cache.key(*args[:4], "parquet", True)
+    assert key != result_cache.key(*args[:5], False)
+    assert key != result_cache.key(*args, BasicFileHandler())
+    assert result_cache.key(*args, BasicFileHandler()) != result_cache.key(
+        *args, BasicFileHandler(encoding="latin1")
+    )
+
+
+def test_script_fingerprint_covers_base_script(monkeypatch):
+    fingerprint = script_fingerprint(DailySales)
+    script_fingerprint.cache_clear()
+    getsource = inspect.getsource
+    monkeypatch.setattr(
+        inspect,
+        "getsource",
+        lambda module: getsource(module) + ("#" if module is base else ""),
+    )
+    try:
+        assert script_fingerprint(DailySales) != fingerprint
+    finally:
+        script_fingerprint.cache_clear()
+
+
+def test_result_cache_key_changes_with_engine_version(tmp_path, monkeypatch):
+    source = tmp_path / "source.txt"
+    source.write_text("1,2\n")
+    result_cache = ResultCache(MemoryCache())
+    args = (f"file://{source}", "retaillink_daily_sales", 1, DailySales, "csv", True)
+    key = result_cache.key(*args)
+    monkeypatch.setattr(result_cache_module, "ENGINE_VERSION", 2)
+    assert result_cache.key(*args) != key
+
+
+def test_result_cache_misses_when_outputs_are_gone(tmp_path):
+    output = tmp_path / "output.csv"
+    output.write_text("a\n")
+    result_cache = ResultCache(MemoryCache())
+    result_cache.set("key", [f"file://{output}"])
+    assert result_cache.get("key") == [f"file://{output}"]
+    output.unlink()
+    assert result_cache.get("key") is None
+    assert result_cache.cache.get("key") is None
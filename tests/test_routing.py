@@ -0,0 +1,78 @@
+import time
+
+import fsspec
+import pytest
+
+from src.routing import TaskRouter
+
+
+@pytest.fixture
+def router():
+    return TaskRouter("small", "large", large_cost=1000, cost_factors={"slow": 4.0})
+
+
+@pytest.fixture
+def write_file():
+    fs = fsspec.filesystem("memory")
+    paths = []
+
+    def _(name: str, size: int) -> str:
+        path = f"/routing/{name}"
+        fs.pipe_file(path, b"x" * size)
+        paths.append(path)
+        return f"memory://{path}"
+
+    yield _
+    for path in paths:
+        fs.rm(path)
+
+
+def test_small_file_routed_to_small_queue(router, write_file):
+    assert router.queue("fast", write_file("small.csv", 999)) == "small"
+
+
+def test_large_file_routed_to_large_queue(router, write_file):
+    assert router.queue("fast", write_file("large.csv", 1000)) == "large"
+
+
+def test_cost_scaled_by_feed(router, write_file):
+    file_location = write_file("slow.csv", 300)
+    assert router.cost("slow", file_location) == 1200
+    assert router.queue("slow", file_location) == "large"
+
+
+def test_cost_scaled_by_compression(router, write_file):
+    assert router.cost("fast", write_file("small.zip", 100)) == 500
+
+
+def test_batch_routed_by_total_cost(router, write_file):
+    file_locations = [write_file(f"part_{i}.csv", 400) for i in range(3)]
+    assert router.queue("fast", file_locations[:2]) == "small"
+    assert router.queue("fast", file_locations) == "large"
+
+
+def test_missing_file_routed_to_small_queue(router):
+    assert router.cost("fast", "memory:///routing/missing.csv") == 0
+    assert router.queue("fast", "memory:///routing/missing.csv") == "small"
+
+
+def test_unknown_protocol_routed_to_small_queue(router):
+    assert router.cost("fast", "unknown-protocol://routing/a.csv") == 0
+    assert router.queue("fast", "unknown-protocol://routing/a.csv") == "small"
+
+
+def test_batch_cost_stops_fetching_sizes_once_large(write_file, monkeypatch):
+    router = TaskRouter("small", "large", large_cost=1000, max_concurrency=1)
+    file_locations = [write_file(f"batch_{i}.csv", 600) for i in range(4)]
+    fetched = []
+    cost = router.cost
+
+    def slow_cost(feed_identifier: str, file_location: str) -> float:
+        fetched.append(file_location)
+        time.sleep(0.05)
+        return cost(feed_identifier, file_location)
+
+    monkeypatch.setattr(router, "cost", slow_cost)
+
+    assert router.queue("fast", file_locations) == "large"
+    assert len(fetched) < len(file_locations)
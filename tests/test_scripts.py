@@ -0,0 +1,106 @@
+from io import StringIO
+from typing import TextIO, BinaryIO
+import datetime
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from src.file_handlers import BasicFileHandler, SeparatedFileHandler
+from src.scripts.base import BaseScript, Column
+from src.scripts.retaillink import CurrentStoreStock, DailySales
+from src.scripts.waitroseconnect import DailyLineSales
+from src.scripts.horizon.daily_performance_sales import (
+    CATEGORY_ROW,
+    DATE_ROW,
+    LABEL_ROW,
+    SKU_ROW,
+    DailySales as HorizonDailySales,
+)
+
+
+@pytest.mark.parametrize(
+    "script_cls, sample_file, file_handler",
+    [
+        (DailySales, "retaillink_daily_sales.txt", BasicFileHandler()),
+        (
+            CurrentStoreStock,
+            "retaillink_current_store_stock.txt",
+            BasicFileHandler(),
+        ),
+        (DailyLineSales, "waitroseconnect_daily_line_sales.csv", BasicFileHandler()),
+        (
+            DailyLineSales,
+            "waitroseconnect_daily_line_sales_duplicated.csv",
+            BasicFileHandler(),
+        ),
+        (
+            HorizonDailySales,
+            "horizon_daily_performance_sales.csv",
+            SeparatedFileHandler(encoding="latin1"),
+        ),
+    ],
+)
+def test_script_output(get_file, script_cls, sample_file, file_handler):
+    script = script_cls(datetime.date(2023, 1, 5), datetime.date(2023, 1, 5))
+    file_path = get_file(sample_file)
+    dataframes = [script.run(f) for f in file_handler.open(str(file_path))]
+
+    output = StringIO()
+    pd.concat(dataframes).to_csv(output, index=False)
+
+    expected = file_path.with_name(f"{file_path.stem}.expected.csv").read_text()
+    assert output.getvalue() == expected
+
+
+def test_read_source_keeps_strings_in_arrow(get_file):
+    script = DailySales(datetime.date(2023, 1, 5), datetime.date(2023, 1, 5))
+    file_path = get_file("retaillink_daily_sales.txt")
+    df = script.read_source(next(BasicFileHandler().open(str(file_path))))
+    assert list(df.columns) == list(DailySales.source_schema)
+    assert df.SUPPLIERNUMBER.dtype == pd.StringDtype("pyarrow")
+    assert df.EPOSSALES.dtype == "float64"
+    assert not (df.dtypes == object).any()
+
+
+class SchemaScript(BaseScript):
+    output_schema = {
+        "ID": Column(row_number=True, dtype=float),
+        "DAILY": Column(attribute="start_date"),
+        "STORE": Column(source="STORENBR", extract=r"(\d+)\.\d*"),
+        "SUPPLIER": Column(lstrip="0", dtype=str),
+        "MISSING": Column(dtype=float),
+    }
+
+    def run(self, file_obj: TextIO | BinaryIO) -> pd.DataFrame:
+        return self.build_output(pd.read_csv(file_obj, dtype=str))
+
+
+def test_build_output():
+    script = SchemaScript(datetime.date(2023, 1, 5), datetime.date(2023, 1, 5))
+    source = StringIO("STORENBR,SUPPLIER\n12.0,007\n345.5,\n")
+    df = script.run(source)
+
+    assert list(df.columns) == list(SchemaScript.output_schema)
+    assert df.ID.tolist() == [0.0, 1.0]
+    assert df.DAILY.tolist() == [datetime.date(2023, 1, 5)] * 2
+    assert df.STORE.tolist() == ["12", "345"]
+    assert df.SUPPLIER[0] == "7" and np.isnan(df.SUPPLIER[1])
+    assert df.MISSING.isna().all()
+
+
+def test_horizon_classify_rows():
+    skus = pd.Series(
+        ["01/02/2023", "Bakery", "123", "Sub-Cat Subtotal", "1/2/2023", "0"]
+    )
+    row_kinds = HorizonDailySales.classify_rows(skus)
+    assert row_kinds.tolist() == [
+        DATE_ROW,
+        CATEGORY_ROW,
+        SKU_ROW,
+        LABEL_ROW,
+        CATEGORY_ROW,
+        SKU_ROW,
+    ]
+    last_category = HorizonDailySales.last_row_of_kind(row_kinds, CATEGORY_ROW)
+    assert last_category.tolist() == [-1, 1, 1, 1, 4, 4]
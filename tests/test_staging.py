@@ -0,0 +1,138 @@
+import hashlib
+import os
+
+import fsspec
+import pytest
+
+from src.staging import StagingCache
+
+
+@pytest.fixture
+def remote_file():
+    """Remote file on fsspec's in memory filesystem, standing in for an object store."""
+    fs = fsspec.filesystem("memory")
+    content = os.urandom(10_000)
+    fs.pipe_file("/bucket/input.csv", content)
+    yield "memory://bucket/input.csv", content
+    fs.rm("/bucket", recursive=True)
+
+
+def test_stage_downloads_in_parts(tmp_path, remote_file):
+    file_path, content = remote_file
+    staging_cache = StagingCache(str(tmp_path), part_size=1024, max_concurrency=4)
+    with staging_cache.stage(file_path) as staged:
+        assert open(staged, "rb").read() == content
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_stage_reuses_staged_file(tmp_path, remote_file, monkeypatch):
+    file_path, _ = remote_file
+    staging_cache = StagingCache(str(tmp_path))
+    with staging_cache.stage(file_path) as staged:
+        pass
+
+    def fail(*args):
+        raise AssertionError("File was downloaded again")
+
+    monkeypatch.setattr(StagingCache, "_download", fail)
+    with staging_cache.stage(file_path) as restaged:
+        assert restaged == staged
+
+
+def test_stage_returns_local_files_unchanged(tmp_path):
+    file_path = tmp_path / "input.csv"
+    file_path.write_bytes(b"a,b\n")
+    staging_cache = StagingCache(str(tmp_path / "staging"))
+    with staging_cache.stage(str(file_path)) as staged:
+        assert staged == str(file_path)
+
+
+def test_stage_evicts_least_recently_used(tmp_path):
+    fs = fsspec.filesystem("memory")
+    for name in "abc":
+        fs.pipe_file(f"/lru/{name}.csv", name.encode("utf8") * 100)
+    staging_cache = StagingCache(str(tmp_path), max_bytes=250)
+
+    def stage(file_path: str) -> str:
+        with staging_cache.stage(file_path) as staged:
+            return staged
+
+    staged_a = stage("memory://lru/a.csv")
+    staged_b = stage("memory://lru/b.csv")
+    os.utime(staged_a, (0, 0))
+    os.utime(staged_b, (1, 1))
+    stage("memory://lru/a.csv")
+    staged_c = stage("memory://lru/c.csv")
+
+    assert os.path.exists(staged_a)
+    assert not os.path.exists(staged_b)
+    assert not os.path.exists(staged_b.removesuffix(".data") + ".lock")
+    assert os.path.exists(staged_c)
+    fs.rm("/lru", recursive=True)
+
+
+def test_stage_does_not_evict_files_being_read(tmp_path):
+    fs = fsspec.filesystem("memory")
+    for name in "abc":
+        fs.pipe_file(f"/reading/{name}.csv", name.encode("utf8") * 100)
+    staging_cache = StagingCache(str(tmp_path), max_bytes=150)
+
+    with staging_cache.stage("memory://reading/a.csv") as staged_a:
+        with staging_cache.stage("memory://reading/b.csv"):
+            pass
+        assert open(staged_a, "rb").read() == b"a" * 100
+    with staging_cache.stage("memory://reading/c.csv") as staged_c:
+        assert os.path.exists(staged_c)
+    assert not os.path.exists(staged_a)
+    fs.rm("/reading", recursive=True)
+
+
+def test_stage_rejects_checksum_mismatch(tmp_path, remote_file, monkeypatch):
+    file_path, content = remote_file
+    info = fsspec.filesystem("memory").info("/bucket/input.csv")
+    bad_etag = hashlib.md5(content[::-1]).hexdigest()
+    monkeypatch.setattr(
+        fsspec.implementations.memory.MemoryFileSystem,
+        "info",
+        lambda self, path, **kwargs: {**info, "ETag": f'"{bad_etag}"'},
+    )
+    staging_cache = StagingCache(str(tmp_path))
+    with pytest.raises(ValueError):
+        with staging_cache.stage(file_path):
+            pass
+    assert not list(tmp_path.glob("*.data"))
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_stage_removes_partial_file_when_download_fails(
+    tmp_path, remote_file, monkeypatch
+):
+    file_path, _ = remote_file
+
+    def fail(*args, **kwargs):
+        raise ConnectionError
+
+    monkeypatch.setattr(
+        fsspec.implementations.memory.MemoryFileSystem, "cat_file", fail
+    )
+    staging_cache = StagingCache(str(tmp_path), part_size=1024)
+    with pytest.raises(ConnectionError):
+        with staging_cache.stage(file_path):
+            pass
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_evict_skips_files_deleted_by_another_process(
+    tmp_path, remote_file, monkeypatch
+):
+    file_path, _ = remote_file
+    staging_cache = StagingCache(str(tmp_path), max_bytes=1)
+    glob = type(tmp_path).glob
+    monkeypatch.setattr(
+        type(tmp_path),
+        "glob",
+        lambda self, pattern: [*glob(self, pattern), self / "evicted.data"],
+    )
+
+    with staging_cache.stage(file_path) as staged:
+        assert os.path.exists(staged)